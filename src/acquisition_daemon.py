@@ -0,0 +1,543 @@
+import argparse
+import ipaddress
+import json
+import os
+import secrets
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from fuel_cell_controller import FuelCellController, SetpointCommands
+from protium_parser import FIELD_NAMES
+from telemetry_buffer import TelemetryRingBuffer
+
+SHM_NAME = 'exocet_telemetry'
+DAEMON_ADDRESS = ('127.0.0.1', 6001)
+KEY_DIR = os.path.join(os.path.expanduser('~'), '.exocet')
+MAX_REQUEST_BYTES = 4096
+HEARTBEAT_SECONDS = 0.5
+STALE_SECONDS = 3.0  # A daemon silent for this long is considered gone.
+
+MAGIC = 0x45584F43  # "EXOC"
+LAYOUT_VERSION = 1
+# Shared memory layout: an int64 header, the column names as JSON, the
+# message slots, then the telemetry rows in TelemetryRingBuffer's layout.
+HEADER = ('magic', 'version', 'capacity', 'columns', 'head', 'size', 'appended', 'overwritten', 'dropped',
+          'message_slots', 'message_count', 'pid', 'heartbeat_ns', 'bytes_read', 'failed_frames',
+          'queue_dropped', 'connected')
+HEADER_BYTES = 8 * 32
+NAMES_BYTES = 1024
+MESSAGE_SLOTS = 200
+MESSAGE_BYTES = 160  # Per slot: a 2-byte length, then the text.
+_H = {name: i for i, name in enumerate(HEADER)}
+
+
+def _header_property(name):
+    index = _H[name]
+
+    def get(self):
+        return int(self._header[index])
+
+    def set(self, value):
+        if not self.readonly:
+            self._header[index] = value
+    return property(get, set)
+
+
+class SharedMessages:
+    """The latest text messages, in fixed-size slots of the shared segment."""
+
+    def __init__(self, header, slots):
+        self._header = header
+        self._slots = slots
+
+    def append(self, text):
+        data = text.encode('utf-8', errors='replace')[:MESSAGE_BYTES - 2]
+        count = int(self._header[_H['message_count']])
+        slot = self._slots[count % len(self._slots)]
+        slot[:2] = np.frombuffer(len(data).to_bytes(2, 'little'), dtype=np.uint8)
+        slot[2:2 + len(data)] = np.frombuffer(data, dtype=np.uint8)
+        self._header[_H['message_count']] = count + 1
+
+    def latest(self, n=None):
+        """Returns up to n of the latest messages, oldest first."""
+        count = int(self._header[_H['message_count']])
+        slots = len(self._slots)
+        n = min(count, slots) if n is None else min(n, count, slots)
+        messages = []
+        for i in range(count - n, count):
+            slot = self._slots[i % slots]
+            length = int.from_bytes(slot[:2].tobytes(), 'little')
+            messages.append(slot[2:2 + length].tobytes().decode('utf-8', errors='replace'))
+        return messages
+
+    def __iter__(self):
+        return iter(self.latest())
+
+
+def key_path(address=DAEMON_ADDRESS):
+    """~/.exocet/daemon-<port>.key: where the daemon on `address` leaves its authentication key."""
+    return os.path.join(KEY_DIR, f"daemon-{address[1]}.key")
+
+
+def write_key(path, key):
+    """Writes `key` to `path`, readable by the current user only."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        os.chmod(path, 0o600)  # In case the file already existed.
+        f.write(key.hex().encode('ascii'))
+
+
+def read_key(path):
+    with open(path, 'rb') as f:
+        return bytes.fromhex(f.read().decode('ascii').strip())
+
+
+def is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _send(connection, message):
+    connection.send_bytes(json.dumps(message).encode('utf-8'))
+
+
+def _recv(connection, maxlength=None):
+    return json.loads(connection.recv_bytes(maxlength).decode('utf-8'))
+
+
+def _pid_alive(pid):
+    if os.name == 'nt':
+        # Signal 0 is CTRL_C_EVENT on Windows; the heartbeat has to do.
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Alive, under another user.
+    return True
+
+
+def segment_owner(name=SHM_NAME):
+    """
+    Pid of the live daemon publishing segment `name`, or None if the segment
+    does not exist, is not ours, or was left behind: its owner is gone or
+    its heartbeat is older than STALE_SECONDS.
+    """
+    try:
+        shm = SharedMemory(name, track=False)
+    except FileNotFoundError:
+        return None
+    try:
+        if shm.size < HEADER_BYTES:
+            return None
+        header = np.ndarray((len(HEADER),), dtype=np.int64, buffer=shm.buf)
+        pid, heartbeat_ns = int(header[_H['pid']]), int(header[_H['heartbeat_ns']])
+        magic = int(header[_H['magic']])
+        del header
+    finally:
+        shm.close()
+    if magic != MAGIC or pid <= 0:
+        return None
+    if time.time_ns() - heartbeat_ns > STALE_SECONDS * 1e9 or not _pid_alive(pid):
+        return None
+    return pid
+
+
+class SharedTelemetryBuffer(TelemetryRingBuffer):
+    """
+    TelemetryRingBuffer whose rows, counters and latest messages live in a
+    named shared memory segment.
+
+    The acquisition daemon creates it (create=True) and appends as usual;
+    creating a segment another live daemon still publishes raises
+    FileExistsError, a stale one is replaced. Viewers attach by name, read-only and without copying: window(),
+    since(), latest() and column() behave as on the daemon's own buffer.
+    A reader takes the row count from `appended`, which the writer updates
+    last, so every row in a window it returns is complete; like any
+    window, it stays valid for (capacity - n) further appends.
+    """
+
+    _head = _header_property('head')
+    size = _header_property('size')
+    appended = _header_property('appended')
+    overwritten = _header_property('overwritten')
+    dropped = _header_property('dropped')
+
+    def __init__(self, name=SHM_NAME, capacity=86400, fields=FIELD_NAMES, create=False):
+        self.name = name
+        self.readonly = not create
+        if create:
+            row_bytes = 8 * (len(fields) + 1)
+            size = HEADER_BYTES + NAMES_BYTES + MESSAGE_SLOTS * MESSAGE_BYTES + 2 * capacity * row_bytes
+            try:
+                self.shm = SharedMemory(name, create=True, size=size)
+            except FileExistsError:
+                owner = segment_owner(name)
+                if owner is not None:
+                    raise FileExistsError(f"{name} is in use by the acquisition daemon with pid {owner}")
+                # Left behind by a daemon that did not shut down cleanly.
+                stale = SharedMemory(name, track=False)
+                stale.close()
+                stale.unlink()
+                self.shm = SharedMemory(name, create=True, size=size)
+        else:
+            self.shm = SharedMemory(name, track=False)
+        buf = self.shm.buf
+        self._header = np.ndarray((len(HEADER),), dtype=np.int64, buffer=buf)
+        names = buf[HEADER_BYTES:HEADER_BYTES + NAMES_BYTES]
+        slots_start = HEADER_BYTES + NAMES_BYTES
+        data_start = slots_start + MESSAGE_SLOTS * MESSAGE_BYTES
+
+        if create:
+            self._header[:] = 0
+            encoded = json.dumps(list(fields)).encode('utf-8')
+            if len(encoded) > NAMES_BYTES:
+                raise ValueError("too many fields for the shared segment")
+            names[:len(encoded)] = encoded
+            names[len(encoded):] = b' ' * (NAMES_BYTES - len(encoded))
+            header = {'magic': MAGIC, 'version': LAYOUT_VERSION, 'capacity': capacity, 'columns': len(fields) + 1,
+                      'message_slots': MESSAGE_SLOTS, 'pid': os.getpid(), 'heartbeat_ns': time.time_ns()}
+            for key, value in header.items():
+                self._header[_H[key]] = value
+        else:
+            if self._header[_H['magic']] != MAGIC or self._header[_H['version']] != LAYOUT_VERSION:
+                self.shm.close()
+                raise ValueError(f"{name} is not an exocet telemetry segment of layout {LAYOUT_VERSION}")
+            capacity = int(self._header[_H['capacity']])
+            fields = tuple(json.loads(bytes(names).decode('utf-8')))
+
+        slots = np.ndarray((MESSAGE_SLOTS, MESSAGE_BYTES), dtype=np.uint8, buffer=buf, offset=slots_start)
+        self.messages = SharedMessages(self._header, slots)
+        super().__init__(capacity, fields, buffer=buf[data_start:])
+        if create:
+            self._data.fill(np.nan)
+        else:
+            self._data.flags.writeable = False
+            self._header.flags.writeable = False
+
+    def window(self, n=None):
+        if not self.readonly:
+            return super().window(n)
+        # Lock-free: `appended` is read before `head`, and the writer updates
+        # head before appended, so the rows counted are all in place.
+        appended = self.appended
+        head = self._head
+        size = min(appended, self.capacity)
+        n = size if n is None else min(n, size)
+        end = head + self.capacity
+        return self._data[end - n:end]
+
+    def since_count(self, count):
+        if not self.readonly:
+            return super().since_count(count)
+        # The daemon never clears its buffer, so the head follows from
+        # `appended` (dropped frames move neither); the rows it counts are
+        # in place, since the writer updates it last.
+        appended = self.appended
+        size = min(appended, self.capacity)
+        n = min(max(appended - count, 0), size)
+        end = appended % self.capacity + self.capacity
+        return appended, self._data[end - n:end]
+
+    def header(self, name):
+        return int(self._header[_H[name]])
+
+    def publish(self, **values):
+        """Daemon side: updates header fields such as the heartbeat and counters."""
+        for key, value in values.items():
+            self._header[_H[key]] = value
+
+    def close(self):
+        self._data = self._header = None
+        self.messages = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # Arrays from window() are still referenced; the mapping goes with them.
+
+    def unlink(self):
+        self.shm.unlink()
+
+
+class AcquisitionDaemon:
+    """
+    Owns the serial port and publishes what FuelCellController parses to a
+    SharedTelemetryBuffer, for any number of dashboard sessions.
+
+    Commands come back from the viewers over a multiprocessing.connection
+    listener on `address`, as JSON lists rather than pickles:
+    ["command", text] is written to the port; ["info"] returns the segment
+    name and the daemon's state. Clients authenticate with a random key
+    the daemon writes to `key_file` (readable by its user only, removed on
+    stop). Only loopback addresses are accepted unless `allow_remote`.
+    """
+
+    def __init__(self, port, baudrate=57600, name=SHM_NAME, capacity=86400, address=DAEMON_ADDRESS,
+                 key_file=None, allow_remote=False):
+        if not allow_remote and not is_loopback(address[0]):
+            raise ValueError(f"{address[0]} is not a loopback address; the command channel "
+                             f"drives the fuel cell, allow remote clients explicitly")
+        self.port = port
+        self.name = name
+        self.authkey = secrets.token_bytes(32)
+        # Bound first: a second daemon on the same address fails here,
+        # before it touches the segment of the first one.
+        self._listener = Listener(address, authkey=self.authkey)
+        self.address = self._listener.address
+        try:
+            self.buffer = SharedTelemetryBuffer(name, capacity, create=True)
+        except BaseException:
+            self._listener.close()
+            raise
+        self.key_file = key_file or key_path(self.address)
+        # The controller keeps no history of its own: its frames and
+        # messages go straight to the shared segment.
+        self.controller = FuelCellController(port, baudrate, history_size=1)
+        self.controller.telemetry = self.buffer
+        self.controller.messages = self.buffer.messages
+        self.commands = 0
+        self._running = False
+        self._threads = []
+
+    def start(self):
+        self.controller.connect()
+        write_key(self.key_file, self.authkey)
+        self._running = True
+        self._threads = [threading.Thread(target=self._accept_loop, daemon=True),
+                         threading.Thread(target=self._heartbeat_loop, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        try:
+            # Wakes the accept loop up.
+            Client(self.address, authkey=self.authkey).close()
+        except (OSError, AuthenticationError):
+            pass
+        for thread in self._threads:
+            thread.join(timeout=2)
+        self._listener.close()
+        try:
+            if read_key(self.key_file) == self.authkey:
+                os.remove(self.key_file)
+        except (OSError, ValueError):
+            pass
+        self.controller.disconnect()
+        self.buffer.publish(connected=0, heartbeat_ns=0)
+        self.buffer.close()
+        self.buffer.unlink()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def info(self):
+        return {"name": self.name, "port": self.port, "pid": os.getpid(),
+                "connected": self.controller.is_connected, "commands": self.commands}
+
+    def handle(self, request):
+        if not isinstance(request, list) or not request or not all(isinstance(part, str) for part in request):
+            return ['error', "requests are lists of strings"]
+        if request[0] == 'command' and len(request) == 2:
+            self.controller.send_command(request[1])
+            self.commands += 1
+            return ['ok']
+        if request[0] == 'info' and len(request) == 1:
+            return ['ok', self.info()]
+        return ['error', f"unknown request {request[0]!r}"]
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                connection = self._listener.accept()
+            except (OSError, AuthenticationError, EOFError):
+                continue
+            if not self._running:
+                connection.close()
+                break
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection):
+        with connection:
+            while self._running:
+                try:
+                    request = _recv(connection, MAX_REQUEST_BYTES)
+                except (EOFError, OSError):
+                    return  # Gone, or a request over MAX_REQUEST_BYTES.
+                except ValueError:
+                    request = None
+                try:
+                    reply = self.handle(request)
+                except Exception as e:
+                    reply = ['error', str(e)]
+                try:
+                    _send(connection, reply)
+                except OSError:
+                    return
+
+    def _heartbeat_loop(self):
+        controller = self.controller
+        while self._running:
+            self.buffer.publish(heartbeat_ns=time.time_ns(), connected=int(controller.is_connected),
+                                bytes_read=controller.bytes_read, failed_frames=controller.parser.failed_frames,
+                                queue_dropped=controller.queue_dropped)
+            time.sleep(HEARTBEAT_SECONDS)
+
+
+class RemoteController(SetpointCommands):
+    """
+    Dashboard-side stand-in for FuelCellController, backed by a running
+    AcquisitionDaemon: `telemetry` and `messages` read the shared segment,
+    commands are forwarded to the daemon. Attaching costs one mapping of
+    the segment and one local connection; nothing is parsed again. The
+    key comes from the daemon's key file (see key_path).
+    """
+
+    def __init__(self, address=DAEMON_ADDRESS, key_file=None):
+        self.address = address
+        self.key_file = key_file or key_path(address)
+        self.port = None
+        self.telemetry = None
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        """Attaches to the daemon; raises OSError if it is not running."""
+        self._connection = Client(self.address, authkey=read_key(self.key_file))
+        info = self.request('info')
+        self.port = info["port"]
+        self.telemetry = SharedTelemetryBuffer(info["name"])
+        return self
+
+    def disconnect(self):
+        self.stop_setpoints()
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        if self.telemetry is not None:
+            self.telemetry.close()
+            self.telemetry = None
+
+    def request(self, *request):
+        with self._lock:
+            _send(self._connection, list(request))
+            reply = _recv(self._connection)
+        if reply[0] != 'ok':
+            raise RuntimeError(reply[1])
+        return reply[1] if len(reply) > 1 else None
+
+    def send_command(self, command):
+        try:
+            self.request('command', command)
+        except (OSError, EOFError) as e:
+            print(f"Acquisition daemon unreachable: {e}")
+
+    @property
+    def messages(self):
+        return self.telemetry.messages.latest()
+
+    @property
+    def is_connected(self):
+        """True while the daemon is alive and holds the serial port."""
+        if self.telemetry is None:
+            return False
+        fresh = time.time_ns() - self.telemetry.header('heartbeat_ns') < STALE_SECONDS * 1e9
+        return fresh and bool(self.telemetry.header('connected'))
+
+    @property
+    def queue_dropped(self):
+        return self.telemetry.header('queue_dropped')
+
+    @property
+    def failed_frames(self):
+        return self.telemetry.header('failed_frames')
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(':')
+    return (host or '127.0.0.1', int(port))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Own the fuel cell's serial port and share its telemetry.")
+    parser.add_argument('port', nargs='?', help="Serial port of the fuel cell, e.g. COM7.")
+    parser.add_argument('--baudrate', type=int, default=57600)
+    parser.add_argument('--name', default=SHM_NAME, help="Shared memory segment name.")
+    parser.add_argument('--capacity', type=int, default=86400, help="Frames of history kept.")
+    parser.add_argument('--address', default='127.0.0.1:6001', help="host:port of the command channel.")
+    parser.add_argument('--allow-remote', action='store_true',
+                        help="Accept a non-loopback --address; clients need a copy of the key file.")
+    parser.add_argument('--key-file', default=None,
+                        help="Where to write the command channel key (default: ~/.exocet/daemon-<port>.key).")
+    parser.add_argument('--record', metavar='CONF', help="Also record to QuestDB with this client configuration.")
+    parser.add_argument('--capture', nargs='?', const='', metavar='FILE',
+                        help="Also keep the raw serial bytes in a capture file (default: data/captures/).")
+    parser.add_argument('--metrics-port', type=int, default=None, help="Serve Prometheus metrics on this port.")
+    parser.add_argument('--emulate', action='store_true', help="Acquire from the Protium-2500 emulator.")
+    args = parser.parse_args()
+
+    emulator = None
+    port = args.port
+    if args.emulate:
+        from protium_emulator import ProtiumEmulator
+        emulator = ProtiumEmulator().start()
+        port = emulator.port
+    elif not port:
+        parser.error("the serial port is required unless --emulate is given")
+
+    from metrics import serve
+    server = serve(args.metrics_port) if args.metrics_port is not None else None
+    try:
+        daemon = AcquisitionDaemon(port, args.baudrate, args.name, args.capacity, parse_address(args.address),
+                                   args.key_file, args.allow_remote)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        if emulator:
+            emulator.stop()
+        if server:
+            server.stop()
+        return
+    ingestor = None
+    if args.record:
+        from telemetry_ingest import TelemetryIngestor
+        ingestor = TelemetryIngestor(args.record, symbols={'port': port}).start()
+        daemon.controller.add_listener(ingestor.on_item)
+    if args.capture is not None:
+        print(f"Capturing raw bytes to {daemon.controller.start_capture(args.capture or None)}")
+    daemon.start()
+    print(f"Sharing {port} as '{args.name}', commands on {daemon.address[0]}:{daemon.address[1]}, "
+          f"key in {daemon.key_file} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("\nStopping.")
+    finally:
+        daemon.stop()
+        if ingestor:
+            ingestor.stop()
+        if emulator:
+            emulator.stop()
+        if server:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+import argparse
+import itertools
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+DIRECTIONS = ('backward', 'nearest')
+CHUNK_ROWS = 100_000
+
+
+def to_ns(values):
+    """
+    Converts timestamps to int64 nanoseconds since the epoch: datetime64
+    values as they are, numbers as seconds since the epoch.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == 'M':
+        return values.astype('datetime64[ns]').view(np.int64)
+    return (values.astype(float) * 1e9).astype(np.int64)
+
+
+def asof_indices(base_ns, other_ns, tolerance_ns=None, direction='backward'):
+    """
+    Vectorized as-of match of every base time to a row of a sorted other
+    stream.
+
+    Args:
+        base_ns, other_ns (np.ndarray): Sorted int64 nanosecond timestamps.
+        tolerance_ns (int, optional): Maximum distance to the matched row.
+        direction (str): 'backward' matches the last row at or before each
+            base time; 'nearest' the closest row on either side.
+
+    Returns:
+        np.ndarray: Index into other_ns per base time, -1 for no match.
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError(f"direction must be one of {DIRECTIONS}, got {direction!r}")
+    if not len(other_ns):
+        return np.full(len(base_ns), -1)
+    index = np.searchsorted(other_ns, base_ns, side='right') - 1
+    distance = np.where(index >= 0, base_ns - other_ns[np.maximum(index, 0)], np.iinfo(np.int64).max)
+    if direction == 'nearest':
+        after = np.minimum(index + 1, len(other_ns) - 1)
+        after_distance = np.where(index + 1 < len(other_ns), other_ns[after] - base_ns, np.iinfo(np.int64).max)
+        closer = after_distance < distance
+        index = np.where(closer, after, index)
+        distance = np.where(closer, after_distance, distance)
+    if tolerance_ns is not None:
+        index = np.where(distance <= tolerance_ns, index, -1)
+    return np.where(distance == np.iinfo(np.int64).max, -1, index)
+
+
+def join_asof(base_ns, other_ns, values, tolerance_ns=None, direction='backward', interpolate=False):
+    """
+    Picks (or interpolates) the values of another stream at the base times.
+
+    Args:
+        values (np.ndarray): (len(other_ns), n) numeric values.
+        interpolate (bool): Interpolate linearly between the rows before and
+            after each base time when both are within the tolerance;
+            otherwise fall back to the as-of match.
+
+    Returns:
+        np.ndarray: (len(base_ns), n) values, NaN where nothing matched.
+    """
+    values = np.asarray(values, dtype=float).reshape(len(other_ns), -1)
+    index = asof_indices(base_ns, other_ns, tolerance_ns, direction)
+    out = np.where((index >= 0)[:, None], values[np.maximum(index, 0)] if len(values) else np.nan, np.nan)
+
+    if interpolate and len(other_ns) > 1:
+        before = np.searchsorted(other_ns, base_ns, side='right') - 1
+        after = before + 1
+        usable = (before >= 0) & (after < len(other_ns))
+        b, a = np.maximum(before, 0), np.minimum(after, len(other_ns) - 1)
+        if tolerance_ns is not None:
+            usable &= (base_ns - other_ns[b] <= tolerance_ns) & (other_ns[a] - base_ns <= tolerance_ns)
+        span = (other_ns[a] - other_ns[b]).astype(float)
+        weight = np.divide((base_ns - other_ns[b]).astype(float), span, out=np.zeros(len(base_ns)), where=span > 0)
+        interpolated = values[b] + (values[a] - values[b]) * weight[:, None]
+        out = np.where(usable[:, None] & ~np.isnan(interpolated), interpolated, out)
+    return out
+
+
+class Source:
+    """
+    One timestamped stream to align: an iterable of time-sorted DataFrame
+    chunks (or a single DataFrame). Only numeric `columns` are aligned;
+    output columns are named `prefix + column`.
+    """
+
+    def __init__(self, name, chunks, time_column='timestamp', columns=None, prefix=None):
+        self.name = name
+        self.chunks = iter([chunks] if isinstance(chunks, pd.DataFrame) else chunks)
+        self.time_column = time_column
+        self.columns = list(columns) if columns is not None else None
+        self.prefix = f"{name}." if prefix is None else prefix
+        self._times = np.empty(0, dtype=np.int64)
+        self._values = None
+        self.exhausted = False
+
+    def _pull(self):
+        try:
+            chunk = next(self.chunks)
+        except StopIteration:
+            self.exhausted = True
+            return
+        if self.columns is None:
+            self.columns = [c for c in chunk.columns if c != self.time_column and chunk[c].dtype.kind in 'fiub']
+        chunk = chunk.dropna(subset=[self.time_column])
+        times = to_ns(chunk[self.time_column].to_numpy())
+        values = chunk[self.columns].to_numpy(dtype=float)
+        if self._values is None:
+            self._values = np.empty((0, len(self.columns)))
+        self._times = np.concatenate([self._times, times])
+        self._values = np.concatenate([self._values, values])
+
+    def window(self, start_ns, end_ns, horizon_ns):
+        """
+        Buffers the rows needed to align base times in [start_ns, end_ns]
+        and drops the ones no later base time can use: everything before
+        the last row at or before start_ns.
+        """
+        while not self.exhausted and (not len(self._times) or self._times[-1] <= end_ns + horizon_ns):
+            self._pull()
+        keep = max(np.searchsorted(self._times, start_ns, side='right') - 1, 0)
+        self._times = self._times[keep:]
+        if self._values is not None:
+            self._values = self._values[keep:]
+        return self._times, self._values
+
+    @property
+    def output_columns(self):
+        return [self.prefix + column for column in self.columns or []]
+
+
+def align(base, sources, tolerance=None, direction='backward', interpolate=False):
+    """
+    Aligns several streams on the timestamps of a base stream, chunk by chunk.
+
+    Args:
+        base (Source): Stream whose rows define the output rows; its own
+            columns are kept as they are.
+        sources (list of Source): Streams joined onto the base times.
+        tolerance (float, optional): Maximum distance in seconds to a
+            matched row; unmatched values are NaN.
+        direction (str): 'backward' (causal) or 'nearest'.
+        interpolate (bool): Interpolate between neighbouring rows.
+
+    Yields:
+        pandas.DataFrame: One aligned chunk per base chunk, with a
+        `timestamp` column (datetime64[ns]). Only the rows each chunk needs
+        are buffered, so recordings of any length can be processed.
+    """
+    tolerance_ns = None if tolerance is None else int(tolerance * 1e9)
+    lookahead = direction == 'nearest' or interpolate
+    horizon_ns = (tolerance_ns if tolerance_ns is not None else 0) if lookahead else 0
+
+    for chunk in base.chunks:
+        chunk = chunk.dropna(subset=[base.time_column])
+        if chunk.empty:
+            continue
+        base_ns = to_ns(chunk[base.time_column].to_numpy())
+        out = {'timestamp': base_ns.view('datetime64[ns]')}
+        for column in chunk.columns:
+            if column != base.time_column:
+                out[base.prefix + column] = chunk[column].to_numpy()
+        for source in sources:
+            times, values = source.window(base_ns[0], base_ns[-1], horizon_ns)
+            if values is None:
+                continue
+            joined = join_asof(base_ns, times, values, tolerance_ns, direction, interpolate)
+            for i, name in enumerate(source.output_columns):
+                out[name] = joined[:, i]
+        yield pd.DataFrame(out)
+
+
+# --- Stream adapters ---
+
+def frame_chunks(df, rows=CHUNK_ROWS):
+    """Splits an in-memory DataFrame into chunks."""
+    for start in range(0, len(df), rows):
+        yield df.iloc[start:start + rows]
+
+
+def _numeric_or_text(values):
+    # Numbers with the firmware's 'XX.X' placeholders become floats (NaN);
+    # a column holding anything else, such as QuestDB symbols, stays text.
+    numbers = pd.to_numeric(values, errors='coerce')
+    text = values[numbers.isna() & values.notna()].astype(str).str.strip()
+    return numbers if text.str.fullmatch(r'[Xx.\-]*').all() else values
+
+
+def file_chunks(path, rows=CHUNK_ROWS, columns=None):
+    """
+    Reads a Parquet or CSV file in chunks of about `rows` rows. In CSV
+    files, `Date-Time` (run logs) and ISO `timestamp` (QuestDB exports)
+    columns are parsed as times.
+    """
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        from run_cache import DATE_TIME_COLUMN, DATE_TIME_FORMAT
+        for chunk in pd.read_csv(path, chunksize=rows, usecols=columns, skipinitialspace=True):
+            chunk.columns = chunk.columns.str.strip()
+            if DATE_TIME_COLUMN in chunk.columns:
+                chunk[DATE_TIME_COLUMN] = pd.to_datetime(chunk[DATE_TIME_COLUMN], format=DATE_TIME_FORMAT, errors='coerce')
+            if 'timestamp' in chunk.columns and chunk['timestamp'].dtype == object:
+                # QuestDB writes UTC ('2025-11-28T10:00:00.000000Z'); kept as naive UTC.
+                chunk['timestamp'] = pd.to_datetime(chunk['timestamp'], utc=True, errors='coerce').dt.tz_localize(None)
+            for column in chunk.columns:
+                if column not in (DATE_TIME_COLUMN, 'timestamp') and chunk[column].dtype == object:
+                    chunk[column] = _numeric_or_text(chunk[column])
+            yield chunk
+
+
+def daq_wide(chunks, channels=None):
+    """
+    Pivots NI DAQ blocks (timestamp, channel_id, voltage) to one column per
+    channel.
+
+    The rows of a chunk's last timestamp are held back until the next
+    chunk, where its other channels may be, so each time gives one row.
+    Every chunk has the same columns: `channels`, or the channels of the
+    first complete timestamps.
+    """
+    def pivot(rows):
+        wide = rows.pivot(index='timestamp', columns='channel_id', values='voltage')
+        return wide.reindex(columns=channels).reset_index()
+
+    carry = None
+    for chunk in chunks:
+        chunk = chunk.assign(channel_id=chunk['channel_id'].astype(str))
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        if chunk.empty:
+            continue
+        last = chunk['timestamp'].iloc[-1]
+        tail = (chunk['timestamp'] == last).to_numpy()
+        carry = chunk[tail]
+        complete = chunk[~tail]
+        if complete.empty:
+            continue
+        if channels is None:
+            channels = sorted(complete['channel_id'].unique())
+        yield pivot(complete)
+    if carry is not None and len(carry):
+        if channels is None:
+            channels = sorted(carry['channel_id'].unique())
+        yield pivot(carry)
+
+
+def telemetry_frame(buffer):
+    """Copies a TelemetryRingBuffer's rows to a DataFrame (epoch-second timestamps)."""
+    return pd.DataFrame(np.array(buffer.window()), columns=buffer.columns)
+
+
+def load_frame(samples):
+    """Turns LoadController.samples into a DataFrame."""
+    return pd.DataFrame(list(samples), columns=['timestamp', 'voltage', 'current', 'power',
+                                                'operation_state', 'demand_state'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Align timestamped recordings on the rows of a base recording.")
+    parser.add_argument('base', help="Base recording (Parquet or CSV).")
+    parser.add_argument('--source', action='append', default=[], metavar='NAME=PATH',
+                        help="Recording to join, e.g. protium=data/run.csv; repeatable.")
+    parser.add_argument('--tolerance', type=float, default=None, help="Maximum match distance in seconds.")
+    parser.add_argument('--direction', choices=DIRECTIONS, default='backward')
+    parser.add_argument('--interpolate', action='store_true')
+    parser.add_argument('--chunk', type=int, default=CHUNK_ROWS, help="Rows per chunk.")
+    parser.add_argument('--output', default='data/aligned.parquet')
+    args = parser.parse_args()
+
+
+    def open_source(name, path, prefix=None):
+        chunks = file_chunks(path, args.chunk)
+        first = next(chunks)
+        rest = itertools.chain([first], chunks)
+        if 'channel_id' in first.columns:
+            rest = daq_wide(rest)
+            time_column = 'timestamp'
+        else:
+            time_column = 'timestamp' if 'timestamp' in first.columns else 'Date-Time'
+        return Source(name, rest, time_column, prefix=prefix)
+
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    base = open_source('base', args.base, prefix='')
+    sources = [open_source(*spec.split('=', 1)) for spec in args.source]
+    start = time.perf_counter()
+    rows = 0
+    writer = None
+    try:
+        for chunk in align(base, sources, args.tolerance, args.direction, args.interpolate):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                directory = os.path.dirname(args.output)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                writer = pq.ParquetWriter(args.output, table.schema)
+            writer.write_table(table)
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    print(f"{rows} aligned rows in {time.perf_counter() - start:.2f} s -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,249 @@
+import time
+from datetime import datetime, time as day_time
+from multiprocessing import AuthenticationError
+
 import streamlit as st
+import pandas as pd
+from acquisition_daemon import RemoteController, parse_address
+from derived_metrics import DerivedMetrics
 from fuel_cell_controller import FuelCellController
-import time
+from history import HistoryClient
+from metrics import REGISTRY, MetricsWriter, serve
+from protium_parser import FIELDS
+from telemetry_ingest import TelemetryIngestor
+from downsample import minmax_indices
+
+REFRESH_SECONDS = 0.5
+CHART_BUCKETS = 600  # Roughly the chart width in pixels
+CHART_WINDOWS = {"10 min": 600, "1 h": 3600, "8 h": 8 * 3600, "All": None}
+CHARTS = (
+    ("Voltage (V)", ["FC_V"]),
+    ("Current (A)", ["FC_A"]),
+    ("Power (W)", ["FC_W"]),
+    ("Temperature (C)", ["FCT1", "FCT2"]),
+)
+HISTORY_SPANS = {"10 min": 600, "1 h": 3600, "8 h": 8 * 3600, "1 day": 86400, "1 week": 7 * 86400}
+UNITS = {field.key: field.unit for field in FIELDS}
+RENDER_TIMER = REGISTRY.timer('exocet_dashboard_render_seconds', "Time to render the live telemetry fragment")
+RENDER_LAG = REGISTRY.gauge('exocet_dashboard_lag_seconds', "Age of the newest frame when the dashboard renders it")
+
+@st.cache_resource
+def metrics_server():
+    # One endpoint per Streamlit process, shared by every session.
+    return serve()
+
+@st.cache_resource
+def history_client():
+    # One page cache for every session of this Streamlit process.
+    return HistoryClient()
+
+def pan_history(fraction):
+    st.session_state.history_end += fraction * HISTORY_SPANS[st.session_state.history_span]
+
+def jump_history(end=None):
+    # Without an end, now: the time of the click, not of the render.
+    st.session_state.history_end = time.time() if end is None else end
+
+def history_view():
+    """Recorded telemetry from QuestDB, downsampled server-side to the chart width."""
+    if 'history_end' not in st.session_state:
+        st.session_state.history_end = time.time()
+    client = history_client()
+
+    span = HISTORY_SPANS[st.select_slider("Span", list(HISTORY_SPANS), value="1 h", key="history_span")]
+    back_col, next_col, now_col, day_col = st.columns([1, 1, 1, 2])
+    back_col.button("◀ Earlier", on_click=pan_history, args=(-0.5,))
+    next_col.button("Later ▶", on_click=pan_history, args=(0.5,))
+    now_col.button("Now", on_click=jump_history)
+    day = day_col.date_input("Day", value=None, key="history_day", label_visibility="collapsed")
+    if day is not None and day_col.button("Go to day"):
+        jump_history(datetime.combine(day, day_time.max).timestamp())
+        st.rerun()
+
+    end = st.session_state.history_end
+    start = end - span
+    st.caption(f"{datetime.fromtimestamp(start):%Y-%m-%d %H:%M} to {datetime.fromtimestamp(end):%Y-%m-%d %H:%M}")
+    source = st.radio("Data", ["Fuel cell", "NI DAQ"], horizontal=True, key="history_source")
+    try:
+        if source == "Fuel cell":
+            port = st.text_input("Port (blank for all)", '', key="history_port")
+            fields = [key for _, columns in CHARTS for key in columns]
+            frame = client.telemetry(start, end, fields, port=port or None, points=CHART_BUCKETS)
+            chart_cols = st.columns(2)
+            for i, (title, columns) in enumerate(CHARTS):
+                with chart_cols[i % 2]:
+                    st.caption(title)
+                    st.line_chart(frame[columns], height=220)
+        else:
+            frame = client.daq(start, end, points=CHART_BUCKETS)
+            st.line_chart(frame, height=300)
+    except (OSError, ValueError) as e:
+        st.error(f"QuestDB query failed: {e}")
+        return
+    if frame.empty:
+        st.info("Nothing recorded in this range.")
+    stats = client.stats()
+    st.caption(f"{len(frame)} buckets; cache: {stats['pages']} pages, {stats['hits']} hits, "
+               f"{stats['misses']} misses, {stats['queries']} queries")
+
+def stage_table(controller):
+    """p50/p99 of each pipeline stage, in ms, from the controller's timers."""
+    rows = []
+    for stage, timer in (("Serial read", controller.read_timer), ("Parse", controller.parse_timer),
+                         ("Dispatch", controller.dispatch_timer), ("Render", RENDER_TIMER)):
+        recent = sorted(timer.recent)
+        if recent:
+            rows.append({"stage": stage, "count": timer.count,
+                         "p50_ms": recent[len(recent) // 2] * 1000,
+                         "p99_ms": recent[min(len(recent) - 1, int(0.99 * len(recent)))] * 1000})
+    return pd.DataFrame(rows)
+
+def chart_frame(telemetry, columns, seconds):
+    """
+    Returns the buffered history of `columns` over the last `seconds`,
+    downsampled to a min/max envelope of CHART_BUCKETS buckets.
+    """
+    if seconds is None:
+        window = telemetry.window()
+    else:
+        latest = telemetry.latest()
+        if not latest:
+            return None
+        window = telemetry.since(latest["timestamp"] - seconds)
+    if not len(window):
+        return None
+
+    values = [window[:, telemetry.columns.index(column)] for column in columns]
+    indices = minmax_indices(values, CHART_BUCKETS)
+    return pd.DataFrame(
+        {column: series[indices] for column, series in zip(columns, values)},
+        index=pd.to_datetime(window[indices, 0], unit='s'))
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def live_telemetry(controller):
+    # Only this fragment reruns on the refresh timer; the page and the
+    # sidebar commands are left alone.
+    if not controller.is_connected:
+        st.warning("Serial port closed." if isinstance(controller, FuelCellController)
+                   else "Acquisition daemon stopped or lost the serial port.")
+        return
+    with RENDER_TIMER.time():
+        render_telemetry(controller)
+
+def derived_metrics(telemetry, cells, active_area):
+    # Kept per session; a new engine (new settings, new connection) first
+    # catches up with the whole buffered history in one batch.
+    key = (id(telemetry), cells, active_area)
+    if st.session_state.get('derived_key') != key:
+        st.session_state.derived = DerivedMetrics(cells, active_area)
+        st.session_state.derived_key = key
+    return st.session_state.derived.follow(telemetry)
+
+def render_telemetry(controller):
+    telemetry = controller.telemetry
+    latest = telemetry.latest()
+    stats = telemetry.stats()
+    if latest:
+        RENDER_LAG.set(time.time() - latest["timestamp"])
+
+    if latest:
+        metric_cols = st.columns(4)
+        for col, key in zip(metric_cols, ("FC_V", "FC_A", "FC_W", "FCT1")):
+            value = latest.get(key)
+            col.metric(f"{key} ({UNITS[key]})", "-" if value is None else f"{value:.2f}")
+    else:
+        st.text("Waiting for data...")
+
+    window_label = st.radio("History", list(CHART_WINDOWS), horizontal=True, key="chart_window")
+    chart_cols = st.columns(2)
+    for i, (title, columns) in enumerate(CHARTS):
+        with chart_cols[i % 2]:
+            st.caption(title)
+            frame = chart_frame(telemetry, columns, CHART_WINDOWS[window_label])
+            if frame is not None:
+                st.line_chart(frame, height=220)
+
+    with st.expander("All fields and buffer status"):
+        size_col, drop_col = st.columns(2)
+        size_col.metric("Buffered Frames", f"{stats['size']} / {stats['capacity']}")
+        drop_col.metric("Overwritten / Dropped", f"{stats['overwritten']} / {stats['dropped']}")
+        if latest:
+            st.dataframe(pd.DataFrame(
+                [{"field": field.key, "value": latest[field.key], "unit": field.unit}
+                 for field in FIELDS if field.key in latest]), hide_index=True)
+
+    with st.expander("Derived Metrics"):
+        cells_col, area_col = st.columns(2)
+        cells = cells_col.number_input("Cells", min_value=0, value=0, key="cells",
+                                       help="Cells in the stack, for per-cell voltage and efficiency.")
+        area = area_col.number_input("Active area (cm²)", min_value=0.0, value=0.0, key="active_area")
+        values = derived_metrics(telemetry, cells, area)
+        st.dataframe(pd.DataFrame(
+            [{"metric": name, "value": value} for name, value in values.items()
+             if name != 'timestamp' and value == value]), hide_index=True)
+
+    with st.expander("Pipeline"):
+        parse_col, drop_col, lag_col = st.columns(3)
+        lag_col.metric("Display Lag", f"{RENDER_LAG.value:.2f} s")
+        if isinstance(controller, FuelCellController):
+            parse_col.metric("Parse Failures", controller.parser.failed_frames)
+            drop_col.metric("Frames Lost", stats['dropped'] + controller.queue_dropped,
+                            help="Discarded by a full history (drop policy) or by an open data_queue.")
+            table = stage_table(controller)
+            if not table.empty:
+                st.dataframe(table, hide_index=True)
+        else:
+            # The stage timers live in the daemon; see its --metrics-port endpoint.
+            parse_col.metric("Parse Failures", controller.failed_frames)
+            drop_col.metric("Frames Lost", stats['dropped'] + controller.queue_dropped,
+                            help="Discarded by a full history (drop policy) or by an open data_queue.")
+
+    with st.expander("Raw Messages"):
+        st.text_area("Messages from the fuel cell:", "\n".join(list(controller.messages)), height=200)
 
 def main():
     st.title("Protium-2500 Fuel Cell Controller")
 
     if 'controller' not in st.session_state:
         st.session_state.controller = None
+    if 'ingestor' not in st.session_state:
+        st.session_state.ingestor = None
+    if 'metrics_writer' not in st.session_state:
+        st.session_state.metrics_writer = None
+    metrics_server()
+
+    if st.radio("View", ["Live", "History"], horizontal=True, key="view") == "History":
+        history_view()
+        return
 
-    port = st.text_input("Enter the COM port (e.g., COM7):", 'COM7')
+    source = st.radio("Source", ["Serial port", "Acquisition daemon"], horizontal=True,
+                      help="Sessions attached to acquisition_daemon.py share its port and history.")
+    if source == "Serial port":
+        port = st.text_input("Enter the COM port (e.g., COM7):", 'COM7')
+    else:
+        address = st.text_input("Daemon address:", '127.0.0.1:6001')
 
     if st.button("Connect"):
-        if st.session_state.controller is None:
+        if st.session_state.controller is not None:
+            st.warning("Already connected.")
+        elif source == "Serial port":
             st.session_state.controller = FuelCellController(port)
             st.session_state.controller.connect()
             st.success(f"Connected to {port}")
         else:
-            st.warning("Already connected.")
+            try:
+                st.session_state.controller = RemoteController(parse_address(address)).connect()
+                st.success(f"Attached to the daemon on {address} ({st.session_state.controller.port})")
+            except (OSError, ValueError, AuthenticationError) as e:
+                st.error(f"No acquisition daemon on {address}: {e}")
 
     if st.button("Disconnect"):
         if st.session_state.controller:
             st.session_state.controller.disconnect()
             st.session_state.controller = None
+            if st.session_state.ingestor:
+                st.session_state.ingestor.stop()
+                st.session_state.ingestor = None
             st.info("Disconnected.")
         else:
             st.warning("Not connected.")
@@ -53,6 +275,9 @@ def main():
                 st.session_state.controller.increase_fan_speed_1()
             if st.button("+5%"):
                 st.session_state.controller.increase_fan_speed_5()
+        fan = st.sidebar.number_input("Fan setpoint (%)", 0, 100, 50, key="fan_setpoint")
+        if st.sidebar.button("Set Fan Speed"):
+            st.session_state.controller.set_fan_speed(fan)
 
         st.sidebar.subheader("Blower Intensity")
         col3, col4 = st.sidebar.columns(2)
@@ -62,35 +287,41 @@ def main():
         with col4:
             if st.button("+3%"):
                 st.session_state.controller.increase_blower_intensity_3()
+        blower = st.sidebar.number_input("Blower setpoint (%)", 0, 100, 50, step=3, key="blower_setpoint")
+        if st.sidebar.button("Set Blower Intensity"):
+            st.session_state.controller.set_blower_intensity(blower)
+        for name, setpoint in st.session_state.controller.setpoint_status().items():
+            if setpoint["status"] != 'idle':
+                st.sidebar.caption(f"{name.capitalize()}: {setpoint['status']} "
+                                   f"({setpoint['commands'] or 'no change'})")
+
+        st.sidebar.subheader("Recording")
+        if not isinstance(st.session_state.controller, FuelCellController):
+            st.sidebar.caption("Telemetry is recorded by the daemon (--record).")
+        elif st.sidebar.checkbox("Record to QuestDB", value=st.session_state.ingestor is not None):
+            if st.session_state.ingestor is None:
+                st.session_state.ingestor = TelemetryIngestor(
+                    symbols={'port': st.session_state.controller.port}).start()
+                st.session_state.controller.add_listener(st.session_state.ingestor.on_item)
+        elif st.session_state.ingestor is not None:
+            st.session_state.controller.remove_listener(st.session_state.ingestor.on_item)
+            st.session_state.ingestor.stop()
+            st.session_state.ingestor = None
+        if isinstance(st.session_state.controller, FuelCellController):
+            capturing = st.session_state.controller.capture is not None
+            if st.sidebar.checkbox("Capture raw serial bytes", value=capturing):
+                st.sidebar.caption(f"Capturing to {st.session_state.controller.start_capture()}")
+            elif capturing:
+                st.session_state.controller.stop_capture()
+        if st.sidebar.checkbox("Record pipeline metrics", value=st.session_state.metrics_writer is not None):
+            if st.session_state.metrics_writer is None:
+                st.session_state.metrics_writer = MetricsWriter().start()
+        elif st.session_state.metrics_writer is not None:
+            st.session_state.metrics_writer.stop()
+            st.session_state.metrics_writer = None
 
         st.header("Real-time Data")
-        data_placeholder = st.empty()
-
-        if 'latest_data' not in st.session_state:
-            st.session_state.latest_data = {}
-        if 'raw_messages' not in st.session_state:
-            st.session_state.raw_messages = []
-
-        while st.session_state.controller and st.session_state.controller.serial and st.session_state.controller.serial.is_open:
-            while not st.session_state.controller.data_queue.empty():
-                data = st.session_state.controller.data_queue.get()
-                if "raw" in data:
-                    st.session_state.raw_messages.append(data["raw"])
-                else:
-                    st.session_state.latest_data.update(data)
-            
-            with data_placeholder.container():
-                st.metric("Data Queue Size", st.session_state.controller.data_queue.qsize())
-                if st.session_state.latest_data:
-                    st.json(st.session_state.latest_data)
-                else:
-                    st.text("Waiting for data...")
-                
-                st.subheader("Raw Messages")
-                st.text_area("Messages from the fuel cell:", "\n".join(st.session_state.raw_messages), height=200)
-            
-            time.sleep(0.5)
-            st.rerun()
+        live_telemetry(st.session_state.controller)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
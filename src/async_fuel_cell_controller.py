@@ -0,0 +1,124 @@
+import asyncio
+
+import serial
+
+from fuel_cell_controller import ProtiumCommands
+from protium_parser import ProtiumFrameParser
+
+_CLOSED = object()
+
+
+class AsyncFuelCellController(ProtiumCommands):
+    """
+    asyncio counterpart of FuelCellController.
+
+    Instead of a reader thread per port, the serial file descriptor is
+    registered with the running event loop, so a single process can serve
+    many Protium-2500 units. Parsed items are exposed as an async iterator.
+
+    Relies on loop.add_reader, i.e. a POSIX selector event loop; on Windows
+    use FuelCellController.
+    """
+
+    def __init__(self, port, baudrate=57600, queue_size=1000):
+        self.port = port
+        self.baudrate = baudrate
+        self.queue_size = queue_size
+        self.serial = None
+        self.parser = ProtiumFrameParser()
+        self.dropped = 0
+        self._queue = None
+        self._loop = None
+
+    async def connect(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self.parser.reset()
+        # timeout=0: reads never block the event loop.
+        self.serial = serial.Serial(self.port, self.baudrate, timeout=0)
+        self._loop.add_reader(self.serial.fileno(), self._on_readable)
+        print(f"Connected to {self.port} at {self.baudrate} baud.")
+
+    async def disconnect(self):
+        if self.serial and self.serial.is_open:
+            self._loop.remove_reader(self.serial.fileno())
+            self.serial.close()
+            self._put(_CLOSED)
+            print(f"Disconnected from {self.port}.")
+
+    @property
+    def is_connected(self):
+        return bool(self.serial and self.serial.is_open)
+
+    def send_command(self, command):
+        if self.serial and self.serial.is_open:
+            self.serial.write(command.encode('ascii'))
+        else:
+            print("Serial port not connected.")
+
+    def _on_readable(self):
+        try:
+            raw_data = self.serial.read(self.serial.in_waiting or 1)
+        except (OSError, serial.SerialException) as e:
+            print(f"Error reading {self.port}: {e}")
+            self._loop.remove_reader(self.serial.fileno())
+            self.serial.close()
+            self._put(_CLOSED)
+            return
+        for parsed_data in self.parser.feed(raw_data):
+            self._put(parsed_data)
+
+    def _put(self, item):
+        if self._queue.full():
+            # Keep the most recent telemetry when the consumer falls behind.
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(item)
+
+    async def items(self):
+        """Yields every parsed item (frames, errors, raw text) until disconnected."""
+        while True:
+            item = await self._queue.get()
+            if item is _CLOSED:
+                return
+            yield item
+
+    async def frames(self):
+        """Yields the parsed telemetry frames only."""
+        async for item in self.items():
+            if "raw" not in item and "error" not in item:
+                yield item
+
+    def __aiter__(self):
+        return self.frames()
+
+
+async def merge(controllers, frames_only=True):
+    """
+    Multiplexes several controllers into one async iterator.
+
+    Yields:
+        tuple: (controller, item) in arrival order.
+    """
+    queue = asyncio.Queue()
+    remaining = len(controllers)
+
+    async def pump(controller):
+        source = controller.frames() if frames_only else controller.items()
+        try:
+            async for item in source:
+                await queue.put((controller, item))
+        finally:
+            await queue.put((controller, _CLOSED))
+
+    tasks = [asyncio.create_task(pump(controller)) for controller in controllers]
+    try:
+        while remaining:
+            controller, item = await queue.get()
+            if item is _CLOSED:
+                remaining -= 1
+                continue
+            yield controller, item
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,243 @@
+import argparse
+import ast
+import glob
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+matplotlib.use('Agg')  # Workers render to files only; no display needed.
+
+import plot_polarization
+from run_cache import update_cache
+
+REPORT_DIR = 'data/figures/runs'
+MANIFEST_NAME = 'manifest.json'
+DIGESTS_NAME = 'digests.json'
+REQUIRED_COLUMNS = ('Date-Time', 'FC_A (A)', 'FC_V (V)')
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_digest(path, cache):
+    """
+    file_digest(path), reused from `cache` ({path: {"mtime_ns", "size",
+    "sha256"}}) while the file's mtime and size are unchanged, as in
+    run_cache. New digests are stored in `cache`.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    entry = cache.get(path)
+    if entry is None or entry["mtime_ns"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+        entry = cache[path] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": file_digest(path)}
+    return entry["sha256"]
+
+
+def local_imports(path):
+    """
+    Source files of the module at `path` and of the modules next to it that
+    it imports, directly or not.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    found = set()
+    pending = [os.path.abspath(path)]
+    while pending:
+        path = pending.pop()
+        if path in found:
+            continue
+        found.add(path)
+        with open(path, encoding='utf-8') as f:
+            tree = ast.parse(f.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                candidate = os.path.join(directory, name.split('.')[0] + '.py')
+                if os.path.exists(candidate):
+                    pending.append(candidate)
+    return sorted(found)
+
+
+def code_digest(cache=None):
+    """Digest of the plotting code: plot_polarization and every local module it imports."""
+    cache = {} if cache is None else cache
+    digests = {os.path.basename(path): cached_digest(path, cache) for path in local_imports(plot_polarization.__file__)}
+    return hashlib.sha256(json.dumps(digests, sort_keys=True).encode()).hexdigest()
+
+
+def job_key(kind, input_digests, params, code_digest):
+    """Hash identifying a figure: its kind, inputs, plotting parameters and plotting code."""
+    payload = json.dumps([kind, input_digests, params, code_digest], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def plan_jobs(csv_files, output_dir, active_area=1.0, steady_state=False, digest_cache=None):
+    """
+    Lists the figures of a report: a polarization curve and a time series
+    per run, plus a polarization curve over all runs.
+
+    Args:
+        digest_cache (dict, optional): File digests of a previous run, see
+            cached_digest; only files whose stat changed are hashed again.
+
+    Returns:
+        list of dict: Jobs with kind, inputs, output path and key.
+    """
+    cache = {} if digest_cache is None else digest_cache
+    code = code_digest(cache)
+    digests = {csv_file: cached_digest(csv_file, cache) for csv_file in csv_files}
+    params = {"active_area": active_area, "steady_state": steady_state}
+
+    jobs = []
+    for csv_file in csv_files:
+        stem = os.path.splitext(os.path.basename(csv_file))[0]
+        jobs.append({"kind": "polarization", "inputs": [csv_file], "params": params,
+                     "output": os.path.join(output_dir, stem + '-polarization.png')})
+        jobs.append({"kind": "time_series", "inputs": [csv_file], "params": {},
+                     "output": os.path.join(output_dir, stem + '-time-series.png')})
+    if len(csv_files) > 1:
+        jobs.append({"kind": "polarization", "inputs": list(csv_files), "params": params,
+                     "output": os.path.join(output_dir, 'all-polarization.png')})
+
+    for job in jobs:
+        job["key"] = job_key(job["kind"], [digests[f] for f in job["inputs"]], job["params"], code)
+    return jobs
+
+
+def render(job):
+    """
+    Renders one job; runs in a worker process.
+
+    Returns:
+        bool: Whether a figure was written; False when the run has no
+        valid data. Errors (unreadable file, full disk, ...) are raised,
+        so the job is not recorded as up to date and runs again next time.
+    """
+    if os.path.exists(job["output"]):
+        os.remove(job["output"])
+    if job["kind"] == "polarization":
+        plot_polarization.plot_polarization_curve(job["inputs"], job["params"]["active_area"], job["output"],
+                                                  steady_state=job["params"]["steady_state"], raise_errors=True)
+    else:
+        plot_polarization.plot_time_series(job["inputs"][0], job["output"], raise_errors=True)
+    return os.path.exists(job["output"])
+
+
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path, manifest):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def build_report(csv_files, output_dir=REPORT_DIR, active_area=1.0, steady_state=False, workers=None, force=False):
+    """
+    Renders the report figures of `csv_files` across a process pool.
+
+    A figure is skipped when the manifest in `output_dir` records the same
+    key for it (same input contents, parameters and plotting code) and the
+    file still exists, or when that key previously produced no figure
+    because the run has no valid data. Runs without current and voltage
+    columns are left out of the report.
+
+    Returns:
+        tuple: (rendered, skipped, failed) counts.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = load_manifest(manifest_path)
+    digests_path = os.path.join(output_dir, DIGESTS_NAME)
+    digest_cache = load_manifest(digests_path)
+
+    # Parquet caches are built here, not concurrently by several workers.
+    usable = []
+    for csv_file in csv_files:
+        try:
+            columns = update_cache(csv_file)["columns"]
+        except Exception as e:
+            print(f"Skipping {csv_file}: {e}")
+            continue
+        if all(column in columns for column in REQUIRED_COLUMNS):
+            usable.append(csv_file)
+        else:
+            print(f"Skipping {csv_file}: no {', '.join(REQUIRED_COLUMNS)} columns")
+
+    jobs = plan_jobs(usable, output_dir, active_area, steady_state, digest_cache)
+    hashed = {os.path.abspath(path) for path in usable} | set(local_imports(plot_polarization.__file__))
+    save_manifest(digests_path, {path: entry for path, entry in digest_cache.items() if path in hashed})
+    todo = []
+    for job in jobs:
+        entry = manifest.get(job["output"])
+        up_to_date = entry is not None and entry["key"] == job["key"] and (
+            not entry["written"] or os.path.exists(job["output"]))
+        if force or not up_to_date:
+            todo.append(job)
+    skipped = len(jobs) - len(todo)
+
+    rendered = failed = 0
+    if todo:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(render, job): job for job in todo}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    written = future.result()
+                except Exception as e:
+                    print(f"Error rendering {job['output']}: {e}")
+                    manifest.pop(job["output"], None)
+                    failed += 1
+                    continue
+                manifest[job["output"]] = {"key": job["key"], "written": written}
+                rendered += written
+
+    # Forget figures of runs that are no longer part of the report.
+    outputs = {job["output"] for job in jobs}
+    manifest = {output: key for output, key in manifest.items() if output in outputs}
+    save_manifest(manifest_path, manifest)
+    return rendered, skipped, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render polarization and time-series figures for every run log.")
+    parser.add_argument('files', nargs='*', help="CSV files (default: every CSV in --data).")
+    parser.add_argument('--data', default='data', help="Directory holding the CSV run logs.")
+    parser.add_argument('--output', default=REPORT_DIR, help="Directory for the figures.")
+    parser.add_argument('--area', type=float, default=1.0, help="Active area of the fuel cell in cm².")
+    parser.add_argument('--steady-state', action='store_true', help="Plot steady-state plateaus, see steady_state.py.")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument('--force', action='store_true', help="Re-render figures that are up to date.")
+    args = parser.parse_args()
+
+    csv_files = args.files or sorted(glob.glob(os.path.join(args.data, '*.csv')))
+    start = time.perf_counter()
+    rendered, skipped, failed = build_report(csv_files, args.output, args.area, args.steady_state,
+                                             args.workers, args.force)
+    elapsed = time.perf_counter() - start
+    print(f"{rendered} rendered, {skipped} up to date, {failed} failed in {elapsed:.1f} s -> {args.output}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import time
+
+import pybk8500
+import serial
+
+from bk8500_emulator import BK8500Emulator
+from load_controller import LoadController, FRAME_SIZE
+
+
+def bench_legacy(port, baudrate, readings):
+    """The former load_controller.py round trip: write, sleep 0.2 s, read(26)."""
+    ser = serial.Serial(port, baudrate, timeout=1)
+    parser = pybk8500.Parser()
+    start = time.perf_counter()
+    for _ in range(readings):
+        ser.write(bytes(pybk8500.ReadInputVoltageCurrentPowerState()))
+        time.sleep(0.2)
+        msg, _, _ = parser.parse_msg(ser.read(FRAME_SIZE))
+    elapsed = time.perf_counter() - start
+    ser.close()
+    return readings / elapsed
+
+
+def bench_requests(port, baudrate, readings):
+    """One blocking read_input() after the other."""
+    load = LoadController(port, baudrate, max_in_flight=1)
+    load.connect()
+    start = time.perf_counter()
+    for _ in range(readings):
+        load.read_input()
+    elapsed = time.perf_counter() - start
+    load.disconnect()
+    return readings / elapsed
+
+
+def bench_polling(port, baudrate, duration, max_in_flight):
+    """The polling loop with up to `max_in_flight` readings outstanding."""
+    load = LoadController(port, baudrate, max_in_flight=max_in_flight)
+    load.connect()
+    load.start_polling()
+    time.sleep(duration)
+    load.stop_polling()
+    count = len(load.samples)
+    latency = load.latency.summary()
+    load.disconnect()
+    return count / duration, latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure BK8500 readings per second against the emulator.")
+    parser.add_argument('--baudrate', type=int, default=9600, help="Emulated line rate; 0 for no wire delay.")
+    parser.add_argument('--readings', type=int, default=20, help="Readings for the request-by-request runs.")
+    parser.add_argument('--duration', type=float, default=3.0, help="Seconds for the polling runs.")
+    args = parser.parse_args()
+
+    print(f"Emulated line: {args.baudrate or 'unlimited'} baud")
+    with BK8500Emulator(args.baudrate) as emulator:
+        rate = bench_legacy(emulator.port, args.baudrate or 9600, args.readings)
+        print(f"{'legacy sleep(0.2) + read':<28} {rate:8.1f} readings/s")
+    with BK8500Emulator(args.baudrate) as emulator:
+        rate = bench_requests(emulator.port, args.baudrate or 9600, args.readings)
+        print(f"{'read_input() one by one':<28} {rate:8.1f} readings/s")
+    for max_in_flight in (1, 2, 4):
+        with BK8500Emulator(args.baudrate) as emulator:
+            rate, latency = bench_polling(emulator.port, args.baudrate or 9600, args.duration, max_in_flight)
+            print(f"{f'polling, {max_in_flight} in flight':<28} {rate:8.1f} readings/s"
+                  f"   round trip p50 {latency.get('p50_ms', 0):6.1f} ms, p99 {latency.get('p99_ms', 0):6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import argparse
+import csv
+import glob
+import os
+import time
+import tracemalloc
+
+from fuel_cell_controller import FuelCellController
+from protium_parser import FIELDS, ProtiumFrameParser, format_frame
+
+
+def load_frames(csv_file, limit=None):
+    """
+    Rebuilds the UART frames of a recorded run from its Spectronik CSV log.
+    """
+    frames = []
+    with open(csv_file, newline='') as f:
+        reader = csv.DictReader(f)
+        reader.fieldnames = [name.strip() for name in reader.fieldnames]
+        for row in reader:
+            values = {}
+            for field in FIELDS:
+                try:
+                    values[field.key] = float(row.get(field.column) or 'nan')
+                except ValueError:
+                    values[field.key] = float('nan')
+            frames.append(format_frame(values) + '\r\nRunning\r\n')
+            if limit and len(frames) >= limit:
+                break
+    return frames
+
+
+def chunked(stream, chunk_size):
+    return [stream[i:i + chunk_size] for i in range(0, len(stream), chunk_size)]
+
+
+def bench_parse_data(frames, repeat):
+    controller = FuelCellController('bench')
+    start = time.perf_counter()
+    count = 0
+    for _ in range(repeat):
+        for frame in frames:
+            if controller.parse_data(frame):
+                count += 1
+    return count, time.perf_counter() - start
+
+
+def bench_legacy_loop(chunks, repeat):
+    # The string buffering done by the previous FuelCellController._read_loop.
+    controller = FuelCellController('bench')
+    start = time.perf_counter()
+    count = 0
+    for _ in range(repeat):
+        buffer = ''
+        for chunk in chunks:
+            buffer += chunk.decode('ascii')
+            while '!' in buffer:
+                message, buffer = buffer.split('!', 1)
+                parsed = controller.parse_data(message + '!')
+                if parsed and 'FC_V' in parsed:
+                    count += 1
+            if buffer.strip():
+                buffer = ''
+    return count, time.perf_counter() - start
+
+
+def bench_frame_parser(chunks, repeat):
+    parser = ProtiumFrameParser()
+    start = time.perf_counter()
+    count = 0
+    for _ in range(repeat):
+        parser.reset()
+        for chunk in chunks:
+            for item in parser.feed(chunk):
+                if 'FC_V' in item:
+                    count += 1
+    return count, time.perf_counter() - start
+
+
+def held_per_frame(parse):
+    """Bytes still allocated per parsed frame while the items are held, as in a full consumer queue."""
+    tracemalloc.start()
+    try:
+        items = parse()
+        held = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    frames = sum(1 for item in items if 'FC_V' in item)
+    return held / frames if frames else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ProtiumFrameParser against FuelCellController.parse_data.")
+    parser.add_argument('--file', default=None, help="CSV run log used to build the frames (default: largest file in data/).")
+    parser.add_argument('--frames', type=int, default=5000, help="Maximum number of frames taken from the run.")
+    parser.add_argument('--chunk', type=int, default=4096, help="Burst size in bytes handed to the parsers.")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    csv_file = args.file
+    if csv_file is None:
+        csv_file = max(glob.glob('data/*.csv'), key=os.path.getsize)
+
+    frames = load_frames(csv_file, args.frames)
+    stream = ''.join(frames).encode('ascii')
+    chunks = chunked(stream, args.chunk)
+    print(f"{len(frames)} frames from {csv_file}, {len(stream)} bytes in {len(chunks)} chunks of {args.chunk} bytes")
+    print(f"{'Benchmark':<25} | {'Frames':>8} | {'Seconds':>8} | {'Frames/s':>10}")
+    print("-" * 60)
+
+    for name, run in (
+        ('parse_data per frame', lambda: bench_parse_data(frames, args.repeat)),
+        ('legacy read loop', lambda: bench_legacy_loop(chunks, args.repeat)),
+        ('ProtiumFrameParser', lambda: bench_frame_parser(chunks, args.repeat)),
+    ):
+        count, elapsed = run()
+        print(f"{name:<25} | {count:>8} | {elapsed:>8.3f} | {count / elapsed:>10.0f}")
+
+    def parse_records():
+        frame_parser = ProtiumFrameParser()
+        return [item for chunk in chunks for item in frame_parser.feed(chunk) if 'FC_V' in item]
+
+    controller = FuelCellController('bench')
+    print()
+    print(f"{'Buffered frame':<25} | {'Bytes':>8}")
+    print("-" * 36)
+    for name, parse in (
+        ('parse_data dicts', lambda: [controller.parse_data(frame) for frame in frames]),
+        ('TelemetryRecord', parse_records),
+    ):
+        print(f"{name:<25} | {held_per_frame(parse):>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
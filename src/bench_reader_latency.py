@@ -0,0 +1,67 @@
+import argparse
+import random
+import threading
+import time
+
+from fuel_cell_controller import READ_MODES, FuelCellController, LatencyStats
+from protium_parser import format_frame
+from pty_link import PtyLink
+
+
+def measure(read_mode, frames, rate):
+    """
+    Writes frames into a pseudo-terminal and measures the delay until the
+    controller hands each one to its listeners.
+
+    Returns:
+        tuple: (writer-to-listener LatencyStats, the controller's own LatencyStats)
+    """
+    end_to_end = LatencyStats(size=frames)
+    sent = {}
+    done = threading.Event()
+
+    def on_item(item):
+        if 'FC_V' in item:
+            index = int(item['FC_V'])
+            end_to_end.add(time.perf_counter() - sent[index])
+            if end_to_end.count == frames:
+                done.set()
+
+    with PtyLink() as link:
+        controller = FuelCellController(link.port, read_mode=read_mode)
+        controller.add_listener(on_item)
+        controller.connect()
+        try:
+            for index in range(frames):
+                # Random phase against the polling period.
+                time.sleep(random.uniform(0.5, 1.5) / rate)
+                frame = (format_frame({'FC_V': float(index), 'FC_A': 1.0}) + '\r\n').encode('ascii')
+                sent[index] = time.perf_counter()
+                link.write(frame)
+            done.wait(timeout=2)
+        finally:
+            controller.disconnect()
+    return end_to_end, controller.latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure frame latency of the serial reader modes over a pty.")
+    parser.add_argument('--frames', type=int, default=50)
+    parser.add_argument('--rate', type=float, default=10.0, help="Frames per second written by the fake device.")
+    parser.add_argument('--mode', choices=READ_MODES, action='append', help="Reader mode(s) to measure (default: all).")
+    args = parser.parse_args()
+
+    print(f"{'Mode':<6} | {'Frames':>6} | {'Mean (ms)':>9} | {'p50 (ms)':>8} | {'p95 (ms)':>8} | {'Max (ms)':>8} | {'Reported p95':>12}")
+    print("-" * 78)
+    for mode in args.mode or READ_MODES:
+        end_to_end, reported = measure(mode, args.frames, args.rate)
+        stats = end_to_end.summary()
+        if not stats['count']:
+            print(f"{mode:<6} | no frames received")
+            continue
+        print(f"{mode:<6} | {stats['count']:>6} | {stats['mean_ms']:>9.2f} | {stats['p50_ms']:>8.2f} | "
+              f"{stats['p95_ms']:>8.2f} | {stats['max_ms']:>8.2f} | {reported.summary().get('p95_ms', 0):>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
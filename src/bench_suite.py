@@ -0,0 +1,370 @@
+import argparse
+import gc
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+from bench_parser import chunked, load_frames
+from protium_parser import FIELDS, ProtiumFrameParser, TelemetryRecord, format_frame
+
+RESULTS_PATH = 'data/benchmarks/results.json'
+BASELINE_PATH = 'data/benchmarks/baseline.json'
+TOLERANCE = 0.15  # Relative change flagged as a regression.
+
+
+def synthetic_frames(count, seed=0):
+    """Frames with random values for every field, as the firmware prints them."""
+    rng = np.random.default_rng(seed)
+    values = rng.uniform(0, 100, size=(count, len(FIELDS)))
+    return [format_frame({field.key: row[i] for i, field in enumerate(FIELDS)}) + '\r\n' for row in values]
+
+
+def recorded_file():
+    """The largest run log in data/, the recorded input of the suite."""
+    return max(glob.glob('data/*.csv'), key=os.path.getsize)
+
+
+# --- Stages ---
+# Each stage is built by a factory that prepares its input and returns a
+# callable. One call is one timed repetition; it returns the number of
+# items processed and, optionally, the latency of each item in seconds.
+
+def parse_data_stage(frames):
+    from fuel_cell_controller import FuelCellController
+
+    controller = FuelCellController('bench')
+
+    def run():
+        latencies = []
+        for frame in frames:
+            start = time.perf_counter()
+            controller.parse_data(frame)
+            latencies.append(time.perf_counter() - start)
+        return len(frames), latencies
+    return run
+
+
+def frame_parser_stage(frames, chunk_size=4096):
+    chunks = chunked(''.join(frames).encode('ascii'), chunk_size)
+    parser = ProtiumFrameParser()
+
+    def run():
+        parser.reset()
+        count = 0
+        for chunk in chunks:
+            count += sum(1 for item in parser.feed(chunk) if 'FC_V' in item)
+        return count, None
+    return run
+
+
+def read_loop_stage(count, burst=10):
+    """Frames written into a pseudo-terminal and read by FuelCellController's event loop."""
+    from fuel_cell_controller import FuelCellController
+    from pty_link import PtyLink
+
+    def run():
+        sent = {}
+        latencies = []
+        done = threading.Event()
+
+        def on_item(item):
+            if 'FC_V' in item:
+                latencies.append(time.perf_counter() - sent[int(item['FC_V'])])
+                if len(latencies) == count:
+                    done.set()
+
+        with PtyLink() as link:
+            controller = FuelCellController(link.port)
+            controller.add_listener(on_item)
+            controller.connect()
+            try:
+                for first in range(0, count, burst):
+                    data = bytearray()
+                    for index in range(first, min(first + burst, count)):
+                        data += (format_frame({'FC_V': float(index), 'FC_A': 1.0}) + '\r\n').encode('ascii')
+                    now = time.perf_counter()
+                    for index in range(first, min(first + burst, count)):
+                        sent[index] = now
+                    link.write(bytes(data))
+                done.wait(timeout=10)
+            finally:
+                controller.disconnect()
+        return len(latencies), latencies
+    return run
+
+
+def daq_block_stage(blocks, block_size=1000, channels='ai0:7'):
+    """ni_daq blocks from the synthetic source, built into ingestion DataFrames."""
+    from ni_daq import BlockAcquisition, SyntheticSource
+
+    acquisition = BlockAcquisition(SyntheticSource(channels, rate=10000, realtime=False), block_size)
+    acquisition.start()
+
+    def run():
+        latencies = []
+        for _ in range(blocks):
+            start = time.perf_counter()
+            acquisition.next_block()
+            latencies.append(time.perf_counter() - start)
+        return blocks * block_size * len(acquisition.source.channels), latencies
+    return run
+
+
+def daq_ingest_stage(blocks, block_size=1000, channels='ai0:7'):
+    """The same blocks sent with Sender.dataframe to the local QuestDB stand-in."""
+    from questdb.ingress import Sender
+    from ni_daq import BlockAcquisition, SyntheticSource
+    from questdb_stub import QuestDBStub
+
+    acquisition = BlockAcquisition(SyntheticSource(channels, rate=10000, realtime=False), block_size)
+    acquisition.start()
+    frames = [acquisition.next_block() for _ in range(blocks)]
+
+    def run():
+        latencies = []
+        with QuestDBStub() as stub, Sender.from_conf(stub.conf) as sender:
+            for df in frames:
+                start = time.perf_counter()
+                acquisition.ingest(sender, df)
+                sender.flush()
+                latencies.append(time.perf_counter() - start)
+        return sum(len(df) for df in frames), latencies
+    return run
+
+
+def telemetry_ingest_stage(rows):
+    """TelemetryIngestor batches, from submit() to rows acknowledged by the stand-in."""
+    from questdb_stub import QuestDBStub
+    from telemetry_ingest import TelemetryIngestor
+
+    frame = TelemetryRecord.from_values({field.key: 1.0 for field in FIELDS})
+
+    def run():
+        with tempfile.TemporaryDirectory() as spool_dir, QuestDBStub() as stub:
+            ingestor = TelemetryIngestor(stub.conf, spool_path=os.path.join(spool_dir, 'spool.jsonl'),
+                                         batch_size=500, flush_interval=0.05).start()
+            latencies = []
+            start = time.time()
+            for i in range(rows):
+                before = time.perf_counter()
+                ingestor.submit(frame, timestamp=start + i)
+                latencies.append(time.perf_counter() - before)
+            ingestor.stop()
+            return ingestor.rows_sent, latencies
+    return run
+
+
+def csv_load_stage(csv_file):
+    """The typed CSV parse that plot_polarization relied on before the cache."""
+    from run_cache import read_csv_typed
+
+    def run():
+        return len(read_csv_typed(csv_file)), None
+    return run
+
+
+def cache_load_stage(csv_file, cache_dir):
+    """Loading the plotting columns through the columnar cache (warm)."""
+    from run_cache import load_run, update_cache
+
+    update_cache(csv_file, cache_dir)
+
+    def run():
+        return len(load_run(csv_file, columns=['FC_A (A)', 'FC_V (V)'], cache_dir=cache_dir)), None
+    return run
+
+
+def steady_state_stage(csv_file, cache_dir):
+    from run_cache import load_run
+    from steady_state import polarization_points
+
+    df = load_run(csv_file, cache_dir=cache_dir)
+
+    def run():
+        polarization_points(df)
+        return len(df), None
+    return run
+
+
+def downsample_stage(points, buckets=2000, seed=0):
+    from downsample import minmax_indices
+
+    y = np.cumsum(np.random.default_rng(seed).normal(size=points))
+
+    def run():
+        minmax_indices(y, buckets)
+        return points, None
+    return run
+
+
+def build_stages(frames, size, cache_dir):
+    """(name, unit, factory) for every stage; factories run only for selected stages."""
+    csv_file = recorded_file()
+    return [
+        ('parse.parse_data.recorded', 'frames', lambda: parse_data_stage(load_frames(csv_file, frames))),
+        ('parse.frame_parser.recorded', 'frames', lambda: frame_parser_stage(load_frames(csv_file, frames))),
+        ('parse.frame_parser.synthetic', 'frames', lambda: frame_parser_stage(synthetic_frames(frames))),
+        ('acquire.read_loop.event', 'frames', lambda: read_loop_stage(min(frames, 2000))),
+        ('acquire.daq_block', 'samples', lambda: daq_block_stage(size // 8000)),
+        ('ingest.daq_dataframe', 'rows', lambda: daq_ingest_stage(size // 8000)),
+        ('ingest.telemetry', 'rows', lambda: telemetry_ingest_stage(frames)),
+        ('analysis.csv_load', 'rows', lambda: csv_load_stage(csv_file)),
+        ('analysis.cache_load', 'rows', lambda: cache_load_stage(csv_file, cache_dir)),
+        ('analysis.steady_state', 'rows', lambda: steady_state_stage(csv_file, cache_dir)),
+        ('analysis.downsample', 'points', lambda: downsample_stage(size)),
+    ]
+
+
+# --- Measurement ---
+
+def percentiles_ms(latencies):
+    values = np.asarray(latencies) * 1000
+    return {f"p{p}_ms": round(float(np.percentile(values, p)), 4) for p in (50, 95, 99)}
+
+
+def measure(run, repeat):
+    """
+    Times `repeat` calls of a stage after one warm-up call, then one more
+    under tracemalloc for the peak memory (tracing slows the code down, so
+    that call is not timed).
+    """
+    run()
+    durations = []
+    latencies = []
+    items = 0
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        items, item_latencies = run()
+        durations.append(time.perf_counter() - start)
+        if item_latencies:
+            latencies.extend(item_latencies)
+
+    gc.collect()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    seconds = float(np.median(durations))
+    result = {
+        "items": items,
+        "seconds": round(seconds, 6),
+        "throughput": round(items / seconds, 1) if seconds else None,
+        "latency_of": "item" if latencies else "call",
+        "peak_mb": round(peak / 2**20, 3),
+    }
+    result.update(percentiles_ms(latencies or durations))
+    return result
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "date": datetime.now().isoformat(timespec='seconds'),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "recorded_file": os.path.basename(recorded_file()),
+    }
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Flags stages whose throughput dropped, or whose p99 latency or peak
+    memory grew, by more than `tolerance` relative to the baseline.
+
+    Returns:
+        list of str: One line per regression.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        checks = (
+            ('throughput', previous.get("throughput"), current.get("throughput"), -1),
+            ('p99 latency', previous.get("p99_ms"), current.get("p99_ms"), 1),
+            ('peak memory', previous.get("peak_mb"), current.get("peak_mb"), 1),
+        )
+        for label, before, after, direction in checks:
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            if change * direction > tolerance:
+                regressions.append(f"{name}: {label} {before:g} -> {after:g} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the parse, acquisition, ingestion and analysis paths.")
+    parser.add_argument('--stage', action='append', help="Run only stages starting with this prefix, e.g. parse.")
+    parser.add_argument('--frames', type=int, default=5000, help="Frames or rows for the parse and ingest stages.")
+    parser.add_argument('--size', type=int, default=1_000_000, help="Samples for the DAQ and downsample stages.")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default=RESULTS_PATH, help="JSON results file.")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="Results to compare against, if the file exists.")
+    parser.add_argument('--save-baseline', action='store_true', help="Also store these results as the baseline.")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help="Relative change flagged as a regression.")
+    parser.add_argument('--list', action='store_true', help="List the stages and exit.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        stages = build_stages(args.frames, args.size, cache_dir)
+        if args.list:
+            for name, unit, _ in stages:
+                print(f"{name:<32} {unit}")
+            return
+        if args.stage:
+            stages = [stage for stage in stages if any(stage[0].startswith(prefix) for prefix in args.stage)]
+
+        print(f"{'Stage':<32} | {'Items':>9} | {'Items/s':>12} | {'p50 ms':>9} | {'p99 ms':>9} | {'Peak MB':>8}")
+        print("-" * 94)
+        results = {}
+        for name, unit, factory in stages:
+            result = measure(factory(), args.repeat)
+            result["unit"] = unit
+            results[name] = result
+            print(f"{name:<32} | {result['items']:>9} | {result['throughput']:>12,.0f} | "
+                  f"{result['p50_ms']:>9.3f} | {result['p99_ms']:>9.3f} | {result['peak_mb']:>8.2f}")
+
+    report = {"environment": environment(), "repeat": args.repeat, "frames": args.frames, "size": args.size,
+              "results": results}
+    for path in [args.output] + ([args.baseline] if args.save_baseline else []):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}" + (f" and {args.baseline}" if args.save_baseline else ""))
+
+    if args.save_baseline or not os.path.exists(args.baseline):
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline["results"], args.tolerance)
+    print(f"Compared with {args.baseline} ({baseline['environment'].get('commit')}, "
+          f"{baseline['environment'].get('date')}): {len(regressions) or 'no'} regressions")
+    for line in regressions:
+        print(f"  {line}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import threading
+import time
+from queue import Queue, Empty
+
+import pybk8500
+
+from pty_link import PtyLink
+
+STATUS = pybk8500.CommandStatus.STATUS_NAMES
+BITS_PER_BYTE = 10  # 8N1: start bit, 8 data bits, stop bit.
+
+
+def fuel_cell_source(open_circuit=75.0, resistance=2.0):
+    """Linear source model: terminal voltage as a function of the load current."""
+    return lambda current: max(open_circuit - resistance * current, 0.0)
+
+
+class BK8500Emulator:
+    """
+    BK Precision 8500 load on the device side of a pseudo-terminal.
+
+    Answers every 26-byte command frame the way the instrument does: a
+    CommandStatus for settings (0x90 on a bad checksum, 0xB0 for unknown
+    commands), and a frame of the same type for the readings the driver
+    uses. The input is a `source` model: the load draws its CC current when
+    on, and the voltage follows source(current).
+
+    With a `baudrate`, frames take their wire time in each direction, as
+    on the instrument's full-duplex UART, so throughput measured through
+    the emulator is representative; 0 answers as fast as possible.
+    """
+
+    def __init__(self, baudrate=9600, processing_delay=0.001, source=None, address=0):
+        self.link = PtyLink()
+        self.port = self.link.port
+        self.baudrate = baudrate
+        self.processing_delay = processing_delay
+        self.source = source or fuel_cell_source()
+        self.address = address
+        self.remote = False
+        self.load = False
+        self.mode = 'CC'
+        self.cc_current = 0.0
+        self.remote_sense = 0
+        self.received = []
+        self.bad_frames = 0
+        self.parser = pybk8500.Parser()
+        self.parser.error = self._on_parse_error
+        self._replies = Queue()
+        self._running = False
+        self._threads = []
+
+    @property
+    def frame_time(self):
+        return pybk8500.Parser.MSG_LENGTH * BITS_PER_BYTE / self.baudrate if self.baudrate else 0.0
+
+    @property
+    def current(self):
+        return self.cc_current if self.load and self.mode == 'CC' else 0.0
+
+    def start(self):
+        self._running = True
+        self._threads = [threading.Thread(target=self._receive_loop, daemon=True),
+                         threading.Thread(target=self._transmit_loop, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        for thread in self._threads:
+            thread.join(timeout=1)
+        self.link.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def handle(self, command):
+        """Applies one command message and returns the reply message."""
+        self.received.append(command)
+        if isinstance(command, pybk8500.ReadInput):
+            current = self.current
+            voltage = self.source(current)
+            reply = pybk8500.ReadInput(voltage=voltage, current=current, power=voltage * current)
+            reply[15] = (self.remote << 2) | (self.load << 3) | (self.remote_sense << 5)
+            reply[16] = 1 << 6 if self.mode == 'CC' else 0
+            return reply
+        if isinstance(command, pybk8500.ReadCCModeCurrent):
+            return pybk8500.ReadCCModeCurrent(value=self.cc_current)
+        if isinstance(command, pybk8500.ReadMode):
+            return pybk8500.ReadMode(value=self.mode)
+
+        if isinstance(command, pybk8500.SetRemote):
+            self.remote = bool(command.operation)
+        elif not self.remote:
+            # Settings are only accepted under remote control.
+            return pybk8500.CommandStatus(status=STATUS['Invalid command'])
+        elif isinstance(command, pybk8500.LoadSwitch):
+            self.load = bool(command.operation)
+        elif isinstance(command, pybk8500.SetMode):
+            self.mode = command.mode
+        elif isinstance(command, pybk8500.SetCCModeCurrent):
+            self.cc_current = command.current
+        elif isinstance(command, pybk8500.SetRemoteSensingState):
+            self.remote_sense = int(command[3])
+        else:
+            return pybk8500.CommandStatus(status=STATUS['Unrecognized command'])
+        return pybk8500.CommandStatus(status=STATUS['Command was successful'])
+
+    def _on_parse_error(self, error):
+        self.bad_frames += 1
+        status = 'Checksum incorrect' if isinstance(error, pybk8500.ChecksumError) else 'Unrecognized command'
+        self._replies.put(pybk8500.CommandStatus(status=STATUS[status]))
+
+    def _receive_loop(self):
+        buffer = bytearray()
+        while self._running:
+            data = self.link.read(4096, timeout=0.05)
+            if not data:
+                continue
+            buffer.extend(data)
+            while True:
+                msg, error, remaining = self.parser.parse_msg(buffer)
+                buffer = bytearray(remaining)
+                if msg is not None:
+                    # The frame only finished arriving one frame time after it started.
+                    time.sleep(self.frame_time + self.processing_delay)
+                    self._replies.put(self.handle(msg))
+                elif error is None:
+                    break
+
+    def _transmit_loop(self):
+        while self._running:
+            try:
+                reply = self._replies.get(timeout=0.05)
+            except Empty:
+                continue
+            time.sleep(self.frame_time)
+            try:
+                self.link.write(bytes(reply))
+            except OSError:
+                return
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emulate a BK8500 electronic load on a pseudo-terminal.")
+    parser.add_argument('--baudrate', type=int, default=9600, help="Emulated line rate; 0 for no wire delay.")
+    args = parser.parse_args()
+
+    with BK8500Emulator(args.baudrate) as emulator:
+        print(f"BK8500 emulator on {emulator.port} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print(f"\n{len(emulator.received)} commands, {emulator.bad_frames} bad frames.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import argparse
+import mmap
+import os
+import re
+import struct
+import time
+from datetime import datetime
+
+import numpy as np
+
+from protium_parser import ProtiumFrameParser, TelemetryRecord
+
+CAPTURE_DIR = 'data/captures'
+MAGIC = b'EXOCAP01'
+INDEX_INTERVAL = 1.0
+
+# File header: magic, wall clock and monotonic clock at the start of the
+# capture (ns). Chunk header: ns since the start on the monotonic clock,
+# then the number of bytes that follow.
+HEADER = struct.Struct('<8sqq')
+CHUNK = struct.Struct('<qI')
+INDEX_DTYPE = np.dtype([('t', '<i8'), ('offset', '<i8')])
+
+
+def capture_path(port, directory=CAPTURE_DIR):
+    """data/captures/<port>-<YYYYmmdd-HHMMSS>.cap, the port name made file-safe."""
+    name = re.sub(r'[^\w.-]+', '_', port).strip('_') or 'capture'
+    return os.path.join(directory, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}.cap")
+
+
+class CaptureWriter:
+    """
+    Appends every chunk read from the serial port to a binary capture file.
+
+    Chunks are stamped on the monotonic clock, so a capture stays ordered
+    across wall-clock adjustments; the wall-clock time of the start, kept
+    in the header, turns the stamps back into epoch times. Every
+    `index_interval` seconds the offset of the current chunk is also
+    appended to a sparse index (`<path>.idx`), which is when the file
+    buffers are flushed.
+    """
+
+    def __init__(self, path, index_interval=INDEX_INTERVAL):
+        self.path = path
+        self.index_interval = index_interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'xb')
+        self._index = open(path + '.idx', 'wb')
+        self.start_mono_ns = time.monotonic_ns()
+        self._file.write(HEADER.pack(MAGIC, time.time_ns(), self.start_mono_ns))
+        self._offset = HEADER.size
+        self._next_index = 0
+        self.chunks = 0
+        self.bytes = 0
+
+    def append(self, data):
+        t = time.monotonic_ns() - self.start_mono_ns
+        if t >= self._next_index:
+            self._index.write(struct.pack('<qq', t, self._offset))
+            self._next_index = t + int(self.index_interval * 1e9)
+            self._file.flush()
+            self._index.flush()
+        self._file.write(CHUNK.pack(t, len(data)))
+        self._file.write(data)
+        self._offset += CHUNK.size + len(data)
+        self.chunks += 1
+        self.bytes += len(data)
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CaptureReader:
+    """
+    Memory-mapped view of a capture file.
+
+    seek() bisects the sparse index, then walks at most one index interval
+    of chunks. A missing or stale index (the capture was copied without it,
+    or the writer was killed before flushing it) is rebuilt by one scan of
+    the file. A chunk cut short at the end of the file is ignored.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.start_wall_ns, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a capture file")
+        self.index = self._load_index()
+
+    def close(self):
+        if not self._map.closed:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def start(self):
+        """Wall-clock time of the first chunk, in seconds since the epoch (None if empty)."""
+        if not len(self.index):
+            return None
+        return (self.start_wall_ns + int(self.index['t'][0])) / 1e9
+
+    @property
+    def end(self):
+        """Wall-clock time of the last chunk (None if empty)."""
+        last = None
+        offset = int(self.index['offset'][-1]) if len(self.index) else len(self._map)
+        for t, _, _ in self._scan(offset):
+            last = t
+        return None if last is None else (self.start_wall_ns + last) / 1e9
+
+    def _scan(self, offset, end_ns=None):
+        # Yields (t_ns, data offset, length) from `offset` on.
+        data = self._map
+        size = len(data)
+        while offset + CHUNK.size <= size:
+            t, length = CHUNK.unpack_from(data, offset)
+            start = offset + CHUNK.size
+            if start + length > size or (end_ns is not None and t >= end_ns):
+                return
+            yield t, start, length
+            offset = start + length
+
+    def _load_index(self):
+        index = np.empty(0, dtype=INDEX_DTYPE)
+        if os.path.exists(self.path + '.idx'):
+            index = np.fromfile(self.path + '.idx', dtype=INDEX_DTYPE)
+        size = len(self._map)
+        if len(index) and index['offset'][-1] < size and index['offset'][0] == HEADER.size:
+            return index
+        if size <= HEADER.size:
+            return index
+        entries = []
+        next_index = None
+        for t, start, _ in self._scan(HEADER.size):
+            if next_index is None or t >= next_index:
+                entries.append((t, start - CHUNK.size))
+                next_index = t + int(INDEX_INTERVAL * 1e9)
+        return np.array(entries, dtype=INDEX_DTYPE)
+
+    def seek(self, timestamp):
+        """File offset of the first chunk at or after `timestamp` (seconds since the epoch)."""
+        t = int(timestamp * 1e9) - self.start_wall_ns
+        i = max(0, int(np.searchsorted(self.index['t'], t, side='right')) - 1)
+        offset = int(self.index['offset'][i]) if len(self.index) else HEADER.size
+        for chunk_t, start, _ in self._scan(offset):
+            if chunk_t >= t:
+                return start - CHUNK.size
+        return len(self._map)
+
+    def chunks(self, start=None, end=None):
+        """
+        Yields (timestamp, bytes) for the chunks received in [start, end).
+
+        Args:
+            start (float, optional): Seconds since the epoch; the first chunk by default.
+            end (float, optional): Seconds since the epoch; the last chunk by default.
+        """
+        offset = HEADER.size if start is None else self.seek(start)
+        end_ns = None if end is None else int(end * 1e9) - self.start_wall_ns
+        data = self._map
+        for t, begin, length in self._scan(offset, end_ns):
+            yield (self.start_wall_ns + t) / 1e9, data[begin:begin + length]
+
+    def replay(self, speed=None, start=None, end=None):
+        """
+        Feeds the chunks through a fresh ProtiumFrameParser and yields every
+        item, records stamped with the time their last chunk was received.
+
+        Args:
+            speed (float, optional): Replay rate relative to real time (60
+                replays a minute per second); as fast as possible by default.
+        """
+        parser = ProtiumFrameParser()
+        first = None
+        origin = time.perf_counter()
+        for timestamp, data in self.chunks(start, end):
+            if speed:
+                if first is None:
+                    first = timestamp
+                delay = (timestamp - first) / speed - (time.perf_counter() - origin)
+                if delay > 0:
+                    time.sleep(delay)
+            for item in parser.feed(data):
+                if type(item) is TelemetryRecord:
+                    item.timestamp = timestamp
+                yield item
+        yield from parser.flush()
+
+
+def replay_to_pty(path, speed=1.0, start=None, end=None):
+    """Writes a capture into a pseudo-terminal with its original timing, scaled by `speed`."""
+    from pty_link import PtyLink
+
+    with CaptureReader(path) as reader, PtyLink() as link:
+        print(f"Replaying {path} on {link.port} at {speed}x (Ctrl+C to stop)")
+        input("Connect to the port, then press Enter to start...")
+        first = None
+        origin = time.perf_counter()
+        for timestamp, data in reader.chunks(start, end):
+            if first is None:
+                first = timestamp
+            delay = (timestamp - first) / speed - (time.perf_counter() - origin)
+            if delay > 0:
+                time.sleep(delay)
+            link.write(data)
+        print("End of capture.")
+
+
+def parse_time(text, reader):
+    """Seconds since the epoch from an ISO date/time, or seconds from the start of the capture ('+90')."""
+    if text is None:
+        return None
+    if text.startswith('+'):
+        return reader.start + float(text[1:])
+    return datetime.fromisoformat(text).timestamp()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and replay raw Protium-2500 serial captures.")
+    parser.add_argument('file', help="Capture file (.cap).")
+    parser.add_argument('--start', default=None, help="Local date/time (2025-03-18T14:05) or '+seconds' from the start.")
+    parser.add_argument('--end', default=None, help="Same format as --start.")
+    parser.add_argument('--speed', type=float, default=None,
+                        help="Replay rate relative to real time; as fast as possible by default.")
+    parser.add_argument('--pty', action='store_true',
+                        help="Replay the bytes on a pseudo-terminal for the dashboard or another reader.")
+    args = parser.parse_args()
+
+    if args.pty:
+        with CaptureReader(args.file) as reader:
+            start, end = parse_time(args.start, reader), parse_time(args.end, reader)
+        replay_to_pty(args.file, args.speed or 1.0, start, end)
+        return
+
+    with CaptureReader(args.file) as reader:
+        if reader.start is None:
+            print(f"{args.file}: empty capture")
+            return
+        print(f"{args.file}: {os.path.getsize(args.file)} bytes, {len(reader.index)} index entries, "
+              f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(reader.start))} to "
+              f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(reader.end))}")
+        start, end = parse_time(args.start, reader), parse_time(args.end, reader)
+        frames = texts = 0
+        started = time.perf_counter()
+        for item in reader.replay(args.speed, start, end):
+            if type(item) is TelemetryRecord:
+                frames += 1
+            else:
+                texts += 1
+        elapsed = time.perf_counter() - started
+        print(f"Replayed {frames} frames and {texts} messages in {elapsed:.2f} s "
+              f"({frames / elapsed if elapsed else 0:.0f} frames/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+import argparse
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from protium_parser import FIELD_NAMES, FIELDS, TelemetryRecord
+from run_cache import DATE_TIME_COLUMN, load_run
+
+LHV_CELL_VOLTAGE = 1.254  # V: the lower heating value of hydrogen per cell (LHV / 2F)
+WINDOW_SECONDS = 60.0
+MAX_GAP_SECONDS = 10.0  # Longer intervals (link lost, logging paused) are not integrated
+ROLLING_FIELDS = ('FC_V', 'FCT1', 'FCT2')
+CELLS_COLUMN = 'No_of_Cell'
+
+_NAN = float('nan')
+
+
+class Integral:
+    """
+    Trapezoidal integral of y over time (seconds), one sample at a time.
+    NaN samples are skipped; an interval longer than `max_gap`, or not
+    moving forward, adds nothing.
+    """
+
+    def __init__(self, max_gap=MAX_GAP_SECONDS):
+        self.max_gap = max_gap
+        self.value = 0.0
+        self.t = None
+        self.y = None
+
+    def update(self, t, y):
+        if y != y:
+            return self.value
+        if self.t is not None:
+            dt = t - self.t
+            if 0 < dt <= self.max_gap:
+                self.value += (y + self.y) * 0.5 * dt
+        self.t, self.y = t, y
+        return self.value
+
+    def update_batch(self, t, y):
+        """Same as update() over arrays; returns the running integral after each sample."""
+        valid = ~np.isnan(y)
+        tv, yv = t[valid], y[valid]
+        before = self.value
+        if self.t is not None:
+            tv, yv = np.concatenate(([self.t], tv)), np.concatenate(([self.y], yv))
+        dt = np.diff(tv)
+        increments = (yv[1:] + yv[:-1]) * 0.5 * dt
+        increments[(dt <= 0) | (dt > self.max_gap)] = 0.0
+        if self.t is None:
+            increments = np.concatenate(([0.0], increments))
+        # Summed in the same order as update(), so both give the same bits.
+        cumulative = np.cumsum(np.concatenate(([self.value], increments)))[1:]
+        if len(tv):
+            self.value = float(cumulative[-1])
+            self.t, self.y = float(tv[-1]), float(yv[-1])
+        # Rows with a NaN sample carry the integral of the previous one.
+        filled = np.full(len(y), _NAN)
+        filled[valid] = cumulative
+        return pd.Series(filled).ffill().fillna(before).to_numpy()
+
+
+class RunningStats:
+    """Mean and standard deviation since the start (Welford's algorithm)."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, x):
+        if x != x:
+            return
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    @property
+    def std(self):
+        return (self.m2 / (self.count - 1)) ** 0.5 if self.count > 1 else _NAN
+
+    def update_batch(self, x):
+        """Same as update() over an array; returns (mean, std) after each sample."""
+        valid = ~np.isnan(x)
+        # Sums taken around the current mean (or, to start with, the first
+        # sample) keep the per-row variance accurate.
+        origin = self.mean if self.count or not valid.any() else x[valid][0]
+        shifted = np.where(valid, x - origin, 0.0)
+        count = self.count + np.cumsum(valid)
+        total = np.cumsum(shifted)
+        squares = self.m2 + np.cumsum(shifted * shifted)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = origin + total / count
+            m2 = squares - total * total / count
+            std = np.where(count > 1, np.sqrt(np.maximum(m2, 0.0) / (count - 1)), _NAN)
+        mean = np.where(count > 0, mean, _NAN)
+        if len(x) and count[-1] > self.count:
+            self.count, self.mean, self.m2 = int(count[-1]), float(mean[-1]), float(max(m2[-1], 0.0))
+        return mean, std
+
+
+class WindowStats:
+    """
+    Mean and standard deviation over the samples of the last `window`
+    seconds, (t - window, t]: Welford's update on the way in, its inverse
+    on the way out, O(1) amortized per sample.
+    """
+
+    def __init__(self, window=WINDOW_SECONDS):
+        self.window = window
+        self.samples = deque()
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, t, x):
+        samples = self.samples
+        while samples and samples[0][0] <= t - self.window:
+            _, old = samples.popleft()
+            self.count -= 1
+            if self.count == 0:
+                self.mean = self.m2 = 0.0
+            else:
+                delta = old - self.mean
+                self.mean -= delta / self.count
+                self.m2 -= delta * (old - self.mean)
+        if x == x:
+            samples.append((t, x))
+            self.count += 1
+            delta = x - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (x - self.mean)
+
+    @property
+    def std(self):
+        return (max(self.m2, 0.0) / (self.count - 1)) ** 0.5 if self.count > 1 else _NAN
+
+    def update_batch(self, t, x):
+        """Same as update() over arrays; returns (mean, std) after each sample."""
+        held = len(self.samples)
+        if held:
+            t_all = np.concatenate(([s[0] for s in self.samples], t))
+            x_all = np.concatenate(([s[1] for s in self.samples], x))
+        else:
+            t_all, x_all = t, x
+        if np.any(np.diff(t_all) < 0):
+            # The clock went back: a rolling window needs sorted times.
+            mean, std = np.empty(len(t)), np.empty(len(t))
+            for i, (ti, xi) in enumerate(zip(t.tolist(), x.tolist())):
+                self.update(ti, xi)
+                mean[i], std[i] = self.current()
+            return mean, std
+        series = pd.Series(x_all, index=pd.to_datetime(t_all, unit='s'))
+        rolling = series.rolling(pd.Timedelta(seconds=self.window), min_periods=1)
+        mean = rolling.mean().to_numpy()[held:]
+        std = rolling.std().to_numpy()[held:]
+
+        # Keep what the next samples need: the values still in the window.
+        if len(t):
+            end = t[-1]
+            keep = (t_all > end - self.window) & ~np.isnan(x_all)
+            self.samples = deque(zip(t_all[keep].tolist(), x_all[keep].tolist()))
+            values = x_all[keep]
+            self.count = len(values)
+            self.mean = float(values.mean()) if self.count else 0.0
+            self.m2 = float(((values - self.mean) ** 2).sum()) if self.count else 0.0
+        return mean, std
+
+    def current(self):
+        return (self.mean if self.count else _NAN), self.std
+
+
+class DerivedMetrics:
+    """
+    Quantities derived from the telemetry, kept up to date one frame at a
+    time in O(1):
+
+    - energy_wh: FC_W integrated over time (trapezoids), in Wh;
+    - cell_voltage and efficiency (stack, LHV: cell voltage / 1.254 V),
+      given the number of cells;
+    - current_density (A/cm²) and power_density (W/cm²), given the
+      active area in cm², as in plot_polarization;
+    - for each of `fields`: mean and std since the start, and over the
+      last `window` seconds.
+
+    update() takes one frame (FuelCellController listener: on_item);
+    update_batch() takes a DataFrame of many (a run log, rows of the
+    telemetry history) and gives, row for row, the values update() would
+    have, then leaves the engine in the same state. A run can be loaded in
+    bulk and followed live from there without replaying it sample by sample.
+    """
+
+    def __init__(self, cells=None, active_area=None, window=WINDOW_SECONDS, fields=ROLLING_FIELDS,
+                 max_gap=MAX_GAP_SECONDS):
+        self.cells = cells or None
+        self.active_area = active_area or None
+        self.fields = tuple(fields)
+        self.energy = Integral(max_gap)
+        self.running = {field: RunningStats() for field in self.fields}
+        self.windows = {field: WindowStats(window) for field in self.fields}
+        self.samples = 0
+        self.values = dict.fromkeys(self.columns, _NAN)
+        self._followed = 0
+
+    @property
+    def columns(self):
+        columns = ['timestamp', 'energy_wh', 'cell_voltage', 'efficiency', 'current_density', 'power_density']
+        for field in self.fields:
+            columns += [f"{field}_mean", f"{field}_std", f"{field}_window_mean", f"{field}_window_std"]
+        return columns
+
+    def update(self, frame, timestamp=None):
+        """
+        Adds one frame.
+
+        Args:
+            frame (TelemetryRecord or dict): Field key to value.
+            timestamp (float, optional): Seconds since the epoch; defaults to
+                the record's own timestamp, then to now.
+
+        Returns:
+            dict: The current values (updated in place; copy to keep).
+        """
+        if timestamp is None:
+            timestamp = getattr(frame, 'timestamp', None) or time.time()
+        get = frame.get
+        voltage, current, power = get('FC_V', _NAN), get('FC_A', _NAN), get('FC_W', _NAN)
+        values = self.values
+        values['timestamp'] = timestamp
+        values['energy_wh'] = self.energy.update(timestamp, power) / 3600
+        if self.cells:
+            values['cell_voltage'] = voltage / self.cells
+            values['efficiency'] = voltage / (self.cells * LHV_CELL_VOLTAGE)
+        if self.active_area:
+            values['current_density'] = current / self.active_area
+            values['power_density'] = power / self.active_area
+        for field in self.fields:
+            x = get(field, _NAN)
+            running = self.running[field]
+            running.update(x)
+            values[f"{field}_mean"] = running.mean if running.count else _NAN
+            values[f"{field}_std"] = running.std
+            window = self.windows[field]
+            window.update(timestamp, x)
+            values[f"{field}_window_mean"], values[f"{field}_window_std"] = window.current()
+        self.samples += 1
+        return values
+
+    def on_item(self, item):
+        """FuelCellController listener: adds telemetry records, ignores text."""
+        if type(item) is TelemetryRecord:
+            self.update(item)
+
+    def update_batch(self, frame):
+        """
+        Adds many frames at once.
+
+        Args:
+            frame (DataFrame): `timestamp` (seconds since the epoch, in
+                order) and field columns (FC_V, FC_A, ...); see run_frame().
+
+        Returns:
+            DataFrame: The values after each row, as update() returns them.
+        """
+        t = frame['timestamp'].to_numpy(dtype=np.float64)
+        out = {'timestamp': t}
+
+        def column(field):
+            if field in frame:
+                return frame[field].to_numpy(dtype=np.float64)
+            return np.full(len(frame), _NAN)
+
+        voltage, current, power = column('FC_V'), column('FC_A'), column('FC_W')
+        out['energy_wh'] = self.energy.update_batch(t, power) / 3600
+        nan = np.full(len(frame), _NAN)
+        out['cell_voltage'] = voltage / self.cells if self.cells else nan
+        out['efficiency'] = voltage / (self.cells * LHV_CELL_VOLTAGE) if self.cells else nan
+        out['current_density'] = current / self.active_area if self.active_area else nan
+        out['power_density'] = power / self.active_area if self.active_area else nan
+        for field in self.fields:
+            x = column(field)
+            out[f"{field}_mean"], out[f"{field}_std"] = self.running[field].update_batch(x)
+            out[f"{field}_window_mean"], out[f"{field}_window_std"] = self.windows[field].update_batch(t, x)
+        result = pd.DataFrame(out, columns=self.columns)
+        if len(result):
+            self.values.update(result.iloc[-1].to_dict())
+        self.samples += len(result)
+        return result
+
+    def follow(self, telemetry):
+        """
+        Catches up with a TelemetryRingBuffer (or the daemon's shared one):
+        the rows appended since the previous call go through update_batch().
+
+        Returns:
+            dict: The current values.
+        """
+        self._followed, rows = telemetry.since_count(self._followed)
+        if len(rows):
+            self.update_batch(pd.DataFrame(np.array(rows), columns=telemetry.columns))
+        return self.values
+
+
+def run_frame(csv_file):
+    """
+    Loads a Spectronik run log as update_batch() input: `timestamp` in
+    seconds (the log's local time read as UTC; only differences matter)
+    and one column per field key.
+    """
+    columns = {field.column: field.key for field in FIELDS}
+    df = load_run(csv_file, columns=[DATE_TIME_COLUMN, *columns])
+    if DATE_TIME_COLUMN not in df.columns:
+        raise ValueError(f"{csv_file} has no '{DATE_TIME_COLUMN}' column")
+    df = df.dropna(subset=[DATE_TIME_COLUMN]).rename(columns=columns)
+    df.insert(0, 'timestamp', df.pop(DATE_TIME_COLUMN).astype('int64') / 1e9)
+    return df.reset_index(drop=True)
+
+
+def run_cells(csv_file):
+    """The number of cells recorded in a run log (No_of_Cell), or None."""
+    df = load_run(csv_file, columns=[CELLS_COLUMN])
+    if CELLS_COLUMN not in df.columns:
+        return None
+    cells = df[CELLS_COLUMN].dropna()
+    return int(cells.iloc[0]) if len(cells) else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Derived metrics (energy, efficiency, per-cell voltage, "
+                                                 "densities, rolling statistics) of a run log.")
+    parser.add_argument('file', help="Spectronik CSV run log.")
+    parser.add_argument('--cells', type=int, default=None, help="Cells in the stack (default: No_of_Cell of the log).")
+    parser.add_argument('--area', type=float, default=None, help="Active area in cm².")
+    parser.add_argument('--window', type=float, default=WINDOW_SECONDS, help="Rolling window in seconds.")
+    parser.add_argument('--output', default=None, help="Write the per-row values to this CSV file.")
+    args = parser.parse_args()
+
+    try:
+        frame = run_frame(args.file)
+    except ValueError as e:
+        print(f"Error: {e}")
+        raise SystemExit(1)
+
+    engine = DerivedMetrics(args.cells or run_cells(args.file), args.area, args.window)
+    started = time.perf_counter()
+    result = engine.update_batch(frame)
+    elapsed = time.perf_counter() - started
+    print(f"{len(result)} rows in {elapsed:.3f} s")
+    for name, value in engine.values.items():
+        if name != 'timestamp':
+            print(f"{name:<22} {value:.4g}")
+    if 'Energy' in frame and frame['Energy'].notna().any():
+        print(f"{'energy (firmware)':<22} {frame['Energy'].dropna().iloc[-1]:.4g}")
+    if args.output:
+        result.to_csv(args.output, index=False)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
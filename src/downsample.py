@@ -0,0 +1,42 @@
+import numpy as np
+
+
+def minmax_indices(y, buckets):
+    """
+    Picks the points that keep the visual envelope of a series.
+
+    The series is split into `buckets` runs of equal length and, for each
+    one, the indices of its first, minimum, maximum and last points are
+    kept, in order (M4). A line drawn through these at most 4 * buckets
+    points covers the same vertical extent per pixel column as the full
+    series, and joins the columns the way the full series does. Each
+    further series adds up to 2 * buckets picks.
+
+    Args:
+        y (np.ndarray or list of np.ndarray): Series of equal length; with
+            several series, the union of their picks is returned.
+        buckets (int): Number of buckets, typically the chart width in pixels.
+
+    Returns:
+        np.ndarray: Sorted indices into the series.
+    """
+    if not isinstance(y, (list, tuple)):
+        y = [y]
+    series = [np.asarray(values, dtype=float) for values in y]
+    n = len(series[0])
+    if n <= 2 * buckets:
+        return np.arange(n)
+
+    per = -(-n // buckets)
+    rows = -(-n // per)
+    base = np.arange(rows) * per
+    picks = [base, np.minimum(base + per, n) - 1]
+    for values in series:
+        padded = np.full(rows * per, np.nan)
+        padded[:n] = values
+        padded = padded.reshape(rows, per)
+        # NaNs never win; an all-NaN bucket falls back to its first point.
+        picks.append(base + np.argmin(np.where(np.isnan(padded), np.inf, padded), axis=1))
+        picks.append(base + np.argmax(np.where(np.isnan(padded), -np.inf, padded), axis=1))
+    return np.unique(np.concatenate(picks))
+
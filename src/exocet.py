@@ -0,0 +1,115 @@
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(SRC_DIR, 'app.py')
+
+# Subcommand -> (module whose main() runs it, heavy dependencies it may
+# import, help). The modules are only imported once their subcommand is
+# chosen, so `exocet ranges` never pays for matplotlib or nidaqmx.
+COMMANDS = {
+    'acquire': ('ni_daq', ('numpy', 'pandas', 'questdb'), "Continuous NI DAQ acquisition into QuestDB."),
+    'ingest': ('telemetry_ingest', ('numpy', 'questdb', 'serial'), "Record fuel cell telemetry to QuestDB."),
+    'plot': ('plot_polarization', ('numpy', 'pandas', 'matplotlib'), "Plot polarization curves from run logs."),
+    'ranges': ('check_ranges', (), "Current range and row count of every run log."),
+    'runs': ('run_catalog', (), "Query the catalog of run logs."),
+    'report': ('batch_report', ('numpy', 'pandas', 'matplotlib'), "Figures for every run log, incrementally."),
+    'derived': ('derived_metrics', ('numpy', 'pandas'), "Energy, efficiency and rolling statistics of a run."),
+    # pybk8500 imports matplotlib from its own __init__.
+    'load': ('load_controller', ('numpy', 'serial', 'pybk8500', 'matplotlib'), "Drive the BK8500 electronic load."),
+    'sweep': ('polarization_sweep', ('numpy', 'serial', 'pybk8500', 'matplotlib'),
+              "Automated steady-state polarization sweep."),
+    'daemon': ('acquisition_daemon', ('numpy', 'serial'), "Shared acquisition daemon for the dashboard."),
+    'emulator': ('protium_emulator', ('numpy', 'serial'), "Emulated Protium-2500 on a pseudo-terminal."),
+    'history': ('history', ('numpy', 'pandas', 'questdb'), "Downsampled telemetry history from QuestDB."),
+    'capture': ('capture_log', ('numpy',), "Inspect and replay raw serial captures."),
+    'dashboard': (None, ('streamlit',), "Run the Streamlit dashboard (arguments go to streamlit run)."),
+}
+HEAVY = ('numpy', 'pandas', 'matplotlib', 'nidaqmx', 'questdb', 'pybk8500', 'serial', 'streamlit')
+IMPORT_BUDGET_MS = 100  # For exocet itself and the commands without heavy dependencies
+
+
+def run(command, args=()):
+    """Runs a subcommand with its own command-line arguments; returns its exit status."""
+    module_name = COMMANDS[command][0]
+    if module_name is None:
+        return subprocess.call([sys.executable, '-m', 'streamlit', 'run', APP_PATH, *args])
+    module = importlib.import_module(module_name)
+    sys.argv = [f"exocet {command}", *args]
+    try:
+        module.main()
+    except SystemExit as e:
+        return e.code
+    return 0
+
+
+def import_profile(module):
+    """
+    Imports `module` in a fresh interpreter under -X importtime.
+
+    Returns:
+        tuple: (cumulative import time of the module in ms, set of top-level packages imported)
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=SRC_DIR, capture_output=True, text=True)
+    if result.returncode:
+        raise ImportError(result.stderr.strip().splitlines()[-1])
+    cumulative = 0
+    packages = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, us, name = line.split('|')
+        packages.add(name.strip().split('.')[0])
+        if name.strip() == module:
+            cumulative = int(us)
+    return cumulative / 1000, packages
+
+
+def check():
+    """Import time of exocet and of every subcommand module against the budget and their dependencies."""
+    failures = 0
+    modules = [('exocet', 'exocet', ())] + [(name, module, deps) for name, (module, deps, _) in COMMANDS.items()
+                                             if module is not None]
+    for name, module, deps in modules:
+        try:
+            ms, packages = import_profile(module)
+        except ImportError as e:
+            print(f"{name:<10} {module:<20} not importable here ({e})")
+            continue
+        heavy = sorted(package for package in HEAVY if package in packages)
+        print(f"{name:<10} {module:<20} {ms:8.1f} ms  {' '.join(heavy)}")
+        unexpected = [package for package in heavy if package not in deps]
+        if unexpected:
+            print(f"FAIL: {module} imports {', '.join(unexpected)}")
+            failures += 1
+        if not deps and ms > IMPORT_BUDGET_MS:
+            print(f"FAIL: {module} takes {ms:.1f} ms to import (budget {IMPORT_BUDGET_MS} ms)")
+            failures += 1
+    print("OK" if not failures else f"{failures} failure(s)")
+    return failures == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='exocet', description="Exocet fuel cell tools. Run 'exocet COMMAND --help' for a command's options.")
+    parser.add_argument('--check', action='store_true',
+                        help="Measure the import time of every command (-X importtime) against the budget and exit.")
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
+    for name, (_, _, help) in COMMANDS.items():
+        commands.add_parser(name, help=help, add_help=False)
+    args, rest = parser.parse_known_args()
+
+    if args.check:
+        sys.exit(0 if check() else 1)
+    if args.command is None:
+        parser.print_help()
+        sys.exit(2)
+    sys.exit(run(args.command, rest))
+
+
+if __name__ == "__main__":
+    main()
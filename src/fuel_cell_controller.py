@@ -1,38 +1,65 @@
 import serial
 import time
 import threading
-from queue import Queue
+from abc import ABC, abstractmethod
+from collections import deque
+from queue import Queue, Full, Empty
+from capture_log import CaptureWriter, capture_path
+from metrics import REGISTRY
+from protium_parser import ProtiumFrameParser, TelemetryRecord
+from setpoints import SetpointController
+from telemetry_buffer import TelemetryRingBuffer
 
-class FuelCellController:
-    def __init__(self, port, baudrate=57600):
-        self.port = port
-        self.baudrate = baudrate
-        self.serial = None
-        self.is_reading = False
-        self.read_thread = None
-        self.buffer = ''
-        self.data_queue = Queue()
+READ_MODES = ('event', 'poll')
 
-    def connect(self):
-        try:
-            self.serial = serial.Serial(self.port, self.baudrate, timeout=1)
-            print(f"Connected to {self.port} at {self.baudrate} baud.")
-            self.start_reading()
-        except serial.SerialException as e:
-            print(f"Error connecting to {self.port}: {e}")
-            exit()
+class LatencyStats:
+    """
+    Rolling end-to-end latency, from byte arrival to the listeners.
+    """
 
-    def disconnect(self):
-        self.stop_reading()
-        if self.serial and self.serial.is_open:
-            self.serial.close()
-            print("Disconnected from serial port.")
+    def __init__(self, size=1000):
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def reset(self):
+        self.samples.clear()
+        self.count = 0
+        self.max = 0.0
+
+    def summary(self):
+        """Returns the latency statistics in milliseconds."""
+        samples = sorted(self.samples)
+        if not samples:
+            return {"count": 0}
+
+        def percentile(p):
+            return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
 
+        return {
+            "count": self.count,
+            "mean_ms": sum(samples) / len(samples) * 1000,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": self.max * 1000,
+        }
+
+class ProtiumCommands(ABC):
+    """
+    Protium-2500 command set (Annex A of the UART specification). Subclasses
+    implement send_command.
+    """
+
+    @abstractmethod
     def send_command(self, command):
-        if self.serial and self.serial.is_open:
-            self.serial.write(command.encode('ascii'))
-        else:
-            print("Serial port not connected.")
+        """Writes `command` (text ending in '\\r') to the fuel cell."""
 
     def start_fuel_cell(self):
         self.send_command('start\r')
@@ -70,40 +97,279 @@ class FuelCellController:
     def increase_blower_intensity_3(self):
         self.send_command(']\r')
 
+class SetpointCommands(ProtiumCommands):
+    """
+    ProtiumCommands plus absolute fan and blower settings, for controllers
+    that keep the latest frames in `telemetry`.
+    """
+
+    _setpoints = None
+
+    @property
+    def setpoints(self):
+        """The SetpointController, started on first use."""
+        if self._setpoints is None:
+            self._setpoints = SetpointController(self).start()
+        return self._setpoints
+
+    def setpoint_status(self):
+        """SetpointController.status(), or {} when no setting was ever requested."""
+        return self._setpoints.status() if self._setpoints is not None else {}
+
+    def set_fan_speed(self, percent, wait=False):
+        """Moves the fans to `percent` with the fewest steps; see SetpointController.request."""
+        return self.setpoints.request('fan', percent, wait)
+
+    def set_blower_intensity(self, percent, wait=False):
+        """Moves the blowers to `percent` (in steps of 3 %); see SetpointController.request."""
+        return self.setpoints.request('blower', percent, wait)
+
+    def stop_setpoints(self):
+        if self._setpoints is not None:
+            self._setpoints.stop()
+            self._setpoints = None
+
+    def set_fans_auto(self):
+        if self._setpoints is not None:
+            self._setpoints.cancel('fan')
+        super().set_fans_auto()
+
+    def set_blowers_auto(self):
+        if self._setpoints is not None:
+            self._setpoints.cancel('blower')
+        super().set_blowers_auto()
+
+class FuelCellController(SetpointCommands):
+    def __init__(self, port, baudrate=57600, read_mode='event', history_size=86400,
+                 history_policy='overwrite', queue_size=1000, message_history=200, registry=REGISTRY):
+        if read_mode not in READ_MODES:
+            raise ValueError(f"read_mode must be one of {READ_MODES}, got {read_mode!r}")
+        self.port = port
+        self.baudrate = baudrate
+        self.read_mode = read_mode
+        self.serial = None
+        self.is_reading = False
+        self.read_thread = None
+        self.parser = ProtiumFrameParser()
+        # Only exists while a consumer has opened it (see open_queue).
+        self.queue_size = queue_size
+        self.data_queue = None
+        self.queue_dropped = 0
+        # Telemetry frames, one column per field, and the latest text messages.
+        self.telemetry = TelemetryRingBuffer(history_size, policy=history_policy)
+        self.messages = deque(maxlen=message_history)
+        self.listeners = []
+        self.latency = LatencyStats()
+        self.bytes_read = 0
+        # Raw bytes as received, before parsing (see start_capture).
+        self.capture = None
+        self._capture_lock = threading.Lock()
+        self._register_metrics(registry)
+
+    def _register_metrics(self, registry):
+        # Counts the controller already keeps are read at collection time;
+        # only the stage timers add work to the read path.
+        labels = {'port': self.port}
+        self.read_timer = registry.timer(
+            'exocet_serial_read_seconds', "Time to drain the bytes waiting on the port", labels)
+        self.parse_timer = registry.timer(
+            'exocet_parse_seconds', "Parser time per chunk read from the port", labels)
+        self.dispatch_timer = registry.timer(
+            'exocet_dispatch_seconds', "Time to store and hand the items of one chunk to the listeners",
+            labels)
+        registry.counter('exocet_serial_bytes_total', "Bytes read from the port", labels,
+                         fn=lambda: self.bytes_read)
+        registry.counter('exocet_frames_total', "Telemetry frames parsed", labels,
+                         fn=lambda: self.telemetry.appended)
+        registry.counter('exocet_parse_failures_total', "Frames that could not be decoded", labels,
+                         fn=lambda: self.parser.failed_frames)
+        registry.counter('exocet_queue_dropped_total', "Items discarded because the data_queue consumer fell behind", labels,
+                         fn=lambda: self.queue_dropped)
+        registry.gauge('exocet_queue_size', "Items waiting in data_queue", labels,
+                       fn=lambda: self.data_queue.qsize() if self.data_queue is not None else 0)
+        registry.counter('exocet_history_overwritten_total', "Frames overwritten in the telemetry history", labels,
+                         fn=lambda: self.telemetry.overwritten + self.telemetry.dropped)
+        registry.gauge('exocet_frame_latency_p99_seconds', "p99 from byte arrival to the listeners", labels,
+                       fn=lambda: self.latency.summary().get("p99_ms", 0.0) / 1000)
+
+    def connect(self):
+        try:
+            self.serial = serial.Serial(self.port, self.baudrate, timeout=1)
+            print(f"Connected to {self.port} at {self.baudrate} baud.")
+            self.start_reading()
+        except serial.SerialException as e:
+            print(f"Error connecting to {self.port}: {e}")
+            exit()
+
+    def disconnect(self):
+        self.stop_reading()
+        self.stop_capture()
+        self.stop_setpoints()
+        if self.serial and self.serial.is_open:
+            self.serial.close()
+            print("Disconnected from serial port.")
+
+    def start_capture(self, path=None):
+        """
+        Appends every chunk read from the port to a capture file, which
+        capture_log.CaptureReader can seek and replay.
+
+        Args:
+            path (str, optional): Defaults to data/captures/<port>-<date>.cap.
+
+        Returns:
+            str: The capture file path.
+        """
+        with self._capture_lock:
+            if self.capture is None:
+                self.capture = CaptureWriter(path or capture_path(self.port))
+            return self.capture.path
+
+    def stop_capture(self):
+        with self._capture_lock:
+            if self.capture is not None:
+                self.capture.close()
+                self.capture = None
+
+    @property
+    def is_connected(self):
+        return self.serial is not None and self.serial.is_open
+
+    def send_command(self, command):
+        if self.serial and self.serial.is_open:
+            self.serial.write(command.encode('ascii'))
+        else:
+            print("Serial port not connected.")
+
+    def add_listener(self, callback):
+        """
+        Registers a callback invoked from the read thread with every parsed
+        item, right after it is stored.
+        """
+        self.listeners.append(callback)
+
+    def open_queue(self, maxsize=None):
+        """
+        Returns `data_queue`, a bounded queue fed with every parsed item for
+        a consumer on another thread. When the consumer falls behind, the
+        oldest items are discarded and counted in `queue_dropped`. Items are
+        only queued between open_queue() and close_queue().
+        """
+        if self.data_queue is None:
+            self.data_queue = Queue(maxsize=maxsize or self.queue_size)
+            self.add_listener(self._enqueue)
+        return self.data_queue
+
+    def close_queue(self):
+        self.remove_listener(self._enqueue)
+        self.data_queue = None
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def _dispatch(self, raw_data, arrival):
+        # Complete frames and text lines are handed over as soon as they are
+        # seen; a partial frame stays in the parser.
+        self.bytes_read += len(raw_data)
+        if self.capture is not None:
+            with self._capture_lock:
+                if self.capture is not None:
+                    self.capture.append(raw_data)
+        started = time.perf_counter()
+        items = self.parser.feed(raw_data)
+        parsed = time.perf_counter()
+        self.parse_timer.observe(parsed - started)
+        now = time.time()
+        for parsed_data in items:
+            if type(parsed_data) is TelemetryRecord:
+                parsed_data.timestamp = now
+                self.telemetry.append(parsed_data, now)
+            elif "raw" in parsed_data:
+                self.messages.append(parsed_data["raw"])
+            else:
+                self.messages.append(parsed_data["error"])
+            self.latency.add(time.perf_counter() - arrival)
+            for listener in self.listeners:
+                try:
+                    listener(parsed_data)
+                except Exception as e:
+                    print(f"Error in listener {listener}: {e}")
+        if items:
+            self.dispatch_timer.observe(time.perf_counter() - parsed)
+
+    def _enqueue(self, item):
+        queue = self.data_queue
+        if queue is None:
+            return
+        try:
+            queue.put_nowait(item)
+        except Full:
+            try:
+                queue.get_nowait()
+            except Empty:
+                pass
+            self.queue_dropped += 1
+            queue.put_nowait(item)
+
     def _read_loop(self):
+        # Legacy polling reader. The bytes may have arrived at any point of the
+        # previous sleep, so latency is measured from the previous poll, which
+        # is the worst case.
+        last_poll = time.perf_counter()
         while self.is_reading:
             try:
                 if self.serial and self.serial.is_open and self.serial.in_waiting > 0:
-                    raw_data = self.serial.read(self.serial.in_waiting).decode('ascii')
-                    self.buffer += raw_data
-                    
-                    # Process complete messages from the buffer
-                    while '!' in self.buffer:
-                        message, self.buffer = self.buffer.split('!', 1)
-                        message += '!'
-                        parsed_data = self.parse_data(message)
-                        if parsed_data:
-                            self.data_queue.put(parsed_data)
-                    
-                    # Also put raw, unparsed data on the queue
-                    if self.buffer.strip():
-                        self.data_queue.put({"raw": self.buffer.strip()})
-                        self.buffer = ''
+                    started = time.perf_counter()
+                    raw_data = self.serial.read(self.serial.in_waiting)
+                    self.read_timer.observe(time.perf_counter() - started)
+                    self._dispatch(raw_data, last_poll)
 
             except Exception as e:
                 print(f"Error in read loop: {e}")
+            last_poll = time.perf_counter()
             time.sleep(0.1)
 
+    def _event_read_loop(self):
+        # Blocks on the port until the first byte of a burst arrives (or the
+        # port timeout expires, so stop_reading is honoured), then drains
+        # whatever else is already waiting without sleeping.
+        while self.is_reading:
+            try:
+                if not (self.serial and self.serial.is_open):
+                    time.sleep(0.1)
+                    continue
+                raw_data = self.serial.read(1)
+                if not raw_data:
+                    continue
+                arrival = time.perf_counter()
+                waiting = self.serial.in_waiting
+                if waiting:
+                    raw_data += self.serial.read(waiting)
+                    self.read_timer.observe(time.perf_counter() - arrival)
+                self._dispatch(raw_data, arrival)
+
+            except Exception as e:
+                if self.is_reading:
+                    print(f"Error in read loop: {e}")
+                    time.sleep(0.1)
+
     def start_reading(self):
         if not self.is_reading:
+            self.parser.reset()
+            self.latency.reset()
             self.is_reading = True
-            self.read_thread = threading.Thread(target=self._read_loop)
+            target = self._event_read_loop if self.read_mode == 'event' else self._read_loop
+            self.read_thread = threading.Thread(target=target)
             self.read_thread.daemon = True
             self.read_thread.start()
 
     def stop_reading(self):
         if self.is_reading:
             self.is_reading = False
+            if self.serial and self.serial.is_open and hasattr(self.serial, 'cancel_read'):
+                # Wake the event reader out of its blocking read.
+                self.serial.cancel_read()
             if self.read_thread:
                 self.read_thread.join()
 
@@ -130,8 +396,8 @@ class FuelCellController:
                     if ':' in part:
                         key_value = part.split(':', 1)
                         if len(key_value) == 2:
-                            key = key_value.strip()
-                            value_str = key_value.strip()
+                            key = key_value[0].strip()
+                            value_str = key_value[1].strip()
                             
                             try:
                                 value_parts = value_str.split()
@@ -0,0 +1,255 @@
+import argparse
+import json
+import math
+import threading
+import time
+from collections import OrderedDict
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+import pandas as pd
+
+from telemetry_ingest import COLUMN_NAMES, TABLE_NAME as TELEMETRY_TABLE
+
+QUESTDB_URL = 'http://localhost:9000'
+DAQ_TABLE = 'daq_measurements'  # ni_daq.TABLE_NAME, without importing nidaqmx
+CHART_POINTS = 600
+PAGE_BUCKETS = 500  # Buckets per cached page
+CACHE_PAGES = 256
+
+# SAMPLE BY steps, in ms: the smallest one giving at most `points` buckets
+# over the requested range is used.
+INTERVALS_MS = (
+    1, 2, 5, 10, 20, 50, 100, 200, 500,
+    1000, 2000, 5000, 10000, 15000, 30000,
+    60000, 2 * 60000, 5 * 60000, 10 * 60000, 15 * 60000, 30 * 60000,
+    3600000, 2 * 3600000, 3 * 3600000, 6 * 3600000, 12 * 3600000, 86400000,
+)
+_UNITS = (('d', 86400000), ('h', 3600000), ('m', 60000), ('s', 1000), ('T', 1))
+
+
+def sample_interval(start, end, points=CHART_POINTS):
+    """The SAMPLE BY step (ms) for `points` buckets between start and end (seconds)."""
+    wanted = (end - start) * 1000 / max(1, points)
+    for interval in INTERVALS_MS:
+        if interval >= wanted:
+            return interval
+    return INTERVALS_MS[-1] * math.ceil(wanted / INTERVALS_MS[-1])
+
+
+def interval_literal(interval_ms):
+    """5000 -> '5s', 900000 -> '15m', 200 -> '200T' (QuestDB's millisecond unit)."""
+    for unit, size in _UNITS:
+        if interval_ms % size == 0:
+            return f"{interval_ms // size}{unit}"
+    return f"{interval_ms}T"
+
+
+def timestamp_literal(ms):
+    seconds, ms = divmod(int(ms), 1000)
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(seconds)) + f".{ms:03d}000Z"
+
+
+def _quote(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class HistoryClient:
+    """
+    Downsampled reads of the QuestDB tables over HTTP (/exec).
+
+    Every read is a SAMPLE BY query whose step is sized to the chart
+    (`points` buckets over the range), so raw rows are never pulled.
+    Results are cached by page: PAGE_BUCKETS buckets of one step, aligned
+    on multiples of the page length since the epoch. Panning only queries
+    the pages that came into view, and going back to a range already seen,
+    at the same zoom level, is answered from the cache. Pages that are not
+    over yet (their end is in the future) are always queried again.
+
+    The cache is a per-client LRU of `cache_pages` pages, safe to share
+    between threads (Streamlit sessions, say).
+    """
+
+    def __init__(self, url=QUESTDB_URL, cache_pages=CACHE_PAGES, timeout=10.0):
+        self.url = url.rstrip('/')
+        self.cache_pages = cache_pages
+        self.timeout = timeout
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.queries = 0
+        self.rows_fetched = 0
+
+    def stats(self):
+        return {
+            "pages": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "queries": self.queries,
+            "rows_fetched": self.rows_fetched,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def execute(self, query):
+        """
+        Runs one query and returns the result as a DataFrame.
+
+        Raises:
+            OSError: QuestDB is unreachable.
+            ValueError: QuestDB rejected the query.
+        """
+        try:
+            with urlopen(f"{self.url}/exec?{urlencode({'query': query})}", timeout=self.timeout) as response:
+                payload = json.load(response)
+        except HTTPError as e:
+            try:
+                message = json.load(e).get('error', e.reason)
+            except ValueError:
+                message = e.reason
+            raise ValueError(f"QuestDB rejected the query: {message}") from None
+        self.queries += 1
+        self.rows_fetched += payload.get('count', 0)
+        names = [column['name'] for column in payload['columns']]
+        frame = pd.DataFrame(payload['dataset'], columns=names)
+        for column in payload['columns']:
+            if column['type'] == 'TIMESTAMP':
+                frame[column['name']] = pd.to_datetime(frame[column['name']], utc=True).dt.tz_localize(None)
+        return frame
+
+    def sample(self, table, columns, start, end, points=CHART_POINTS, filters=None, keys=(), aggregate='avg'):
+        """
+        Aggregates `columns` of `table` over [start, end).
+
+        Args:
+            table (str): Table name.
+            columns (list of str): Numeric columns to aggregate.
+            start, end (float): Seconds since the epoch.
+            points (int): Upper bound on the buckets returned (per key).
+            filters (dict, optional): Symbol column to a value or a list of values.
+            keys (tuple of str): Symbol columns to group by, e.g. ('channel_id',).
+            aggregate (str): QuestDB aggregate function (avg, min, max, ...).
+
+        Returns:
+            DataFrame: `timestamp` (bucket start, naive UTC), the keys and the columns.
+        """
+        interval = sample_interval(start, end, points)
+        page = interval * PAGE_BUCKETS
+        start_ms, end_ms = int(start * 1000), int(math.ceil(end * 1000))
+        filters = tuple(sorted((column, tuple(value) if isinstance(value, (list, tuple)) else value)
+                               for column, value in (filters or {}).items()))
+        spec = (table, tuple(columns), filters, tuple(keys), aggregate, interval)
+        pages = list(range(start_ms // page * page, end_ms, page))
+
+        frames = {}
+        missing = []
+        with self._lock:
+            for page_start in pages:
+                frame = self._cache.get(spec + (page_start,))
+                if frame is None:
+                    missing.append(page_start)
+                else:
+                    self._cache.move_to_end(spec + (page_start,))
+                    frames[page_start] = frame
+            self.hits += len(frames)
+            self.misses += len(missing)
+
+        # One query per run of consecutive missing pages.
+        now_ms = time.time() * 1000
+        for first, last in _runs(missing, page):
+            result = self.execute(self._query(spec, first, last + page))
+            stamps = result['timestamp'].to_numpy('datetime64[ms]').astype('int64') if len(result) else None
+            for page_start in range(first, last + page, page):
+                if stamps is None:
+                    part = result
+                else:
+                    part = result[(stamps >= page_start) & (stamps < page_start + page)].reset_index(drop=True)
+                frames[page_start] = part
+                if page_start + page <= now_ms:
+                    self._store(spec + (page_start,), part)
+
+        if not frames:
+            return pd.DataFrame(columns=['timestamp', *keys, *columns])
+        result = pd.concat([frames[page_start] for page_start in pages], ignore_index=True)
+        stamps = result['timestamp'].to_numpy('datetime64[ms]').astype('int64')
+        return result[(stamps >= start_ms // interval * interval) & (stamps < end_ms)].reset_index(drop=True)
+
+    def telemetry(self, start, end, fields=('FC_V', 'FC_A'), port=None, points=CHART_POINTS):
+        """Protium telemetry fields (FIELDS keys) over [start, end), indexed by time."""
+        columns = [COLUMN_NAMES[key] for key in fields]
+        frame = self.sample(TELEMETRY_TABLE, columns, start, end, points,
+                            filters={'port': port} if port else None)
+        return frame.set_index('timestamp').rename(columns=dict(zip(columns, fields)))
+
+    def daq(self, start, end, channels=None, points=CHART_POINTS):
+        """NI DAQ voltages over [start, end), one column per channel, indexed by time."""
+        frame = self.sample(DAQ_TABLE, ['voltage'], start, end, points,
+                            filters={'channel_id': list(channels)} if channels else None, keys=('channel_id',))
+        if frame.empty:
+            return pd.DataFrame(index=pd.DatetimeIndex([], name='timestamp'))
+        return frame.pivot(index='timestamp', columns='channel_id', values='voltage')
+
+    def _query(self, spec, start_ms, end_ms):
+        table, columns, filters, keys, aggregate, interval = spec
+        select = ', '.join(['timestamp', *keys] + [f"{aggregate}({column}) {column}" for column in columns])
+        where = [f"timestamp >= '{timestamp_literal(start_ms)}'", f"timestamp < '{timestamp_literal(end_ms)}'"]
+        for column, value in filters:
+            if isinstance(value, (list, tuple)):
+                where.append(f"{column} IN ({', '.join(_quote(v) for v in value)})")
+            else:
+                where.append(f"{column} = {_quote(value)}")
+        return (f"SELECT {select} FROM {table} WHERE {' AND '.join(where)} "
+                f"SAMPLE BY {interval_literal(interval)} ALIGN TO CALENDAR")
+
+    def _store(self, key, frame):
+        with self._lock:
+            self._cache[key] = frame
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_pages:
+                self._cache.popitem(last=False)
+
+
+def _runs(pages, page):
+    """Groups sorted page starts into (first, last) runs of consecutive pages."""
+    runs = []
+    for page_start in pages:
+        if runs and page_start == runs[-1][1] + page:
+            runs[-1][1] = page_start
+        else:
+            runs.append([page_start, page_start])
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query downsampled telemetry history from QuestDB.")
+    parser.add_argument('--url', default=QUESTDB_URL, help="QuestDB HTTP endpoint.")
+    parser.add_argument('--table', choices=('telemetry', 'daq'), default='telemetry')
+    parser.add_argument('--start', default=None, help="Local date/time, e.g. 2025-03-18T14:00 (default: 24 h ago).")
+    parser.add_argument('--end', default=None, help="Local date/time (default: now).")
+    parser.add_argument('--fields', nargs='+', default=['FC_V', 'FC_A'], help="Telemetry fields.")
+    parser.add_argument('--port', default=None, help="Only the telemetry of this serial port.")
+    parser.add_argument('--points', type=int, default=CHART_POINTS, help="Buckets over the range.")
+    args = parser.parse_args()
+
+    from datetime import datetime
+    end = datetime.fromisoformat(args.end).timestamp() if args.end else time.time()
+    start = datetime.fromisoformat(args.start).timestamp() if args.start else end - 86400
+    client = HistoryClient(args.url)
+    try:
+        if args.table == 'telemetry':
+            frame = client.telemetry(start, end, args.fields, args.port, args.points)
+        else:
+            frame = client.daq(start, end, points=args.points)
+    except (OSError, ValueError) as e:
+        print(f"Query failed: {e}")
+        raise SystemExit(1)
+    print(f"{len(frame)} buckets of {interval_literal(sample_interval(start, end, args.points))}")
+    print(frame.to_string(max_rows=20))
+
+
+if __name__ == "__main__":
+    main()
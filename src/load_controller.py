@@ -1,97 +1,352 @@
+import argparse
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
 import pybk8500
 import serial
-import time
 
-# Per the pybk8500 documentation, there is no high-level BK8500 class.
-# Interaction is done by sending command objects over a serial port.
-
-# --- Connection Settings ---
-SERIAL_PORT = 'COM9'
-BAUD_RATE = 9600 # Trying a common default baud rate
-TIMEOUT = 1 # seconds
-
-ser = None
-try:
-    # --- Setup Connection ---
-    # Per the manual, DTR and RTS must be enabled.
-    ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=TIMEOUT)
-    ser.rts = True
-    ser.dtr = True
-    print(f"Connected to {SERIAL_PORT} at {BAUD_RATE} baud.")
-    time.sleep(0.1) # Short delay for device to initialize
-
-    parser = pybk8500.Parser()
-
-    def send_and_parse(command):
-        """Sends a command and waits for and parses the 26-byte response."""
-        ser.write(bytes(command))
-        time.sleep(0.2) # Add delay to allow device to process
-        response_bytes = ser.read(26)
-        if len(response_bytes) < 26:
-            print(f"Warning: Received incomplete response ({len(response_bytes)} bytes).")
-            return None, None
-        msg, error, _ = parser.parse_msg(response_bytes)
-        return msg, error
-
-    # --- Configure the Load ---
-
-    # Put device in remote mode
-    print("Setting remote control ON...")
-    send_and_parse(pybk8500.RemoteOn())
-
-    # Set remote sense
-    # Note: The original code had `load.remote_sense = True`.
-    # The command is SetRemoteSensingState, value=1 for ON.
-    print("Setting remote sense ON...")
-    send_and_parse(pybk8500.SetRemoteSensingState(value=1))
-
-    # Set function to Constant Current (CC)
-    print("Setting mode to CC...")
-    send_and_parse(pybk8500.SetMode(value='CC'))
-
-    # Set current to 10 Amps
-    current_to_set = 10.0
-    print(f"Setting CC current to {current_to_set} A...")
-    send_and_parse(pybk8500.SetCCModeCurrent(value=current_to_set))
-
-    # --- Run the Load ---
-
-    # Turn the load on
-    print("Turning load ON...")
-    send_and_parse(pybk8500.LoadOn())
-
-    # Let it run for a moment
-    time.sleep(2)
-
-    # --- Read Measurements ---
-    print("Reading input voltage and current...")
-    msg, error = send_and_parse(pybk8500.ReadInputVoltageCurrentPowerState())
-
-    if error:
-        print(f"Error parsing response: {error}")
-    elif msg:
-        # The field names 'voltage' and 'current' are educated guesses based on the
-        # library's structure. If this doesn't work, the fields of the
-        # message object should be inspected (e.g., print(msg.fields())).
-        voltage = msg.fields().get('voltage', 'N/A')
-        current = msg.fields().get('current', 'N/A')
-        print(f"  Voltage: {voltage} V")
-        print(f"  Current: {current} A")
-    else:
-        print("  No message received from device.")
-
-
-except serial.SerialException as e:
-    print(f"Error opening or using serial port {SERIAL_PORT}: {e}")
-
-finally:
-    # --- Shutdown ---
-    if ser and ser.is_open:
-        print("Turning load OFF...")
-        send_and_parse(pybk8500.LoadOff())
-
-        print("Setting remote control OFF...")
-        send_and_parse(pybk8500.RemoteOff())
-
-        ser.close()
-        print("Serial port closed.")
+from fuel_cell_controller import LatencyStats
+
+FRAME_SIZE = pybk8500.Parser.MSG_LENGTH  # Every BK8500 frame is 26 bytes.
+STATUS_OK = 'Command was successful'
+
+
+class LoadError(Exception):
+    """The load answered a command with an error status, or not at all."""
+
+
+def answers(command, msg):
+    """Whether `msg` can be the reply to `command`: a frame of the same type, or a status."""
+    return isinstance(msg, pybk8500.CommandStatus) or msg.ID == command.ID
+
+
+class LoadController:
+    """
+    Driver for the BK Precision 8500 series DC electronic load.
+
+    Every command is answered by exactly one 26-byte frame: a CommandStatus
+    for settings, a frame of the same type for readings. Commands are
+    written as soon as fewer than `max_in_flight` are awaiting their reply,
+    and a read thread completes them in order as frames arrive, without
+    fixed delays. submit() returns a Future; request() waits for it.
+
+    The load answers in order, so a reply that arrives after its command
+    timed out comes before the replies of later commands. Such a reply is
+    matched to the expired command by type and discarded (counted in
+    `late_replies`), never handed to the next command.
+
+    start_polling() keeps ReadInputVoltageCurrentPowerState requests in
+    flight and records each reading, timestamped, in `samples` and to the
+    listeners.
+    """
+
+    def __init__(self, port, baudrate=9600, address=0, timeout=1.0, max_in_flight=2, history_size=100000):
+        self.port = port
+        self.baudrate = baudrate
+        self.address = address
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self.serial = None
+        self.is_reading = False
+        self.read_thread = None
+        self.parser = pybk8500.Parser()
+        self.parser.error = self._on_parse_error
+        self.samples = deque(maxlen=history_size)
+        self.listeners = []
+        self.latency = LatencyStats()
+        self.parse_errors = 0
+        self.timeouts = 0
+        self.late_replies = 0
+        self._waiting = deque()
+        self._in_flight = deque()
+        self._expired = deque()  # Timed out, their reply may still come.
+        self._lock = threading.Lock()
+        self._is_polling = False
+        self._poll_thread = None
+
+    # --- Connection ---
+
+    def connect(self):
+        # Per the manual, DTR and RTS must be enabled. Setting them before
+        # open() applies them as the port opens (and tolerates ports without
+        # modem lines, such as pseudo-terminals).
+        self.serial = serial.Serial(timeout=0.05)
+        self.serial.port = self.port
+        self.serial.baudrate = self.baudrate
+        self.serial.rts = True
+        self.serial.dtr = True
+        self.serial.open()
+        self.serial.reset_input_buffer()
+        self.is_reading = True
+        self.read_thread = threading.Thread(target=self._read_loop, daemon=True)
+        self.read_thread.start()
+        print(f"Connected to {self.port} at {self.baudrate} baud.")
+
+    def disconnect(self):
+        self.stop_polling()
+        self.is_reading = False
+        if self.read_thread:
+            self.read_thread.join(timeout=1)
+            self.read_thread = None
+        if self.serial and self.serial.is_open:
+            self.serial.close()
+            print("Disconnected from serial port.")
+        self._fail_all(LoadError("disconnected"))
+
+    @property
+    def is_connected(self):
+        return self.serial is not None and self.serial.is_open
+
+    # --- Commands ---
+
+    def submit(self, command):
+        """
+        Queues a pybk8500 command.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the reply message, or to
+            LoadError when the load reports an error status or does not
+            answer within `timeout`.
+        """
+        if self.address:
+            command.address = self.address
+        future = Future()
+        with self._lock:
+            self._waiting.append((command, future))
+            self._pump()
+        return future
+
+    def request(self, command, timeout=None):
+        """Sends a command and waits for its reply message."""
+        try:
+            return self.submit(command).result(timeout if timeout is not None else 2 * self.timeout)
+        except FutureTimeoutError:
+            raise LoadError(f"no reply to {type(command).__name__}") from None
+
+    def remote_on(self):
+        return self.request(pybk8500.RemoteOn())
+
+    def remote_off(self):
+        return self.request(pybk8500.RemoteOff())
+
+    def load_on(self):
+        return self.request(pybk8500.LoadOn())
+
+    def load_off(self):
+        return self.request(pybk8500.LoadOff())
+
+    def set_remote_sense(self, enabled=True):
+        return self.request(pybk8500.SetRemoteSensingState(value=int(enabled)))
+
+    def set_mode(self, mode='CC'):
+        return self.request(pybk8500.SetMode(value=mode))
+
+    def set_cc_current(self, current):
+        return self.request(pybk8500.SetCCModeCurrent(value=current))
+
+    def read_input(self):
+        """Reads the terminal voltage, current and power; see sample()."""
+        sent = time.time()
+        return self.sample(self.request(pybk8500.ReadInputVoltageCurrentPowerState()), sent)
+
+    @staticmethod
+    def sample(msg, sent=None):
+        """
+        Converts a ReadInput reply to a dict. The timestamp (epoch seconds)
+        is the midpoint between the request and the reply when `sent` is given.
+        """
+        received = msg.timestamp.timestamp()
+        return {
+            "timestamp": received if sent is None else (sent + received) / 2,
+            "voltage": msg.voltage,
+            "current": msg.current,
+            "power": msg.power,
+            "operation_state": msg[15],
+            "demand_state": msg[16] | msg[17] << 8,
+        }
+
+    # --- Polling ---
+
+    def add_listener(self, callback):
+        """Registers a callback invoked from the read thread with every polled sample."""
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def start_polling(self, interval=0.0):
+        """
+        Reads the input continuously, every `interval` seconds or, with 0,
+        as fast as the link allows with up to `max_in_flight` requests
+        outstanding.
+        """
+        if self._poll_thread is not None:
+            return
+        self._is_polling = True
+        self._poll_thread = threading.Thread(target=self._poll_loop, args=(interval,), daemon=True)
+        self._poll_thread.start()
+
+    def stop_polling(self):
+        self._is_polling = False
+        if self._poll_thread is not None:
+            self._poll_thread.join(timeout=2 * self.timeout)
+            self._poll_thread = None
+
+    def _poll_loop(self, interval):
+        slots = threading.BoundedSemaphore(self.max_in_flight)
+        next_poll = time.monotonic()
+        while self._is_polling:
+            if interval:
+                delay = next_poll - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_poll = max(next_poll + interval, time.monotonic())
+            if not slots.acquire(timeout=0.1):
+                continue
+            sent = time.time()
+            future = self.submit(pybk8500.ReadInputVoltageCurrentPowerState())
+            future.add_done_callback(lambda f, sent=sent: self._on_sample(f, sent, slots))
+
+    def _on_sample(self, future, sent, slots):
+        slots.release()
+        if future.exception() is not None:
+            return
+        sample = self.sample(future.result(), sent)
+        self.samples.append(sample)
+        for listener in self.listeners:
+            try:
+                listener(sample)
+            except Exception as e:
+                print(f"Error in listener {listener}: {e}")
+
+    # --- I/O ---
+
+    def _pump(self):
+        # Called with the lock held: writes queued commands while there is room.
+        while self._waiting and len(self._in_flight) < self.max_in_flight:
+            command, future = self._waiting.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                self.serial.write(bytes(command))
+            except (serial.SerialException, AttributeError) as e:
+                future.set_exception(LoadError(f"write failed: {e}"))
+                continue
+            self._in_flight.append((command, future, time.perf_counter()))
+
+    def _read_loop(self):
+        # Reads exactly the bytes missing from the next frame; the port
+        # timeout only bounds how long a stop request or an overdue reply
+        # goes unnoticed.
+        buffer = bytearray()
+        while self.is_reading:
+            try:
+                data = self.serial.read(max(FRAME_SIZE - len(buffer), self.serial.in_waiting))
+            except (serial.SerialException, TypeError, OSError) as e:
+                if self.is_reading:
+                    print(f"Error in read loop: {e}")
+                    time.sleep(0.1)
+                continue
+            if data:
+                buffer.extend(data)
+                while len(buffer) >= FRAME_SIZE:
+                    msg, error, remaining = self.parser.parse_msg(buffer)
+                    buffer = bytearray(remaining)
+                    if msg is not None:
+                        self._complete(msg)
+                    elif error is None:
+                        break
+            self._expire()
+
+    def _complete(self, msg):
+        with self._lock:
+            while self._expired:
+                command, _ = self._expired.popleft()
+                if answers(command, msg):
+                    self.late_replies += 1
+                    return
+                # Otherwise the expired command's reply was lost.
+            if not self._in_flight or not answers(self._in_flight[0][0], msg):
+                self.late_replies += 1
+                return  # Unsolicited, or a reply that cannot be this command's.
+            command, future, sent = self._in_flight.popleft()
+            self._pump()
+        self.latency.add(time.perf_counter() - sent)
+        if isinstance(msg, pybk8500.CommandStatus) and msg.status != STATUS_OK:
+            future.set_exception(LoadError(f"{type(command).__name__}: {msg.status}"))
+        else:
+            future.set_result(msg)
+
+    def _expire(self):
+        now = time.perf_counter()
+        expired = []
+        with self._lock:
+            while self._in_flight and now - self._in_flight[0][2] > self.timeout:
+                expired.append(self._in_flight.popleft())
+            # A reply later than twice the timeout is taken as lost.
+            while self._expired and now - self._expired[0][1] > 2 * self.timeout:
+                self._expired.popleft()
+            self._expired.extend((command, sent) for command, _, sent in expired)
+            if expired:
+                self._pump()
+        for command, future, _ in expired:
+            self.timeouts += 1
+            future.set_exception(LoadError(f"no reply to {type(command).__name__} within {self.timeout} s"))
+
+    def _fail_all(self, error):
+        with self._lock:
+            pending = list(self._in_flight) + [(command, future, None) for command, future in self._waiting]
+            self._in_flight.clear()
+            self._waiting.clear()
+            self._expired.clear()
+        for _, future, _ in pending:
+            if not future.done():
+                future.set_exception(error)
+
+    def _on_parse_error(self, error):
+        self.parse_errors += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the BK8500 load at a constant current and read its input.")
+    parser.add_argument('port', help="Serial port of the load, e.g. COM9.")
+    parser.add_argument('--baudrate', type=int, default=9600)
+    parser.add_argument('--current', type=float, default=10.0, help="CC mode current in A.")
+    parser.add_argument('--duration', type=float, default=2.0, help="Seconds to poll the input for.")
+    args = parser.parse_args()
+
+    load = LoadController(args.port, args.baudrate)
+    try:
+        load.connect()
+    except serial.SerialException as e:
+        print(f"Error opening or using serial port {args.port}: {e}")
+        return
+    try:
+        load.remote_on()
+        load.set_remote_sense(True)
+        load.set_mode('CC')
+        load.set_cc_current(args.current)
+        load.load_on()
+        load.start_polling()
+        time.sleep(args.duration)
+        load.stop_polling()
+        if load.samples:
+            last = load.samples[-1]
+            print(f"{len(load.samples)} readings; last: {last['voltage']:.3f} V, {last['current']:.4f} A, {last['power']:.3f} W")
+        print(f"Round trip: {load.latency.summary()}")
+    except LoadError as e:
+        print(f"Load error: {e}")
+    finally:
+        try:
+            load.load_off()
+            load.remote_off()
+        except LoadError as e:
+            print(f"Load error during shutdown: {e}")
+        load.disconnect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9464
+METRICS_TABLE = 'exocet_metrics'
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Counter:
+    """Monotonic count. Updated by a single thread; reads are lock-free."""
+
+    kind = 'counter'
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self):
+        return [('', {}, self.value)]
+
+
+class Gauge:
+    """Current value, either set directly or read from `fn` at collection time."""
+
+    kind = 'gauge'
+
+    def __init__(self, fn=None):
+        self.fn = fn
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        if self.fn is None:
+            return [('', {}, self.value)]
+        try:
+            value = self.fn()
+        except Exception:
+            return []  # The instrumented object is gone or not ready.
+        return [] if value is None else [('', {}, value)]
+
+
+class CallbackCounter(Gauge):
+    """Counter whose value is already kept elsewhere (e.g. controller.queue_dropped)."""
+
+    kind = 'counter'
+
+
+class Timer:
+    """
+    Duration summary: total count and sum, plus quantiles over the last
+    `size` observations. observe() is two attribute updates and a deque
+    append, cheap enough for per-chunk use on the read path.
+    """
+
+    kind = 'summary'
+
+    def __init__(self, size=1000):
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=size)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        self.recent.append(seconds)
+
+    def time(self):
+        return _Timing(self)
+
+    def samples(self):
+        recent = sorted(self.recent)
+        samples = []
+        if recent:
+            for q in QUANTILES:
+                samples.append(('', {'quantile': str(q)}, recent[min(len(recent) - 1, int(q * len(recent)))]))
+        samples.append(('_sum', {}, self.sum))
+        samples.append(('_count', {}, self.count))
+        return samples
+
+
+class _Timing:
+    def __init__(self, timer):
+        self.timer = timer
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timer.observe(time.perf_counter() - self.start)
+
+
+class Registry:
+    """
+    Named metrics, rendered in the Prometheus text format.
+
+    Metrics are keyed by name and labels; registering the same series
+    again (a new controller on the same port, say) replaces the previous
+    one instead of adding a duplicate.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._help = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, help_text, metric, labels=None):
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            self._metrics[key] = metric
+            self._help[name] = (help_text, metric.kind)
+        return metric
+
+    def counter(self, name, help_text, labels=None, fn=None):
+        return self.register(name, help_text, CallbackCounter(fn) if fn else Counter(), labels)
+
+    def gauge(self, name, help_text, labels=None, fn=None):
+        return self.register(name, help_text, Gauge(fn), labels)
+
+    def timer(self, name, help_text, labels=None, size=1000):
+        return self.register(name, help_text, Timer(size), labels)
+
+    def collect(self):
+        """Returns (name, labels dict, value) for every sample."""
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        collected = []
+        for (name, labels), metric in metrics:
+            for suffix, extra, value in metric.samples():
+                collected.append((name + suffix, dict(labels, **extra), float(value)))
+        return collected
+
+    def render(self):
+        """The Prometheus text exposition format, version 0.0.4."""
+        with self._lock:
+            families = sorted(self._help.items())
+        by_name = {}
+        for name, labels, value in self.collect():
+            by_name.setdefault(name, []).append((labels, value))
+        lines = []
+        for family, (help_text, kind) in families:
+            lines.append(f"# HELP {family} {help_text}")
+            lines.append(f"# TYPE {family} {kind}")
+            for suffix in ('', '_sum', '_count'):
+                for labels, value in by_name.get(family + suffix, ()):
+                    lines.append(f"{family}{suffix}{format_labels(labels)} {value!r}")
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = []
+    for key, value in sorted(labels.items()):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+REGISTRY = Registry()
+
+
+class MetricsServer:
+    """Serves REGISTRY (or `registry`) on http://host:port/metrics from a background thread."""
+
+    def __init__(self, registry=REGISTRY, host=METRICS_HOST, port=METRICS_PORT):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+
+    def start(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_port
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def serve(port=METRICS_PORT, host=METRICS_HOST):
+    """Starts the endpoint, or reports why it could not (e.g. the port is taken) and returns None."""
+    try:
+        server = MetricsServer(REGISTRY, host, port).start()
+    except OSError as e:
+        print(f"Metrics endpoint not started on {host}:{port}: {e}")
+        return None
+    print(f"Metrics on http://{host}:{server.port}/metrics")
+    return server
+
+
+class MetricsWriter:
+    """
+    Writes a snapshot of the registry to a QuestDB table every `interval`
+    seconds, one row per sample: `metric` and `labels` (e.g.
+    "port:COM7,quantile:0.99") symbols and a `value` column. Errors are
+    reported and the next snapshot retried.
+    """
+
+    def __init__(self, conf='http::addr=localhost:9000;', table_name=METRICS_TABLE, interval=10.0,
+                 registry=REGISTRY):
+        self.conf = conf
+        self.table_name = table_name
+        self.interval = interval
+        self.registry = registry
+        self.snapshots = 0
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def write(self, sender):
+        from questdb.ingress import TimestampNanos
+
+        at = TimestampNanos.now()
+        for name, labels, value in self.registry.collect():
+            label_text = ','.join(f"{key}:{value}" for key, value in sorted(labels.items())) or '-'
+            sender.row(self.table_name, symbols={'metric': name, 'labels': label_text},
+                       columns={'value': value}, at=at)
+        sender.flush()
+        self.snapshots += 1
+
+    def _run(self):
+        from questdb.ingress import IngressError, Sender
+
+        while not self._stop.wait(self.interval):
+            try:
+                with Sender.from_conf(self.conf) as sender:
+                    self.write(sender)
+            except IngressError as e:
+                self.errors += 1
+                print(f"Metrics not written to QuestDB: {e}")
@@ -1,87 +1,278 @@
-import nidaqmx
-from nidaqmx.constants import TerminalConfiguration, AcquisitionType
+import argparse
+import numpy as np
 import pandas as pd
 from questdb.ingress import Sender, IngressError
 import time
-import datetime
+
+from metrics import REGISTRY, serve
 
 # DAQ Configuration
 DEVICE = "Dev1"
 CHANNELS = "ai0:3"  # Read from 4 channels, ai0 through ai3
 SAMPLING_RATE = 10  # Hz
+BLOCK_SIZE = 10  # Samples per channel handed to QuestDB at once
+BUFFER_SECONDS = 5
 
 # QuestDB Configuration
 QUESTDB_HOST = 'localhost'
 QUESTDB_PORT = 9009
 TABLE_NAME = 'daq_measurements'
 
+def expand_channels(channels):
+    """
+    Expands a DAQmx physical channel range such as "ai0:3" into
+    ['ai0', 'ai1', 'ai2', 'ai3'].
+    """
+    names = []
+    for part in channels.split(','):
+        part = part.strip()
+        prefix = part.rstrip('0123456789:')
+        if ':' in part:
+            first, last = part[len(prefix):].split(':')
+            names.extend(f"{prefix}{i}" for i in range(int(first), int(last) + 1))
+        else:
+            names.append(part)
+    return names
+
+class NidaqmxSource:
+    """
+    Continuous, hardware-timed acquisition from an NI DAQ device.
+
+    Samples are pulled in blocks with the stream reader straight into the
+    caller's preallocated array. nidaqmx is only imported here, so the
+    synthetic source runs without the NI-DAQmx driver.
+    """
+
+    def __init__(self, device=DEVICE, channels=CHANNELS, rate=SAMPLING_RATE, buffer_seconds=BUFFER_SECONDS):
+        from nidaqmx.errors import DaqError
+
+        self.errors = (DaqError,)
+        self.device = device
+        self.channels = expand_channels(channels)
+        self.physical_channels = f"{device}/{channels}"
+        self.rate = rate
+        self.buffer_seconds = buffer_seconds
+        self.task = None
+        self.reader = None
+        self.start_time_ns = None
+
+    def start(self, block_size):
+        import nidaqmx
+        from nidaqmx.constants import TerminalConfiguration, AcquisitionType
+        from nidaqmx.stream_readers import AnalogMultiChannelReader
+
+        self.task = nidaqmx.Task()
+        self.task.ai_channels.add_ai_voltage_chan(
+            self.physical_channels,
+            terminal_config=TerminalConfiguration.DIFF,
+            min_val=-10.0,
+            max_val=10.0)
+        self.task.timing.cfg_samp_clk_timing(
+            self.rate,
+            sample_mode=AcquisitionType.CONTINUOUS,
+            samps_per_chan=max(int(self.rate * self.buffer_seconds), 4 * block_size))
+        self.reader = AnalogMultiChannelReader(self.task.in_stream)
+        self._start_task()
+
+    def _start_task(self):
+        self.task.start()
+        # Time of the first sample; later samples follow the sample clock.
+        self.start_time_ns = time.time_ns()
+
+    def read_block(self, data):
+        """Fills `data` (channels x samples) and returns the samples read per channel."""
+        samples = data.shape[1]
+        return self.reader.read_many_sample(
+            data, number_of_samples_per_channel=samples, timeout=samples / self.rate + 2.0)
+
+    def fill_level(self):
+        """Fraction of the device input buffer waiting to be read."""
+        in_stream = self.task.in_stream
+        return in_stream.avail_samp_per_chan / in_stream.input_buf_size
+
+    def restart(self):
+        """Recovers from a buffer overflow; the sample count starts over."""
+        self.task.stop()
+        self._start_task()
+
+    def close(self):
+        if self.task is not None:
+            self.task.close()
+            self.task = None
+
+class SyntheticSource:
+    """
+    Stand-in for NidaqmxSource: sine waves plus noise, one per channel.
+
+    With realtime=True, read_block waits for the block's sample-clock time as
+    the hardware would; otherwise blocks are produced as fast as possible.
+    """
+
+    errors = ()  # Source-specific exceptions run() recovers from; none here.
+
+    def __init__(self, channels=CHANNELS, rate=SAMPLING_RATE, realtime=True, seed=0):
+        self.channels = expand_channels(channels)
+        self.rate = rate
+        self.realtime = realtime
+        self.start_time_ns = None
+        self._rng = np.random.default_rng(seed)
+        self._sample_index = 0
+        self._phase = np.arange(len(self.channels))[:, None] * (np.pi / 4)
+
+    def start(self, block_size):
+        self.start_time_ns = time.time_ns()
+        self._sample_index = 0
+
+    def read_block(self, data):
+        samples = data.shape[1]
+        if self.realtime:
+            due_ns = self.start_time_ns + int((self._sample_index + samples) * 1e9 / self.rate)
+            delay = (due_ns - time.time_ns()) / 1e9
+            if delay > 0:
+                time.sleep(delay)
+        t = (self._sample_index + np.arange(samples)) / self.rate
+        np.sin(2 * np.pi * 0.5 * t + self._phase, out=data)
+        data *= 5.0
+        data += self._rng.normal(0.0, 0.01, size=data.shape)
+        self._sample_index += samples
+        return samples
+
+    def fill_level(self):
+        return 0.0
+
+    def restart(self):
+        self.start(None)
+
+    def close(self):
+        pass
+
+class BlockAcquisition:
+    """
+    Reads blocks from a source and ingests each one into QuestDB with a
+    single Sender.dataframe call, in the long (timestamp, channel_id,
+    voltage) layout of the `daq_measurements` table.
+
+    Sample timestamps come from the sample clock: the first sample's time
+    plus index / rate, not from when the block was read.
+    """
+
+    def __init__(self, source, block_size=BLOCK_SIZE, table_name=TABLE_NAME, registry=REGISTRY):
+        self.source = source
+        self.block_size = block_size
+        self.table_name = table_name
+        n_channels = len(source.channels)
+        self.data = np.empty((n_channels, block_size))
+        self._offsets = np.arange(block_size, dtype=np.int64)
+        self._categories = pd.Index(source.channels)
+        self._codes = np.repeat(np.arange(n_channels, dtype=np.int8), block_size)
+        self._sample_index = 0
+        self.blocks = 0
+        self.samples = 0
+        labels = {'table': table_name}
+        self.read_timer = registry.timer('exocet_daq_read_seconds', "Time to read and frame one block", labels)
+        self.ingest_timer = registry.timer('exocet_daq_ingest_seconds', "Time to ingest one block", labels)
+        registry.counter('exocet_daq_samples_total', "Samples acquired per channel", labels,
+                         fn=lambda: self.samples)
+        registry.gauge('exocet_daq_buffer_fill', "Fraction of the device buffer waiting to be read", labels,
+                       fn=source.fill_level)
+
+    def start(self):
+        self.source.start(self.block_size)
+        self._sample_index = 0
+
+    def restart(self):
+        self.source.restart()
+        self._sample_index = 0
+
+    def next_block(self):
+        """Acquires one block and returns it as a DataFrame ready for ingestion."""
+        n = self.source.read_block(self.data)
+        sample_ns = 1e9 / self.source.rate
+        timestamps = self.source.start_time_ns + ((self._sample_index + self._offsets[:n]) * sample_ns).astype(np.int64)
+        self._sample_index += n
+        self.blocks += 1
+        self.samples += n
+
+        n_channels = self.data.shape[0]
+        return pd.DataFrame({
+            'timestamp': np.tile(timestamps, n_channels).view('datetime64[ns]'),
+            'channel_id': pd.Categorical.from_codes(
+                self._codes if n == self.block_size else np.repeat(np.arange(n_channels, dtype=np.int8), n),
+                categories=self._categories),
+            'voltage': self.data[:, :n].ravel(),
+        })
+
+    def ingest(self, sender, df):
+        sender.dataframe(
+            df,
+            table_name=self.table_name,
+            symbols=['channel_id'],
+            at='timestamp')
+
+def run(acquisition, sender, duration=None, verbose=True):
+    """
+    Acquires and ingests blocks until interrupted or `duration` seconds elapse.
+    """
+    acquisition.start()
+    started = time.perf_counter()
+    last_report = started
+    while duration is None or time.perf_counter() - started < duration:
+        try:
+            with acquisition.read_timer.time():
+                df = acquisition.next_block()
+            with acquisition.ingest_timer.time():
+                acquisition.ingest(sender, df)
+        except IngressError as e:
+            print(f"QuestDB Ingress Error: {e}")
+        except acquisition.source.errors as e:
+            print(f"NI DAQmx Error: {e}")
+            # Stop and restart the task on buffer overflow or other errors
+            acquisition.restart()
+
+        now = time.perf_counter()
+        if verbose and now - last_report >= 5:
+            rate = acquisition.samples / (now - started)
+            print(f"Ingested {acquisition.blocks} blocks, {acquisition.samples} samples/channel "
+                  f"({rate:.0f} S/s per channel, buffer {acquisition.source.fill_level():.0%} full).")
+            last_report = now
+
 def main():
-    try:
-        with nidaqmx.Task() as task:
-            # Add four analog input voltage channels
-            task.ai_channels.add_ai_voltage_chan(
-                f"{DEVICE}/{CHANNELS}",
-                terminal_config=TerminalConfiguration.DIFF,
-                min_val=-10.0,
-                max_val=10.0)
-
-            # Configure sampling clock for continuous acquisition
-            task.timing.cfg_samp_clk_timing(
-                SAMPLING_RATE,
-                sample_mode=AcquisitionType.CONTINUOUS,
-                samps_per_chan=SAMPLING_RATE * 5)  # 5 second buffer
-
-            print(f"Starting data acquisition from {DEVICE}/{CHANNELS}...")
-            print("Press Ctrl+C to stop.")
-
-            conf = f'http::addr={QUESTDB_HOST}:9000;'
-            with Sender.from_conf(conf) as sender:
-                while True:
-                    try:
-                        # Read a single sample from each channel
-                        data = task.read()
-                        
-                        # Get current timestamp
-                        timestamp = datetime.datetime.now(datetime.timezone.utc)
-
-                        # Create a DataFrame
-                        df_data = []
-                        for i, voltage in enumerate(data):
-                            df_data.append({
-                                'timestamp': timestamp,
-                                'channel_id': f'ai{i}',
-                                'voltage': voltage
-                            })
-                        
-                        df = pd.DataFrame(df_data)
-
-                        # Ingest into QuestDB
-                        sender.dataframe(
-                            df,
-                            table_name=TABLE_NAME,
-                            symbols=['channel_id'],
-                            at='timestamp')
-                        
-                        print(f"Ingested {len(df)} rows into QuestDB.")
-                        
-                        # Wait for the next acquisition cycle
-                        time.sleep(1)
-
-                    except IngressError as e:
-                        print(f"QuestDB Ingress Error: {e}")
-                    except nidaqmx.errors.DaqError as e:
-                        print(f"NI DAQmx Error: {e}")
-                        # Stop and restart the task on buffer overflow or other errors
-                        task.stop()
-                        task.start()
+    parser = argparse.ArgumentParser(description="Continuous NI DAQ acquisition into QuestDB.")
+    parser.add_argument('--device', default=DEVICE)
+    parser.add_argument('--channels', default=CHANNELS, help="Physical channel range, e.g. ai0:3.")
+    parser.add_argument('--rate', type=float, default=SAMPLING_RATE, help="Sample clock rate in Hz.")
+    parser.add_argument('--block', type=int, default=None, help="Samples per channel per block (default: 0.1 s worth, at least 10).")
+    parser.add_argument('--duration', type=float, default=None, help="Stop after this many seconds.")
+    parser.add_argument('--synthetic', action='store_true', help="Use generated signals instead of the DAQ device.")
+    parser.add_argument('--conf', default=f'http::addr={QUESTDB_HOST}:9000;', help="QuestDB client configuration string.")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Serve Prometheus metrics on this port (e.g. 9464).")
+    args = parser.parse_args()
 
+    block_size = args.block or max(BLOCK_SIZE, int(args.rate / 10))
+    if args.synthetic:
+        source = SyntheticSource(args.channels, args.rate)
+    else:
+        source = NidaqmxSource(args.device, args.channels, args.rate)
+    acquisition = BlockAcquisition(source, block_size)
+    server = serve(args.metrics_port) if args.metrics_port is not None else None
+
+    try:
+        print(f"Starting data acquisition from {args.device}/{args.channels} at {args.rate} Hz, "
+              f"{block_size} samples per block...")
+        print("Press Ctrl+C to stop.")
+        with Sender.from_conf(args.conf) as sender:
+            run(acquisition, sender, args.duration)
 
     except KeyboardInterrupt:
         print("\nStopping data acquisition.")
-    except nidaqmx.errors.DaqError as e:
+    except source.errors as e:
         print(f"Fatal NI DAQmx Error: {e}")
     finally:
+        source.close()
+        if server:
+            server.stop()
         print("Script finished.")
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
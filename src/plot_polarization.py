@@ -1,10 +1,28 @@
+import argparse
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
 import glob
+from matplotlib.colors import LogNorm
 from matplotlib.ticker import MaxNLocator
+from downsample import minmax_indices
+from run_cache import load_run
+from steady_state import polarization_points
 
-def plot_polarization_curve(csv_files, active_area, output_file):
+# Above this many samples, plot_polarization_curve draws a density image
+# instead of one marker per sample.
+DENSITY_THRESHOLD = 100_000
+# Screen pixels per density bin.
+DENSITY_BIN_PIXELS = 3
+
+def axes_pixels(ax):
+    """Width and height of an axes in output pixels."""
+    bbox = ax.get_window_extent()
+    return max(int(bbox.width), 1), max(int(bbox.height), 1)
+
+def plot_polarization_curve(csv_files, active_area, output_file, steady_state=False, density=None,
+                            raise_errors=False):
     """
     Generates and saves a polarization curve plot from one or more CSV files.
 
@@ -12,18 +30,28 @@ def plot_polarization_curve(csv_files, active_area, output_file):
         csv_files (list of str): Paths to the input CSV files.
         active_area (float): Active area of the fuel cell in cm².
         output_file (str): Path to save the output plot image.
+        steady_state (bool): Plot one point per steady-state current plateau,
+            with standard-deviation error bars, against current density
+            instead of every raw sample.
+        density (bool, optional): Draw a 2D histogram of all samples, one
+            bin per few output pixels, instead of one marker per sample;
+            the rendering cost then depends on the image size, not the row
+            count. Defaults to True above DENSITY_THRESHOLD samples.
+        raise_errors (bool): Raise errors instead of printing them; a run
+            without valid data is still only reported.
     """
+    if steady_state:
+        plot_steady_state_curve(csv_files, active_area, output_file, raise_errors)
+        return
     try:
         all_data = []
         for csv_file in csv_files:
-            df = pd.read_csv(csv_file)
-            df.columns = df.columns.str.strip()
-            
-            # Convert columns to numeric, coercing errors to NaN
-            if 'FC_A (A)' in df.columns:
-                df['FC_A (A)'] = pd.to_numeric(df['FC_A (A)'], errors='coerce')
-            if 'FC_V (V)' in df.columns:
-                df['FC_V (V)'] = pd.to_numeric(df['FC_V (V)'], errors='coerce')
+            # Typed columns ('XX.X' already NaN) from the columnar cache
+            df = load_run(csv_file, columns=['FC_A (A)', 'FC_V (V)'])
+            missing = [column for column in ('FC_A (A)', 'FC_V (V)') if column not in df.columns]
+            if missing:
+                print(f"Skipping {csv_file}: no {', '.join(missing)} column.")
+                continue
             
             # Drop rows with NaNs in the plotting columns
             df.dropna(subset=['FC_A (A)', 'FC_V (V)'], inplace=True)
@@ -40,21 +68,34 @@ def plot_polarization_curve(csv_files, active_area, output_file):
             return
 
         combined_df = pd.concat(all_data, ignore_index=True)
+        if density is None:
+            density = len(combined_df) > DENSITY_THRESHOLD
 
         fig, ax = plt.subplots()
+        ax.set_ylim(40, 90)
 
-        # Sort sources to maintain consistent plot order
-        sources = sorted(combined_df['source'].unique())
-        for source in sources:
-            group = combined_df[combined_df['source'] == source]
-            ax.scatter(group['FC_A (A)'], group['FC_V (V)'], label=source)
+        if density:
+            width, height = axes_pixels(ax)
+            current = combined_df['FC_A (A)'].to_numpy()
+            voltage = combined_df['FC_V (V)'].to_numpy()
+            x_range = (min(current.min(), 0.0), max(current.max(), 1.0))
+            counts, x_edges, y_edges = np.histogram2d(
+                current, voltage,
+                bins=(width // DENSITY_BIN_PIXELS, height // DENSITY_BIN_PIXELS),
+                range=(x_range, (40, 90)))
+            mesh = ax.pcolormesh(x_edges, y_edges, np.ma.masked_equal(counts.T, 0), norm=LogNorm(), cmap='viridis')
+            fig.colorbar(mesh, ax=ax, label="Samples")
+            ax.set_title(f"Polarization Curve ({len(combined_df):,} samples, {len(all_data)} runs)")
+        else:
+            # One pass over the rows; groups come out sorted by source.
+            for source, group in combined_df.groupby('source', sort=True):
+                ax.scatter(group['FC_A (A)'], group['FC_V (V)'], label=source)
+            ax.set_title("Polarization Curve")
+            ax.legend()
 
         ax.set_xlabel("Current (A)")
         ax.set_ylabel("Voltage (V)")
-        ax.set_ylim(40, 90)
-        ax.set_title("Polarization Curve")
         ax.grid(True)
-        ax.legend()
         ax.xaxis.set_major_locator(MaxNLocator(integer=True, nbins=10))
 
         # Create output directory if it doesn't exist
@@ -64,35 +105,98 @@ def plot_polarization_curve(csv_files, active_area, output_file):
 
         # Save the plot
         plt.savefig(output_file)
+        plt.close(fig)
         print(f"Plot saved to {output_file}")
 
     except FileNotFoundError as e:
+        if raise_errors:
+            raise
         print(f"Error: The file {e.filename} was not found.")
     except KeyError as e:
+        if raise_errors:
+            raise
         print(f"Error: A required column was not found in the CSV file: {e}")
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"An error occurred: {e}")
 
-def plot_time_series(csv_file, output_file):
+def plot_steady_state_curve(csv_files, active_area, output_file, raise_errors=False):
+    """
+    Generates and saves a polarization curve from the steady-state plateaus
+    of one or more CSV files, see steady_state.polarization_points. Without
+    an active area, the points are plotted against current.
+    """
+    x, x_std = ('current_density', 'current_density_std') if active_area else ('current_mean', 'current_std')
+    try:
+        fig, ax = plt.subplots()
+        plotted = False
+        for csv_file in sorted(csv_files):
+            df = load_run(csv_file, columns=['Date-Time', 'FC_A (A)', 'FC_V (V)'])
+            missing = [column for column in ('FC_A (A)', 'FC_V (V)') if column not in df.columns]
+            if missing:
+                print(f"Skipping {csv_file}: no {', '.join(missing)} column.")
+                continue
+            points = polarization_points(df, active_area=active_area, min_voltage=40)
+            if points.empty:
+                print(f"No steady-state plateau found in {csv_file}.")
+                continue
+            print(f"{os.path.basename(csv_file)}: {len(points)} plateaus from {len(df)} samples")
+            # Plateaus come out in time order; the line follows the current.
+            points = points.sort_values(x)
+            ax.errorbar(points[x], points['voltage_mean'],
+                        xerr=points[x_std], yerr=points['voltage_std'],
+                        fmt='o-', capsize=3, label=os.path.basename(csv_file))
+            plotted = True
+
+        if not plotted:
+            print("No valid data found in any CSV file.")
+            plt.close(fig)
+            return
+
+        ax.set_xlabel("Current density (A/cm²)" if active_area else "Current (A)")
+        ax.set_ylabel("Voltage (V)")
+        ax.set_ylim(40, 90)
+        ax.set_title("Polarization Curve (steady state)")
+        ax.grid(True)
+        ax.legend()
+
+        output_dir = os.path.dirname(output_file)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        plt.savefig(output_file)
+        plt.close(fig)
+        print(f"Plot saved to {output_file}")
+
+    except FileNotFoundError as e:
+        if raise_errors:
+            raise
+        print(f"Error: The file {e.filename} was not found.")
+    except KeyError as e:
+        if raise_errors:
+            raise
+        print(f"Error: A required column was not found in the CSV file: {e}")
+    except Exception as e:
+        if raise_errors:
+            raise
+        print(f"An error occurred: {e}")
+
+def plot_time_series(csv_file, output_file, envelope=True, raise_errors=False):
     """
     Generates and saves a time series plot of Current and Voltage from a CSV file.
+
+    With `envelope`, each series is reduced to the minimum and maximum of
+    every pixel column before drawing (see downsample.minmax_indices), which
+    looks the same as plotting every sample but costs no more than the
+    image width.
     """
     try:
         print(f"Processing time series for {csv_file}...")
-        df = pd.read_csv(csv_file)
-        df.columns = df.columns.str.strip()
-        
-        # Parse Date-Time. Format example: 11/18/25-15:39:29
-        if 'Date-Time' in df.columns:
-            df['Date-Time'] = pd.to_datetime(df['Date-Time'], format='%m/%d/%y-%H:%M:%S', errors='coerce')
-        else:
+        # Date-Time parsed and numeric columns cleaned by the columnar cache
+        df = load_run(csv_file, columns=['Date-Time', 'FC_A (A)', 'FC_V (V)'])
+        if 'Date-Time' not in df.columns:
             print("Error: 'Date-Time' column not found.")
             return
-
-        # Clean numeric columns
-        for col in ['FC_A (A)', 'FC_V (V)']:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
         
         # Drop rows with NaNs in critical columns
         df.dropna(subset=['Date-Time', 'FC_A (A)', 'FC_V (V)'], inplace=True)
@@ -105,18 +209,27 @@ def plot_time_series(csv_file, output_file):
             return
 
         fig, ax1 = plt.subplots(figsize=(10, 6))
+        times = df['Date-Time'].to_numpy()
+        current = df['FC_A (A)'].to_numpy()
+        voltage = df['FC_V (V)'].to_numpy()
+        if envelope:
+            width, _ = axes_pixels(ax1)
+            current_picks = minmax_indices(current, width)
+            voltage_picks = minmax_indices(voltage, width)
+        else:
+            current_picks = voltage_picks = slice(None)
 
         color = 'tab:blue'
         ax1.set_xlabel('Time')
         ax1.set_ylabel('Current (A)', color=color)
-        ax1.plot(df['Date-Time'], df['FC_A (A)'], color=color, label='Current')
+        ax1.plot(times[current_picks], current[current_picks], color=color, label='Current')
         ax1.tick_params(axis='y', labelcolor=color)
 
         ax2 = ax1.twinx()  # instantiate a second axes that shares the same x-axis
 
         color = 'tab:red'
         ax2.set_ylabel('Voltage (V)', color=color)
-        ax2.plot(df['Date-Time'], df['FC_V (V)'], color=color, label='Voltage')
+        ax2.plot(times[voltage_picks], voltage[voltage_picks], color=color, label='Voltage')
         ax2.tick_params(axis='y', labelcolor=color)
 
         plt.title(f"Current and Voltage vs Time\n{os.path.basename(csv_file)}")
@@ -126,34 +239,39 @@ def plot_time_series(csv_file, output_file):
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
         
         plt.savefig(output_file)
+        plt.close(fig)
         print(f"Time series plot saved to {output_file}")
 
     except Exception as e:
+        if raise_errors:
+            raise
         print(f"An error occurred in plot_time_series: {e}")
 
-if __name__ == "__main__":
-    # --- Configuration ---
-    # Set to True to plot all CSV files in the 'data' directory,
-    # or False to plot only the files specified in the 'default_csv_files' list.
-    plot_all_files = False
-    # --- End Configuration ---
-
+def main():
     default_csv_files = [
-        'data\V2.5.6-3-2302-17-A-7.csv',
+        'data/V2.5.6-3-2302-17-A-7.csv',
         'data/V2.5.6-3-2303-18-A-2.csv',
         'data/V2.5.6-3-2302-17-A-8.csv',
         'data/V2.5.6-3-2302-17-A-9.csv'
     ]
 
-    if plot_all_files:
+    parser = argparse.ArgumentParser(description="Plot polarization curves from Spectronik run logs.")
+    parser.add_argument('--file', action='append', help="CSV file to plot; repeatable.")
+    parser.add_argument('--all', action='store_true', help="Plot every CSV file in data/.")
+    parser.add_argument('--area', type=float, default=1.0, help="Active area of the fuel cell in cm².")
+    parser.add_argument('--output', default='data/figures/polarization_curve.png')
+    parser.add_argument('--steady-state', action='store_true',
+                        help="One point per steady-state plateau, with error bars, against current density.")
+    parser.add_argument('--density', action=argparse.BooleanOptionalAction, default=None,
+                        help=f"Draw a density image instead of markers (default: above {DENSITY_THRESHOLD:,} samples).")
+    args = parser.parse_args()
+
+    if args.all:
         csv_files = glob.glob('data/*.csv')
     else:
-        csv_files = default_csv_files
+        csv_files = args.file or default_csv_files
 
-    active_area = 1
-    output_file = 'data/figures/polarization_curve.png'
-    
-    plot_polarization_curve(csv_files, active_area, output_file)
+    plot_polarization_curve(csv_files, args.area, args.output, steady_state=args.steady_state, density=args.density)
 
     # Plot time series for specific file
     time_series_file = 'data/V2.5.6-3-2302-17-A-8.csv'
@@ -161,4 +279,7 @@ if __name__ == "__main__":
     if os.path.exists(time_series_file):
         plot_time_series(time_series_file, time_series_output)
     else:
-        print(f"File for time series not found: {time_series_file}")
\ No newline at end of file
+        print(f"File for time series not found: {time_series_file}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+import argparse
+import csv
+import math
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from fuel_cell_controller import FuelCellController
+from load_controller import LoadController, LoadError
+from protium_parser import FIELDS
+
+SWEEP_PATH = 'data/sweeps/sweep.csv'
+LOAD_COLUMNS = ('load_voltage_mean', 'load_voltage_std', 'load_current_mean', 'load_current_std',
+                'load_power_mean', 'load_readings')
+RECORD_COLUMNS = (('step', 'setpoint_a', 'start', 'end', 'dwell_s', 'steady') + LOAD_COLUMNS
+                  + tuple(field.column for field in FIELDS) + ('fuel_cell_frames',))
+
+
+def parse_profile(text):
+    """
+    Parses a current profile in A: "start:stop:step" (stop included), e.g.
+    "0:12:1", or a comma-separated list, e.g. "0.5,1,2,4".
+    """
+    if ':' in text:
+        start, stop, step = (float(part) for part in text.split(':'))
+        count = int(math.floor((stop - start) / step + 1e-9)) + 1
+        return [round(start + i * step, 6) for i in range(count)]
+    return [float(part) for part in text.split(',') if part.strip()]
+
+
+def is_steady(times, values, window, tolerance, slope_tolerance, min_points=3):
+    """
+    Steady-state test over the last `window` seconds of a signal: the
+    standard deviation must be within `tolerance` and the least-squares
+    slope within `slope_tolerance` per second. False until the samples span
+    most of the window.
+    """
+    times = np.asarray(times, dtype=float)
+    values = np.asarray(values, dtype=float)
+    if len(times) < min_points or times[-1] - times[0] < 0.8 * window:
+        return False
+    recent = times >= times[-1] - window
+    t, v = times[recent], values[recent]
+    valid = ~np.isnan(v)
+    t, v = t[valid], v[valid]
+    if len(v) < min_points:
+        return False
+    slope = np.polyfit(t - t[0], v, 1)[0]
+    return bool(np.std(v) <= tolerance and abs(slope) <= slope_tolerance)
+
+
+class PolarizationSweep:
+    """
+    Steps the BK8500 through a CC current profile while the fuel cell's
+    telemetry streams in, and records one aligned row per step.
+
+    Each step lasts at least `min_dwell` seconds, then ends as soon as the
+    load voltage readings of the last `window` seconds are steady (see
+    is_steady) and so is the fuel cell's FC_V once it has three frames in
+    that window; `max_dwell` bounds a step that never settles. The row
+    averages the load readings and every fuel-cell field over that same
+    final window. A fuel cell voltage below `min_voltage` aborts the sweep.
+    """
+
+    def __init__(self, load, fuel_cell, profile, window=5.0, voltage_tolerance=0.05, slope_tolerance=0.01,
+                 min_dwell=2.0, max_dwell=120.0, check_interval=0.25, min_voltage=None):
+        self.load = load
+        self.fuel_cell = fuel_cell
+        self.profile = list(profile)
+        self.window = window
+        self.voltage_tolerance = voltage_tolerance
+        self.slope_tolerance = slope_tolerance
+        self.min_dwell = min_dwell
+        self.max_dwell = max_dwell
+        self.check_interval = check_interval
+        self.min_voltage = min_voltage
+        self.records = []
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Ends the sweep after the current check; the load is then switched off."""
+        self._stop.set()
+
+    def load_readings(self, since):
+        """Load samples recorded at or after `since`, as (times, voltages, currents, powers) arrays."""
+        recent = []
+        for sample in reversed(self.load.samples):
+            if sample["timestamp"] < since:
+                break
+            recent.append((sample["timestamp"], sample["voltage"], sample["current"], sample["power"]))
+        if not recent:
+            return (np.empty(0),) * 4
+        return tuple(np.array(column) for column in zip(*reversed(recent)))
+
+    def step_is_steady(self, step_start):
+        times, voltages, _, _ = self.load_readings(step_start)
+        if not is_steady(times, voltages, self.window, self.voltage_tolerance, self.slope_tolerance):
+            return False
+        frames = self.fuel_cell.telemetry.since(max(step_start, time.time() - self.window))
+        if len(frames) < 3:
+            return True
+        fc_v = frames[:, self.fuel_cell.telemetry.columns.index('FC_V')]
+        return is_steady(frames[:, 0], fc_v, self.window, 2 * self.voltage_tolerance, 2 * self.slope_tolerance)
+
+    def record(self, step, setpoint, start, end, steady):
+        """Builds the row of one step from the data of its final window."""
+        window_start = max(start, end - self.window)
+        times, voltages, currents, powers = self.load_readings(window_start)
+        row = {
+            "step": step,
+            "setpoint_a": setpoint,
+            "start": datetime.fromtimestamp(start).isoformat(timespec='milliseconds'),
+            "end": datetime.fromtimestamp(end).isoformat(timespec='milliseconds'),
+            "dwell_s": round(end - start, 3),
+            "steady": steady,
+            "load_readings": len(times),
+        }
+        for name, values in (('voltage', voltages), ('current', currents)):
+            row[f"load_{name}_mean"] = float(np.mean(values)) if len(values) else math.nan
+            row[f"load_{name}_std"] = float(np.std(values)) if len(values) else math.nan
+        row["load_power_mean"] = float(np.mean(powers)) if len(powers) else math.nan
+
+        telemetry = self.fuel_cell.telemetry
+        frames = telemetry.since(window_start)
+        frames = frames[frames[:, 0] <= end]
+        row["fuel_cell_frames"] = len(frames)
+        for field in FIELDS:
+            values = frames[:, telemetry.columns.index(field.key)]
+            values = values[~np.isnan(values)]
+            row[field.column] = float(values.mean()) if len(values) else math.nan
+        return row
+
+    def run(self, output=None):
+        """
+        Runs the sweep and returns its rows. With `output`, rows are also
+        appended to that CSV file as each step completes.
+        """
+        writer = None
+        f = None
+        if output:
+            directory = os.path.dirname(output)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            f = open(output, 'w', newline='')
+            writer = csv.DictWriter(f, fieldnames=RECORD_COLUMNS)
+            writer.writeheader()
+
+        load = self.load
+        self._stop.clear()
+        try:
+            load.remote_on()
+            load.set_mode('CC')
+            load.set_cc_current(self.profile[0] if self.profile else 0.0)
+            load.load_on()
+            load.start_polling()
+
+            for step, setpoint in enumerate(self.profile):
+                load.set_cc_current(setpoint)
+                start = time.time()
+                steady = False
+                while not self._stop.is_set():
+                    time.sleep(self.check_interval)
+                    elapsed = time.time() - start
+                    latest = self.fuel_cell.telemetry.latest().get('FC_V')
+                    if self.min_voltage is not None and latest is not None and latest < self.min_voltage:
+                        print(f"FC_V {latest:.2f} V below {self.min_voltage} V, aborting the sweep.")
+                        self._stop.set()
+                        break
+                    if elapsed >= self.min_dwell and self.step_is_steady(start):
+                        steady = True
+                        break
+                    if elapsed >= self.max_dwell:
+                        break
+                if self._stop.is_set():
+                    break
+
+                row = self.record(step, setpoint, start, time.time(), steady)
+                self.records.append(row)
+                if writer:
+                    writer.writerow(row)
+                    f.flush()
+                print(f"Step {step}: {setpoint:6.2f} A -> {row['load_voltage_mean']:7.3f} V "
+                      f"({'steady' if steady else 'timed out'} after {row['dwell_s']:.1f} s)")
+        finally:
+            load.stop_polling()
+            try:
+                load.set_cc_current(0.0)
+                load.load_off()
+                load.remote_off()
+            except LoadError as e:
+                print(f"Load error during shutdown: {e}")
+            if f:
+                f.close()
+        return self.records
+
+
+class StackModel:
+    """
+    Simulated fuel cell stack for sweeps without hardware: the voltage
+    relaxes towards a static polarization curve with time constant `tau`,
+    plus measurement noise.
+    """
+
+    def __init__(self, open_circuit=75.0, resistance=1.2, tafel=2.5, tau=2.0, noise=0.02, seed=0):
+        self.open_circuit = open_circuit
+        self.resistance = resistance
+        self.tafel = tafel
+        self.tau = tau
+        self.noise = noise
+        self.current = 0.0
+        self._voltage = open_circuit
+        self._updated = time.monotonic()
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+
+    def target(self, current):
+        return self.open_circuit - self.resistance * current - self.tafel * math.log1p(current)
+
+    def voltage(self, current=None):
+        """Terminal voltage now; `current` (A), when given, becomes the load current."""
+        with self._lock:
+            now = time.monotonic()
+            decay = math.exp(-(now - self._updated) / self.tau)
+            self._voltage = self.target(self.current) + (self._voltage - self.target(self.current)) * decay
+            self._updated = now
+            if current is not None:
+                self.current = current
+            return self._voltage + self._rng.normal(0.0, self.noise)
+
+    def frame(self):
+        voltage = self.voltage()
+        return {'FC_V': voltage, 'FC_A': self.current, 'FC_W': voltage * self.current,
+                'FCT1': 45.0, 'FCT2': 44.0, 'H2P1': 0.55, 'H2P2': 0.54, 'FAN': 30.0, 'BLW': 25.0}
+
+
+def run_simulated(profile, rate=2.0, output=None, **kwargs):
+    """Runs a sweep end to end against an emulated BK8500 and an emulated Protium-2500 on pseudo-terminals."""
+    from bk8500_emulator import BK8500Emulator
+    from protium_emulator import ProtiumEmulator
+
+    model = StackModel()
+    with BK8500Emulator(source=model.voltage) as emulator, \
+            ProtiumEmulator(rate, source=model.frame, running=True) as stack:
+        fuel_cell = FuelCellController(stack.port)
+        fuel_cell.connect()
+        load = LoadController(emulator.port)
+        load.connect()
+        try:
+            sweep = PolarizationSweep(load, fuel_cell, profile, **kwargs)
+            return sweep.run(output)
+        finally:
+            load.disconnect()
+            fuel_cell.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a polarization sweep with the BK8500 load and the Protium-2500.")
+    parser.add_argument('--load-port', help="Serial port of the BK8500, e.g. COM9.")
+    parser.add_argument('--fc-port', help="Serial port of the fuel cell, e.g. COM7.")
+    parser.add_argument('--profile', default='0:12:1', help='Currents in A: "start:stop:step" or "a,b,c".')
+    parser.add_argument('--window', type=float, default=5.0, help="Seconds the voltage must be steady.")
+    parser.add_argument('--tolerance', type=float, default=0.05, help="Maximum voltage standard deviation in V.")
+    parser.add_argument('--slope', type=float, default=0.01, help="Maximum voltage drift in V/s.")
+    parser.add_argument('--min-dwell', type=float, default=2.0)
+    parser.add_argument('--max-dwell', type=float, default=120.0)
+    parser.add_argument('--min-voltage', type=float, default=40.0, help="Abort below this FC_V.")
+    parser.add_argument('--output', default=SWEEP_PATH)
+    parser.add_argument('--simulate', action='store_true', help="Run against an emulated load and an emulated stack.")
+    args = parser.parse_args()
+
+    profile = parse_profile(args.profile)
+    options = dict(window=args.window, voltage_tolerance=args.tolerance, slope_tolerance=args.slope,
+                   min_dwell=args.min_dwell, max_dwell=args.max_dwell, min_voltage=args.min_voltage)
+    start = time.perf_counter()
+    if args.simulate:
+        records = run_simulated(profile, output=args.output, **options)
+    else:
+        if not (args.load_port and args.fc_port):
+            parser.error("--load-port and --fc-port are required unless --simulate is given")
+        fuel_cell = FuelCellController(args.fc_port)
+        fuel_cell.connect()
+        load = LoadController(args.load_port)
+        load.connect()
+        try:
+            records = PolarizationSweep(load, fuel_cell, profile, **options).run(args.output)
+        except KeyboardInterrupt:
+            print("\nSweep interrupted.")
+            records = []
+        finally:
+            load.disconnect()
+            fuel_cell.disconnect()
+    elapsed = time.perf_counter() - start
+    print(f"{len(records)} steps in {elapsed:.1f} s (a fixed {args.max_dwell:.0f} s dwell would take "
+          f"{len(profile) * args.max_dwell:.0f} s) -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
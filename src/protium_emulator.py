@@ -0,0 +1,360 @@
+import argparse
+import math
+import random
+import threading
+import time
+from queue import Empty
+
+from fuel_cell_controller import FuelCellController
+from protium_parser import FIELDS, format_frame
+from pty_link import PtyLink
+
+BITS_PER_BYTE = 10  # 8N1: start bit, 8 data bits, stop bit.
+CORRUPTIONS = ('flip', 'truncate', 'drop', 'garbage')
+FIRMWARE_VERSION = 'V2.5_03032022_0642_2203-05-A'
+
+# Text the firmware prints, from docs/PROTIUM-2500 UART Data Format.pdf.
+POWER_UP = ('Spectronik Protium 2500', 'Type help<enter> for list of commands',
+            'Total Mileage: {mileage:.2f} kWh', 'Total Runtime: {runtime} hrs', 'Ready to start.')
+STARTUP = ('P2500 2203-05 initialising', f'Firmware version : {FIRMWARE_VERSION}', 'No. of cells : 80',
+           'Entering to Starting phase...', 'Anode Supply Pressure OK', 'Temperature Check OK')
+SHUTDOWN = ('Shutdown initiated', 'This Mileage: {this_mileage:.1f} Wh', 'This Runtime: {this_runtime} hrs',
+            'Total Mileage: {mileage:.2f} kWh', 'Total Runtime: {runtime} hrs', 'System Off')
+
+# Fan and blower steps: command -> (field, change in %).
+STEPS = {'9': ('FAN', -1), '0': ('FAN', 1), '-': ('FAN', -5), '=': ('FAN', 5),
+         '[': ('BLW', -3), ']': ('BLW', 3)}
+
+
+def hours_minutes(seconds):
+    minutes = int(seconds // 60)
+    return f"{minutes // 60:04d}:{minutes % 60:02d}"
+
+
+def idle_source():
+    """Values of a stack running at no load."""
+    return {'FC_V': 76.5, 'FC_A': 0.0, 'FC_W': 0.0, 'FCT1': 30.0, 'FCT2': 29.5, 'H2P1': 0.55, 'H2P2': 0.54,
+            'FAN': 20.0, 'BLW': 15.0, 'Tank-P': 117.0, 'Tank-T': 24.0, 'BattV': 29.8}
+
+
+def replay_source(csv_file, loop=True):
+    """
+    Source that plays back a Spectronik CSV log, one row per frame.
+
+    Columns the log does not have, and its "XX.X" cells, are printed as
+    "XX.X". Without `loop`, the last row repeats once the log is exhausted.
+    """
+    from run_cache import load_run
+
+    df = load_run(csv_file, columns=[field.column for field in FIELDS])
+    columns = [(field.key, df[field.column].to_numpy(dtype=float)) for field in FIELDS if field.column in df]
+    rows = len(df)
+    if not rows:
+        raise ValueError(f"{csv_file} has no rows to replay")
+    position = 0
+
+    def source():
+        nonlocal position
+        index = position % rows if loop else min(position, rows - 1)
+        position += 1
+        return {key: values[index] for key, values in columns}
+
+    return source
+
+
+class ProtiumEmulator:
+    """
+    Protium-2500 on the device side of a pseudo-terminal.
+
+    The unit powers up with its banner and waits in the Starting phase.
+    `start` runs the start-up sequence and enters the Running phase, in
+    which a frame is printed every 1/`rate` seconds and `end` shuts the
+    stack down again. Commands outside their phase, or unknown ones, are
+    answered "Command not found.", as the firmware does. `f` and `b` reply
+    "Fan PWM auto" and "Blower auto"; the fan and blower steps are silent
+    and show in the FAN and BLW fields of the following frames.
+
+    Frame values come from `source()`, a callable returning a dict of
+    field key to value (see idle_source and replay_source). For load
+    testing, `burst` frames are written back to back every burst/`rate`
+    seconds, a fraction `corruption` of the frames is damaged (see
+    CORRUPTIONS), and `running` skips the start-up so frames flow at once.
+    With a `baudrate`, writes take their wire time; 0 writes as fast as the
+    pseudo-terminal accepts.
+    """
+
+    def __init__(self, rate=1.0, burst=1, corruption=0.0, source=None, running=False, baudrate=0, seed=0):
+        self.link = PtyLink()
+        self.port = self.link.port
+        self.rate = rate
+        self.burst = burst
+        self.corruption = corruption
+        self.source = source or idle_source
+        self.baudrate = baudrate
+        self.phase = 'running' if running else 'starting'
+        self.fan = None  # Manual fan and blower settings; None is auto.
+        self.blower = None
+        self.frames_sent = 0
+        self.frames_corrupted = 0
+        self.commands = []
+        self.mileage = 1.57  # kWh
+        self.runtime = 100 * 60.0  # s
+        self._run_start = time.monotonic()
+        self._energy = 0.0  # Wh this run
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._running = False
+        self._threads = []
+
+    def start(self):
+        if self.phase == 'starting':
+            self.print_lines(POWER_UP, **self._totals())
+        self._running = True
+        self._threads = [threading.Thread(target=self._command_loop, daemon=True),
+                         threading.Thread(target=self._frame_loop, daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, close=True):
+        """Stops sending frames and answering commands; close=False keeps the pty open."""
+        self._running = False
+        for thread in self._threads:
+            thread.join(timeout=1)
+        if close:
+            self.link.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def write(self, data):
+        with self._lock:
+            if self.baudrate:
+                time.sleep(len(data) * BITS_PER_BYTE / self.baudrate)
+            self.link.write(data)
+
+    def print_lines(self, lines, **values):
+        self.write(''.join(line.format(**values) + '\r\n' for line in lines).encode('ascii'))
+
+    def frame(self):
+        """The next frame's values, with the manual fan and blower settings applied."""
+        values = dict(self.source())
+        if self.fan is not None:
+            values['FAN'] = self.fan
+        if self.blower is not None:
+            values['BLW'] = self.blower
+        power = values.get('FC_W')
+        if power is not None and not math.isnan(power):
+            self._energy += power / self.rate / 3600
+        return values
+
+    def corrupt(self, data):
+        """Damages one encoded frame the way a noisy or overrun line would."""
+        kind = self._rng.choice(CORRUPTIONS)
+        position = self._rng.randrange(1, len(data))
+        if kind == 'flip':
+            return data[:position] + bytes([data[position] ^ 1 << self._rng.randrange(8)]) + data[position + 1:]
+        if kind == 'truncate':
+            return data[:position]
+        if kind == 'drop':
+            return data[:position] + data[position + self._rng.randrange(1, 32):]
+        return data[:position] + bytes(self._rng.randrange(256) for _ in range(16)) + data[position:]
+
+    def handle(self, command):
+        """Applies one command (without its \\r) and prints the firmware's reply, if any."""
+        self.commands.append(command)
+        if self.phase == 'starting' and command == 'start':
+            self.print_lines(STARTUP)
+            self._run_start = time.monotonic()
+            self._energy = 0.0
+            self.phase = 'running'
+        elif self.phase == 'starting' and command == 'ver':
+            self.print_lines((f'Firmware version : {FIRMWARE_VERSION}',))
+        elif self.phase == 'running' and command == 'end':
+            self.phase = 'starting'
+            this_runtime = time.monotonic() - self._run_start
+            self.runtime += this_runtime
+            self.mileage += self._energy / 1000
+            self.print_lines(SHUTDOWN, this_mileage=self._energy, this_runtime=hours_minutes(this_runtime),
+                             **self._totals())
+        elif self.phase == 'running' and command == 'f':
+            self.fan = None
+            self.print_lines(('Fan PWM auto',))
+        elif self.phase == 'running' and command == 'b':
+            self.blower = None
+            self.print_lines(('Blower auto',))
+        elif self.phase == 'running' and command == 'p':
+            pass
+        elif self.phase == 'running' and command in STEPS:
+            key, change = STEPS[command]
+            attribute = 'fan' if key == 'FAN' else 'blower'
+            current = getattr(self, attribute)
+            if current is None:
+                current = self.source().get(key, 0.0)
+            setattr(self, attribute, min(max(current + change, 0.0), 100.0))
+        else:
+            self.print_lines(('Command not found.',))
+
+    def _totals(self):
+        return {'mileage': self.mileage, 'runtime': hours_minutes(self.runtime)}
+
+    def _command_loop(self):
+        buffer = b''
+        while self._running:
+            data = self.link.read(4096, timeout=0.05)
+            if not data:
+                continue
+            buffer += data
+            *commands, buffer = buffer.split(b'\r')
+            for command in commands:
+                self.handle(command.strip().decode('ascii', errors='replace'))
+
+    def _frame_loop(self):
+        interval = self.burst / self.rate
+        next_burst = time.monotonic()
+        while self._running:
+            delay = next_burst - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            # When writes fall behind, the schedule slips instead of catching up in a rush.
+            next_burst = max(next_burst + interval, time.monotonic())
+            if self.phase != 'running':
+                continue
+            data = bytearray()
+            for _ in range(self.burst):
+                frame = (format_frame(self.frame()) + '\r\n').encode('ascii')
+                if self.corruption and self._rng.random() < self.corruption:
+                    frame = self.corrupt(frame)
+                    self.frames_corrupted += 1
+                data += frame
+                self.frames_sent += 1
+            try:
+                self.write(bytes(data))
+            except OSError:
+                return
+
+
+def soak(rate, duration, burst=1, corruption=0.0, read_mode='event'):
+    """
+    Streams frames at `rate` frames/s into a FuelCellController for
+    `duration` seconds and reports how many arrived and how late.
+
+    The frame sequence number travels in the Energy field, so each frame's
+    delay is measured from the moment it was generated.
+
+    Returns:
+        dict: sent, received, corrupted, unparsed text items, queue drops, the
+        achieved send and receive rates, and delay percentiles in ms.
+    """
+    sent_at = {}
+    delays = []
+    unparsed = 0
+    sequence = 0
+
+    def source():
+        nonlocal sequence
+        sent_at[sequence] = time.perf_counter()
+        values = dict(idle_source(), Energy=float(sequence))
+        sequence += 1
+        return values
+
+    def on_item(item):
+        nonlocal unparsed
+        if "raw" in item:
+            unparsed += 1
+            return
+        energy = item.get('Energy')
+        if energy is not None:
+            sent = sent_at.get(int(energy))
+            if sent is not None:
+                delays.append(time.perf_counter() - sent)
+
+    def consume():
+        # A consumer on its own thread, fed through the controller's queue.
+        while consuming.is_set():
+            try:
+                queue.get(timeout=0.05)
+            except Empty:
+                pass
+
+    emulator = ProtiumEmulator(rate, burst, corruption, source=source, running=True)
+    controller = FuelCellController(emulator.port, read_mode=read_mode)
+    controller.connect()
+    controller.add_listener(on_item)
+    queue = controller.open_queue()
+    consuming = threading.Event()
+    consuming.set()
+    consumer = threading.Thread(target=consume, daemon=True)
+    consumer.start()
+    emulator.start()
+    time.sleep(duration)
+    emulator.stop(close=False)
+    time.sleep(0.2)  # Let the reader drain what is already in the pty.
+    # Stop the reader before the pty goes away, so it does not see the hangup.
+    controller.stop_reading()
+    emulator.link.close()
+    controller.disconnect()
+    consuming.clear()
+    consumer.join()
+
+    received = len(delays)
+    delays.sort()
+
+    def percentile(p):
+        return 1000 * delays[min(int(p / 100 * received), received - 1)] if received else math.nan
+
+    return {
+        "rate": rate,
+        "sent": emulator.frames_sent,
+        "received": received,
+        "corrupted": emulator.frames_corrupted,
+        "unparsed": unparsed,
+        "queue_dropped": controller.queue_dropped,
+        "send_rate": emulator.frames_sent / duration,
+        "receive_rate": received / duration,
+        "p50_ms": percentile(50),
+        "p99_ms": percentile(99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emulate a Protium-2500 on a pseudo-terminal.")
+    parser.add_argument('--rate', type=float, default=1.0, help="Frames per second (the unit prints 1).")
+    parser.add_argument('--burst', type=int, default=1, help="Frames written back to back per write.")
+    parser.add_argument('--corruption', type=float, default=0.0, help="Fraction of frames to damage.")
+    parser.add_argument('--replay', help="Spectronik CSV log to play back, e.g. data/V2.5.6-3-2302-17-A-8.csv.")
+    parser.add_argument('--running', action='store_true', help="Skip the start-up; stream frames at once.")
+    parser.add_argument('--baudrate', type=int, default=0, help="Emulated line rate; 0 for no wire delay.")
+    parser.add_argument('--soak', nargs='*', type=float, metavar='RATE',
+                        help="Soak-test FuelCellController at these rates (default 1 to 2000 frames/s).")
+    parser.add_argument('--duration', type=float, default=5.0, help="Seconds per soak rate.")
+    args = parser.parse_args()
+
+    if args.soak is not None:
+        rates = args.soak or [1, 10, 50, 100, 200, 500, 1000, 2000]
+        print(f"{'target/s':>9} {'sent/s':>9} {'recv/s':>9} {'lost':>6} {'corrupt':>7} {'unparsed':>8} {'dropped':>7} "
+              f"{'p50 ms':>8} {'p99 ms':>8}")
+        for rate in rates:
+            result = soak(rate, args.duration, args.burst, args.corruption)
+            lost = result["sent"] - result["received"]
+            print(f"{rate:9.0f} {result['send_rate']:9.1f} {result['receive_rate']:9.1f} {lost:6d} "
+                  f"{result['corrupted']:7d} {result['unparsed']:8d} {result['queue_dropped']:7d} {result['p50_ms']:8.2f} "
+                  f"{result['p99_ms']:8.2f}")
+        return
+
+    source = replay_source(args.replay) if args.replay else None
+    with ProtiumEmulator(args.rate, args.burst, args.corruption, source, args.running, args.baudrate) as emulator:
+        print(f"Protium-2500 emulator on {emulator.port} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            print(f"\n{emulator.frames_sent} frames ({emulator.frames_corrupted} corrupted), "
+                  f"{len(emulator.commands)} commands.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+import re
+from array import array
+from collections import namedtuple
+
+# Field schema of the running-phase message, in the order the Protium-2500
+# prints it (see docs/PROTIUM-2500 UART Data Format.pdf). `column` is the
+# matching header in the Spectronik DAQ CSV logs, `decimals` the precision the
+# firmware uses when printing the value.
+Field = namedtuple('Field', ['key', 'unit', 'column', 'decimals'])
+
+FIELDS = (
+    Field('FC_V', 'V', 'FC_V (V)', 2),
+    Field('FCT1', 'C', 'FCT1 (C)', 2),
+    Field('H2P1', 'B', 'H2P1 (B)', 2),
+    Field('DCDCV', 'V', 'DCDCV', 1),
+    Field('FC_A', 'A', 'FC_A (A)', 2),
+    Field('FCT2', 'C', 'FCT2 (C)', 2),
+    Field('H2P2', 'B', 'H2P2 (B)', 2),
+    Field('DCDCA', 'A', 'DCDCA', 1),
+    Field('FC_W', 'W', 'FC_W (W)', 1),
+    Field('FAN', '%', 'FAN (%)', 0),
+    Field('Tank-P', 'B', 'Tank-P (B)', 1),
+    Field('DCDCW', 'W', 'DCDCW', 1),
+    Field('Energy', 'Wh', 'ENERGY (Wh)', 0),
+    Field('BLW', '%', 'BLW (%)', 0),
+    Field('Tank-T', 'C', 'Tank-T (C)', 2),
+    Field('BattV', 'V', 'BattV (V)', 2),
+)
+
+FIELD_NAMES = tuple(field.key for field in FIELDS)
+
+_NUMBER = rb'([-+]?\d+(?:\.\d*)?)'
+
+# The whole running-phase message compiled from the schema: one group per
+# field, in order. Values the firmware does not report (e.g. the DC/DC
+# readings printed as "XX.X") leave their group empty. Each field can match
+# in only one way (the whole number, or no number at all), so a corrupted
+# message fails in linear time instead of backtracking through every split.
+_FRAME_RE = re.compile(b''.join(
+    rb'\s*' + re.escape(field.key.encode('ascii')) + rb' *: *(?:' + _NUMBER + rb'(?![\d.])|(?![-+]?\d| ))[^|]*\|'
+    for field in FIELDS))
+
+# Fallback for messages that do not follow the schema layout: any
+# "KEY : value unit" pair, as in FuelCellController.parse_data.
+_FIELD_RE = re.compile(rb'([A-Za-z][\w-]*)\s*:\s*' + _NUMBER + rb'[ \t]*([^\s|!]*)')
+
+_SCHEMA = {field.key.encode('ascii'): i for i, field in enumerate(FIELDS)}
+_INDEX = {key: i for i, key in enumerate(FIELD_NAMES)}
+_NAN = float('nan')
+_EMPTY = array('d', [_NAN]) * len(FIELDS)
+
+
+class TelemetryRecord:
+    """
+    One running-phase message, stored against the fixed FIELDS schema.
+
+    The values sit in a single array('d') in FIELDS order, NaN where the
+    firmware printed "XX.X"; units are not repeated per frame but looked up
+    in the schema. A buffered frame takes about 260 bytes, against some
+    3.2 kB for the nested {"FC_V": {"value": ..., "unit": ...}} dicts.
+
+    Reads like a read-only mapping of the reported fields: record['FC_V']
+    is a float, 'FC_V' in record is False for an unreported field, and
+    keys()/items() skip them. as_dict() returns the nested legacy shape.
+    `timestamp` (seconds since the epoch) is set by the reader on arrival.
+    """
+
+    __slots__ = ('values', 'timestamp')
+
+    units = {field.key: field.unit for field in FIELDS}
+
+    def __init__(self, values=None, timestamp=None):
+        self.values = array('d', _EMPTY) if values is None else values
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_values(cls, values, timestamp=None):
+        """Builds a record from {key: value}; keys outside the schema are ignored."""
+        record = cls(timestamp=timestamp)
+        for key, value in values.items():
+            i = _INDEX.get(key)
+            if i is not None and value is not None:
+                record.values[i] = value
+        return record
+
+    def __getitem__(self, key):
+        value = self.values[_INDEX[key]]
+        if value != value:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        i = _INDEX.get(key)
+        if i is None:
+            return default
+        value = self.values[i]
+        return default if value != value else value
+
+    def __contains__(self, key):
+        i = _INDEX.get(key)
+        return i is not None and self.values[i] == self.values[i]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def keys(self):
+        return [key for key, value in zip(FIELD_NAMES, self.values) if value == value]
+
+    def items(self):
+        return [(key, value) for key, value in zip(FIELD_NAMES, self.values) if value == value]
+
+    def as_dict(self):
+        """The {"FC_V": {"value": 71.2, "unit": "V"}, ...} shape of FuelCellController.parse_data."""
+        return {key: {"value": value, "unit": self.units[key]} for key, value in self.items()}
+
+    def __repr__(self):
+        return f"TelemetryRecord({dict(self.items())!r})"
+
+
+def format_frame(values):
+    """
+    Formats one running-phase message the way the Protium-2500 prints it.
+
+    Args:
+        values (dict): Field key to value. Missing or NaN values are printed
+            as the firmware's "XX.X" placeholder.
+
+    Returns:
+        str: The message, from the leading '|' to the terminating '!'.
+    """
+    cells = []
+    for field in FIELDS:
+        value = values.get(field.key)
+        if value is None or value != value:
+            text = 'XX.X'
+        else:
+            text = f"{value:.{field.decimals}f}"
+        cells.append(f"{field.key:<6}: {text:>6} {field.unit:<2}")
+
+    lines = []
+    for row in range(4):
+        lines.append(' |   '.join(cells[row * 4:row * 4 + 4]) + ' |')
+    return '|' + '\r\n'.join(lines) + '\r\n|' + ' ' * 20 + '|' + ' ' * 19 + '|' + ' ' * 19 + '!'
+
+
+class ProtiumFrameParser:
+    """
+    Incremental parser for the Protium-2500 UART output.
+
+    Bytes are fed as they come off the serial port. Each byte is scanned once
+    for frame boundaries: a partial frame stays in the buffer and the search
+    for its terminating '!' resumes where the previous call stopped. Complete
+    frames are decoded against the precompiled field schema, and text outside
+    of frames ("Fan PWM auto", "Command not found.", ...) is reported line by
+    line.
+
+    Frames come out as TelemetryRecord; text as {"raw": line} or
+    {"error": "Command not found"}, as returned by
+    FuelCellController.parse_data.
+    """
+
+    def __init__(self, max_frame_size=4096):
+        self.max_frame_size = max_frame_size
+        # Messages that started with '|' but could not be decoded: no
+        # terminator within max_frame_size, or no field in them.
+        self.failed_frames = 0
+        self._buffer = bytearray()
+        self._scan = 0
+        self._in_frame = False
+
+    def reset(self):
+        self._buffer.clear()
+        self._scan = 0
+        self._in_frame = False
+
+    def feed(self, data):
+        """
+        Consumes a chunk of bytes and returns the items it completed.
+
+        Args:
+            data (bytes): Bytes read from the serial port.
+
+        Returns:
+            list: TelemetryRecord frames, error and raw text dicts.
+        """
+        buf = self._buffer
+        buf += data
+        items = []
+        pos = 0
+        scan = self._scan
+
+        while True:
+            if self._in_frame:
+                end = buf.find(b'!', scan)
+                if end == -1:
+                    if len(buf) - pos > self.max_frame_size:
+                        # No terminator in sight, most likely corrupted; resync.
+                        self.failed_frames += 1
+                        self._text(buf, pos, len(buf), items)
+                        pos = len(buf)
+                        self._in_frame = False
+                    scan = len(buf)
+                    break
+                item = self._frame(buf, pos, end)
+                if type(item) is dict:
+                    self.failed_frames += 1
+                items.append(item)
+                pos = scan = end + 1
+                self._in_frame = False
+            else:
+                start = buf.find(b'|', scan)
+                if start == -1:
+                    line_end = buf.rfind(b'\n', pos)
+                    if line_end != -1:
+                        self._text(buf, pos, line_end + 1, items)
+                        pos = line_end + 1
+                    scan = len(buf)
+                    break
+                self._text(buf, pos, start, items)
+                pos = start
+                scan = start + 1
+                self._in_frame = True
+
+        if pos:
+            del buf[:pos]
+        self._scan = scan - pos
+        return items
+
+    def flush(self):
+        """Returns whatever is left in the buffer as raw text and resets."""
+        items = []
+        self._text(self._buffer, 0, len(self._buffer), items)
+        self.reset()
+        return items
+
+    @staticmethod
+    def _frame(buf, start, end):
+        match = _FRAME_RE.match(buf, start + 1, end)
+        if match is not None:
+            return TelemetryRecord(array('d', [_NAN if value is None else float(value) for value in match.groups()]))
+
+        # Keys outside the schema have no slot in the record and are dropped.
+        values = None
+        for match in _FIELD_RE.finditer(buf, start, end):
+            raw_key, raw_value, _ = match.groups()
+            i = _SCHEMA.get(raw_key)
+            if i is not None:
+                if values is None:
+                    values = array('d', _EMPTY)
+                values[i] = float(raw_value)
+        if values is not None:
+            return TelemetryRecord(values)
+        return {"raw": buf[start:end + 1].decode('ascii', errors='replace').strip()}
+
+    @staticmethod
+    def _text(buf, start, end, items):
+        if start >= end:
+            return
+        for line in buf[start:end].decode('ascii', errors='replace').splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            if "Command not found" in line:
+                items.append({"error": "Command not found"})
+            else:
+                items.append({"raw": line})
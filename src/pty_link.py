@@ -0,0 +1,48 @@
+import os
+import pty
+import select
+import tty
+
+
+class PtyLink:
+    """
+    Pseudo-terminal pair standing in for a serial cable (POSIX only).
+
+    The device side (an emulator, a benchmark writer) uses the master file
+    descriptor; the code under test opens `port` with pyserial exactly as it
+    would open COM7 or /dev/ttyUSB0.
+    """
+
+    def __init__(self):
+        self.master_fd, self.slave_fd = pty.openpty()
+        tty.setraw(self.slave_fd)
+        self.port = os.ttyname(self.slave_fd)
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            written = os.write(self.master_fd, view)
+            view = view[written:]
+
+    def read(self, size=4096, timeout=None):
+        """Returns up to `size` bytes, or b'' if nothing arrived within `timeout`."""
+        ready, _, _ = select.select([self.master_fd], [], [], timeout)
+        if not ready:
+            return b''
+        try:
+            return os.read(self.master_fd, size)
+        except OSError:
+            return b''
+
+    def close(self):
+        for fd in (self.master_fd, self.slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
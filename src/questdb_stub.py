@@ -0,0 +1,269 @@
+import json
+import re
+import socket
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# The subset of QuestDB SQL answered on /exec: the SAMPLE BY queries built by
+# history.py, and plain selects of stored columns.
+_SELECT_RE = re.compile(
+    r"SELECT (?P<select>.+?) FROM (?P<table>\w+)(?: WHERE (?P<where>.+?))?"
+    r"(?: SAMPLE BY (?P<every>\d+)(?P<unit>[UTsmhd]))?(?: ALIGN TO CALENDAR)?;?$", re.I | re.S)
+_AGGREGATE_RE = re.compile(r"(?P<fn>avg|min|max|sum|count|first|last)\((?P<column>\w+)\)(?: (?:AS )?(?P<alias>\w+))?$", re.I)
+_CONDITION_RE = re.compile(r"(?P<column>\w+) (?P<op>>=|<|=|IN) (?P<value>'[^']*'|\(.*\))$", re.I)
+_UNIT_NS = {'U': 1_000, 'T': 1_000_000, 's': 10 ** 9, 'm': 60 * 10 ** 9, 'h': 3600 * 10 ** 9, 'd': 86400 * 10 ** 9}
+_AGGREGATES = {
+    'avg': lambda values: sum(values) / len(values),
+    'min': min,
+    'max': max,
+    'sum': sum,
+    'count': len,
+    'first': lambda values: values[0],
+    'last': lambda values: values[-1],
+}
+
+
+def parse_ilp_line(line):
+    """
+    Parses one InfluxDB line protocol (text) row written by the QuestDB
+    client into (table, {column: value}, timestamp_ns).
+    """
+    head, fields, timestamp = line.rsplit(' ', 2)
+    table, *symbols = head.split(',')
+    row = {}
+    for symbol in symbols:
+        key, value = symbol.split('=', 1)
+        row[key] = value
+    for field in fields.split(','):
+        key, value = field.split('=', 1)
+        if value.endswith('i'):
+            row[key] = int(value[:-1])
+        elif value in ('t', 'f'):
+            row[key] = value == 't'
+        elif value.startswith('"'):
+            row[key] = value[1:-1]
+        else:
+            row[key] = float(value)
+    return table, row, int(timestamp)
+
+
+def _format_ts(ts_ns):
+    seconds, ns = divmod(ts_ns, 10 ** 9)
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S') + f".{ns // 1000:06d}Z"
+
+
+def _parse_ts(text):
+    moment = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp()) * 10 ** 9 + moment.microsecond * 1000
+
+
+def _filter(rows, condition):
+    match = _CONDITION_RE.match(condition.strip())
+    if match is None:
+        raise ValueError(f"unsupported condition: {condition}")
+    column, op, value = match['column'], match['op'].upper(), match['value']
+    if column == 'timestamp':
+        bound = _parse_ts(value.strip("'"))
+        if op == '>=':
+            return [(row, ts) for row, ts in rows if ts >= bound]
+        if op == '<':
+            return [(row, ts) for row, ts in rows if ts < bound]
+        raise ValueError(f"unsupported timestamp condition: {condition}")
+    if op == '=':
+        allowed = {value.strip("'")}
+    elif op == 'IN':
+        allowed = set(re.findall(r"'([^']*)'", value))
+    else:
+        raise ValueError(f"unsupported condition: {condition}")
+    return [(row, ts) for row, ts in rows if row.get(column) in allowed]
+
+
+class QuestDBStub:
+    """
+    In-process stand-in for the QuestDB HTTP endpoint.
+
+    Accepts ILP writes on /write (text protocol version 1) and keeps the rows
+    in memory. `available` can be switched off to answer writes with 503, and
+    stop()/start() on the same port simulate the server being unreachable.
+
+    /exec answers the SAMPLE BY queries of history.py (aggregates of stored
+    columns, timestamp range and symbol filters, grouped by the selected
+    symbols) in the JSON layout of QuestDB; the queries are kept in
+    `queries`.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self.available = True
+        self.requests = 0
+        self.queries = []
+        self._rows = []
+        self._lock = threading.Lock()
+        self._connections = set()
+        self._server = None
+        self._thread = None
+
+    @property
+    def conf(self):
+        """Client configuration string for Sender.from_conf."""
+        return f"http::addr={self.host}:{self.port};retry_timeout=0;"
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Keep-alive, as QuestDB: the client reuses its connection across flushes.
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub._connections.add(self.connection)
+
+            def finish(self):
+                super().finish()
+                with stub._lock:
+                    stub._connections.discard(self.connection)
+
+            def do_GET(self):
+                stub._handle_get(self)
+
+            def do_POST(self):
+                stub._handle_post(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_port
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        # Drop kept-alive connections too, so the endpoint is really gone.
+        with self._lock:
+            connections, self._connections = self._connections, set()
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def rows(self, table=None):
+        """Returns the rows received so far as (table, {column: value}, timestamp_ns)."""
+        with self._lock:
+            return [row for row in self._rows if table is None or row[0] == table]
+
+    def _handle_get(self, request):
+        url = urlparse(request.path)
+        if url.path == '/exec':
+            query = parse_qs(url.query).get('query', [''])[0]
+            self.requests += 1
+            try:
+                self._send_json(request, 200, self.execute(query))
+            except ValueError as e:
+                self._send_json(request, 400, {"query": query, "error": str(e), "position": 0})
+            return
+        # /settings is probed by the client for the protocol version; a 404
+        # makes it fall back to version 1 (text).
+        request.send_response(404)
+        request.send_header('Content-Length', '0')
+        request.end_headers()
+
+    def execute(self, query):
+        """Runs one query against the stored rows and returns the /exec JSON payload."""
+        with self._lock:
+            self.queries.append(query)
+        match = _SELECT_RE.match(' '.join(query.split()))
+        if match is None:
+            raise ValueError("unsupported query")
+        rows = [(row, ts) for table, row, ts in self.rows(match['table'])]
+
+        for condition in re.split(r' AND ', match['where'] or '', flags=re.I) if match['where'] else ():
+            rows = _filter(rows, condition)
+
+        outputs = []  # (name, aggregate function or None, column)
+        for item in (part.strip() for part in match['select'].split(',')):
+            aggregate = _AGGREGATE_RE.match(item)
+            if aggregate:
+                fn = aggregate['fn'].lower()
+                outputs.append((aggregate['alias'] or f"{fn}", _AGGREGATES[fn], aggregate['column']))
+            elif re.fullmatch(r'\w+', item):
+                outputs.append((item, None, item))
+            else:
+                raise ValueError(f"unsupported select item: {item}")
+
+        if match['every'] is None:
+            dataset = [[_format_ts(ts) if column == 'timestamp' else row.get(column)
+                        for _, _, column in outputs] for row, ts in sorted(rows, key=lambda r: r[1])]
+        else:
+            every = int(match['every']) * _UNIT_NS[match['unit']]
+            keys = [column for _, fn, column in outputs if fn is None and column != 'timestamp']
+            groups = {}
+            for row, ts in sorted(rows, key=lambda r: r[1]):
+                groups.setdefault((ts // every * every,) + tuple(row.get(key) for key in keys), []).append(row)
+            dataset = []
+            for (bucket, *key_values), members in groups.items():
+                key_map = dict(zip(keys, key_values))
+                line = []
+                for _, fn, column in outputs:
+                    if column == 'timestamp' and fn is None:
+                        line.append(_format_ts(bucket))
+                    elif fn is None:
+                        line.append(key_map[column])
+                    else:
+                        values = [member[column] for member in members if member.get(column) is not None]
+                        line.append(fn(values) if values else None)
+                dataset.append(line)
+        return {
+            "query": query,
+            "columns": [{"name": name, "type": "TIMESTAMP" if column == 'timestamp' and fn is None else "DOUBLE"}
+                        for name, fn, column in outputs],
+            "timestamp": 0 if outputs and outputs[0][2] == 'timestamp' else -1,
+            "dataset": dataset,
+            "count": len(dataset),
+        }
+
+    def _handle_post(self, request):
+        length = int(request.headers.get('Content-Length', 0))
+        body = request.rfile.read(length)
+        self.requests += 1
+        if urlparse(request.path).path != '/write':
+            request.send_response(404)
+            request.send_header('Content-Length', '0')
+            request.end_headers()
+            return
+        if not self.available:
+            self._send_json(request, 503, {"code": "unavailable", "message": "stub unavailable"})
+            return
+        rows = [parse_ilp_line(line) for line in body.decode('utf-8').splitlines() if line]
+        with self._lock:
+            self._rows.extend(rows)
+        request.send_response(204)
+        request.end_headers()
+
+    @staticmethod
+    def _send_json(request, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        request.send_response(status)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
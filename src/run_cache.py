@@ -0,0 +1,122 @@
+import argparse
+import glob
+import json
+import os
+import time
+
+import pandas as pd
+
+CACHE_DIR_NAME = '.cache'
+DATE_TIME_COLUMN = 'Date-Time'
+DATE_TIME_FORMAT = '%m/%d/%y-%H:%M:%S'  # e.g. 11/18/25-15:39:29
+TEXT_COLUMNS = ('Remark',)
+CACHE_VERSION = 1
+
+
+def cache_paths(csv_file, cache_dir=None):
+    """Returns the (parquet, metadata) paths caching `csv_file`."""
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(csv_file), CACHE_DIR_NAME)
+    stem = os.path.splitext(os.path.basename(csv_file))[0]
+    return os.path.join(cache_dir, stem + '.parquet'), os.path.join(cache_dir, stem + '.json')
+
+
+def read_csv_typed(csv_file):
+    """
+    Reads a Spectronik run log into typed columns: column names stripped,
+    `Date-Time` parsed, every other column numeric with the 'XX.X'
+    sentinels (and any other non-numeric text) as NaN.
+    """
+    df = pd.read_csv(csv_file, dtype=str)
+    df.columns = df.columns.str.strip()
+    for column in df.columns:
+        if column == DATE_TIME_COLUMN:
+            df[column] = pd.to_datetime(df[column], format=DATE_TIME_FORMAT, errors='coerce')
+        elif column not in TEXT_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors='coerce').astype('float64')
+    return df
+
+
+def _source_stamp(csv_file):
+    stat = os.stat(csv_file)
+    return {"version": CACHE_VERSION, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def _read_metadata(meta_path):
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def update_cache(csv_file, cache_dir=None, force=False):
+    """
+    Converts `csv_file` to its Parquet cache unless an up-to-date one exists.
+
+    The cache is considered stale when the CSV's mtime or size changed.
+
+    Returns:
+        dict: Cache metadata, including the list of columns.
+    """
+    parquet_path, meta_path = cache_paths(csv_file, cache_dir)
+    stamp = _source_stamp(csv_file)
+    meta = _read_metadata(meta_path)
+    if not force and meta and os.path.exists(parquet_path) and all(meta.get(k) == v for k, v in stamp.items()):
+        return meta
+
+    df = read_csv_typed(csv_file)
+    os.makedirs(os.path.dirname(parquet_path), exist_ok=True)
+    df.to_parquet(parquet_path, index=False)
+    meta = dict(stamp, source=os.path.abspath(csv_file), columns=list(df.columns), rows=len(df))
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def load_run(csv_file, columns=None, cache_dir=None):
+    """
+    Loads a run log through the columnar cache.
+
+    Args:
+        csv_file (str): Path to the Spectronik CSV.
+        columns (list of str, optional): Columns to load; only these are
+            read from the cache. Columns the run does not have are skipped.
+        cache_dir (str, optional): Defaults to `.cache` next to the CSV.
+
+    Returns:
+        pandas.DataFrame: Typed columns, see read_csv_typed.
+    """
+    try:
+        meta = update_cache(csv_file, cache_dir)
+    except OSError as e:
+        # Read-only data directory and the like: work from the CSV.
+        print(f"Warning: could not cache {csv_file}: {e}")
+        df = read_csv_typed(csv_file)
+        return df if columns is None else df[[c for c in columns if c in df.columns]]
+
+    if columns is not None:
+        columns = [column for column in columns if column in meta["columns"]]
+    parquet_path, _ = cache_paths(csv_file, cache_dir)
+    return pd.read_parquet(parquet_path, columns=columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or refresh the columnar cache of run logs.")
+    parser.add_argument('files', nargs='*', help="CSV files (default: data/*.csv).")
+    parser.add_argument('--force', action='store_true', help="Rebuild even if the cache is up to date.")
+    args = parser.parse_args()
+
+    csv_files = args.files or sorted(glob.glob('data/*.csv'))
+    for csv_file in csv_files:
+        start = time.perf_counter()
+        meta = update_cache(csv_file, force=args.force)
+        cached = time.perf_counter() - start
+        start = time.perf_counter()
+        load_run(csv_file)
+        loaded = time.perf_counter() - start
+        print(f"{os.path.basename(csv_file):<40} | {meta['rows']:>7} rows | update {cached * 1000:8.1f} ms | load {loaded * 1000:6.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import argparse
+import glob
+import json
+import operator
+import os
+import re
+
+DATA_DIR = 'data'
+CACHE_DIR_NAME = '.cache'  # run_cache.CACHE_DIR_NAME, without importing pandas
+CATALOG_NAME = 'catalog.json'
+CATALOG_VERSION = 2  # 2: keys relative to the data directory
+STATS = ('min', 'max', 'mean', 'count', 'nan_count')
+
+# Run logs are named <firmware>-<run>.csv, e.g. V2.5.6-3-2302-17-A-8.csv.
+_FILENAME_RE = re.compile(r'^(V\d+(?:\.\d+)*-\d+)-(.+)$')
+
+_OPERATORS = {
+    '<': operator.lt, '<=': operator.le, '>': operator.gt,
+    '>=': operator.ge, '==': operator.eq, '!=': operator.ne,
+}
+_CONDITION_RE = re.compile(r'^\s*(.+?)\s*(<=|>=|==|!=|<|>)\s*(.+?)\s*$')
+
+
+def parse_filename(csv_file):
+    """Returns (firmware, run) from a run log file name, or (None, stem)."""
+    stem = os.path.splitext(os.path.basename(csv_file))[0]
+    match = _FILENAME_RE.match(stem)
+    if match is None:
+        return None, stem
+    return match.group(1), match.group(2)
+
+
+def summarize(csv_file):
+    """
+    Computes the catalog entry of one run: per-column statistics of every
+    numeric column, row count, time span and firmware version.
+    """
+    # Only needed for new or modified runs: listing an up-to-date catalog
+    # does not pay for importing pandas.
+    import numpy as np
+    from run_cache import DATE_TIME_COLUMN, load_run
+
+    df = load_run(csv_file)
+    firmware, run = parse_filename(csv_file)
+    entry = {
+        "file": os.path.basename(csv_file),
+        "firmware": firmware,
+        "run": run,
+        "rows": len(df),
+        "start": None,
+        "end": None,
+        "duration_s": None,
+        "columns": {},
+    }
+
+    if DATE_TIME_COLUMN in df.columns:
+        times = df[DATE_TIME_COLUMN].dropna()
+        if len(times):
+            entry["start"] = times.min().isoformat()
+            entry["end"] = times.max().isoformat()
+            entry["duration_s"] = (times.max() - times.min()).total_seconds()
+
+    for column in df.columns:
+        if df[column].dtype.kind != 'f':
+            continue
+        values = df[column].to_numpy()
+        valid = values[~np.isnan(values)]
+        stats = {"count": int(len(valid)), "nan_count": int(len(values) - len(valid))}
+        if len(valid):
+            stats.update(min=float(valid.min()), max=float(valid.max()), mean=float(valid.mean()))
+        else:
+            stats.update(min=None, max=None, mean=None)
+        entry["columns"][column] = stats
+    return entry
+
+
+def parse_condition(text):
+    """
+    Parses a query condition such as "FC_A (A).max > 20", "rows >= 1000" or
+    "firmware == V2.5.6-3" into (field, stat, op, value).
+    """
+    match = _CONDITION_RE.match(text)
+    if match is None:
+        raise ValueError(f"Invalid condition: {text!r}")
+    left, op, value = match.groups()
+    field, stat = left, None
+    for candidate in STATS:
+        if left.endswith('.' + candidate):
+            field, stat = left[:-len(candidate) - 1], candidate
+            break
+    try:
+        value = float(value)
+    except ValueError:
+        value = value.strip('\'"')
+    return field, stat, op, value
+
+
+class RunCatalog:
+    """
+    Per-run summary index of the run logs in `data_dir`.
+
+    The catalog lives in the data directory's cache
+    (<data_dir>/.cache/catalog.json by default) and its entries are keyed
+    by file path relative to `data_dir`, so it does not depend on the
+    working directory. Entries store the file's mtime and size; an update
+    only re-reads files that are new or changed, so files can be added as
+    they land. sync() also drops the entries whose file is gone. Queries
+    are answered from the index alone.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, path=None):
+        self.data_dir = data_dir
+        self.path = path or os.path.join(data_dir, CACHE_DIR_NAME, CATALOG_NAME)
+        self.runs = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == CATALOG_VERSION:
+            self.runs = data["runs"]
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({"version": CATALOG_VERSION, "runs": self.runs}, f)
+        os.replace(tmp_path, self.path)
+
+    def key(self, csv_file):
+        """The entry key of `csv_file`: its path relative to the data directory."""
+        return os.path.relpath(os.path.abspath(csv_file), os.path.abspath(self.data_dir))
+
+    def update(self, csv_files):
+        """
+        Adds or refreshes the entries of `csv_files`; other entries are kept.
+
+        Returns:
+            int: Entries added or refreshed.
+        """
+        refreshed = 0
+        for csv_file in csv_files:
+            key = self.key(csv_file)
+            stat = os.stat(csv_file)
+            entry = self.runs.get(key)
+            if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                continue
+            try:
+                entry = summarize(csv_file)
+            except Exception as e:
+                print(f"Error summarizing {csv_file}: {e}")
+                continue
+            entry.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+            self.runs[key] = entry
+            refreshed += 1
+        if refreshed:
+            self.save()
+        return refreshed
+
+    def sync(self):
+        """
+        Brings the catalog in line with the CSV files of the data
+        directory: new or changed files are read, entries whose file is
+        gone are removed.
+
+        Returns:
+            tuple: (added or refreshed, removed) counts.
+        """
+        csv_files = sorted(glob.glob(os.path.join(self.data_dir, '*.csv')))
+        refreshed = self.update(csv_files)
+        present = {self.key(csv_file) for csv_file in csv_files}
+        removed = [key for key in self.runs
+                   if key not in present and not os.path.isfile(os.path.join(self.data_dir, key))]
+        for key in removed:
+            del self.runs[key]
+        if removed:
+            self.save()
+        return refreshed, len(removed)
+
+    def query(self, conditions=()):
+        """
+        Returns the entries matching every condition, sorted by file name.
+
+        Args:
+            conditions (list): Strings understood by parse_condition, or
+                (field, stat, op, value) tuples. A field with a stat refers
+                to a column statistic ("FC_A (A)", "max"); without, to a
+                run attribute ("rows", "firmware", "duration_s").
+        """
+        parsed = [parse_condition(c) if isinstance(c, str) else c for c in conditions]
+        matches = []
+        for entry in self.runs.values():
+            for field, stat, op, value in parsed:
+                if stat is None:
+                    actual = entry.get(field)
+                else:
+                    actual = entry["columns"].get(field, {}).get(stat)
+                if actual is None:
+                    break
+                try:
+                    if not _OPERATORS[op](actual, value):
+                        break
+                except TypeError:
+                    break
+            else:
+                matches.append(entry)
+        return sorted(matches, key=lambda entry: entry["file"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index the run logs and query their summaries.")
+    parser.add_argument('--data', default=DATA_DIR, help="Directory holding the CSV run logs.")
+    parser.add_argument('--catalog', default=None, help="Catalog file (default: DATA/.cache/catalog.json).")
+    parser.add_argument('--where', action='append', default=[],
+                        help='Condition, e.g. "FC_A (A).max > 20" or "firmware == V2.5.6-3". Repeatable.')
+    parser.add_argument('--column', default='FC_A (A)', help="Column whose statistics are listed.")
+    args = parser.parse_args()
+
+    catalog = RunCatalog(args.data, args.catalog)
+    refreshed, removed = catalog.sync()
+    print(f"Catalog: {len(catalog.runs)} runs ({refreshed} updated, {removed} removed).")
+
+    print(f"{'File':<40} | {'Firmware':<10} | {'Rows':>7} | {'Min':>9} | {'Max':>9} | {'Mean':>9}")
+    print("-" * 100)
+    for entry in catalog.query(args.where):
+        stats = entry["columns"].get(args.column, {})
+        cells = [f"{stats[s]:>9.3f}" if stats.get(s) is not None else f"{'N/A':>9}" for s in ('min', 'max', 'mean')]
+        print(f"{entry['file']:<40} | {entry['firmware'] or '':<10} | {entry['rows']:>7} | {' | '.join(cells)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import threading
+import time
+from collections import deque, namedtuple
+
+# The Protium-2500 only takes relative fan and blower steps (Annex A of
+# the UART specification): command -> change in %. Settings stay within
+# LIMITS.
+Actuator = namedtuple('Actuator', ['field', 'steps', 'auto'])
+
+ACTUATORS = {
+    'fan': Actuator('FAN', {'0': 1, '9': -1, '=': 5, '-': -5}, 'f'),
+    'blower': Actuator('BLW', {']': 3, '[': -3}, 'b'),
+}
+LIMITS = (0, 100)
+CONFIRM_TIMEOUT = 3.0  # Seconds for the telemetry to show a setting
+TOLERANCE = 0.5  # % between the expected and the reported setting
+POLL_SECONDS = 0.05
+
+_PLANS = {}
+
+
+def plan(current, target, steps, limits=LIMITS):
+    """
+    The shortest command sequence from `current` to `target` (in %).
+
+    The firmware clamps each step to `limits`, which the search uses
+    (83 -> 100 is four '=', not three '=' and two '0'). The setting never
+    strays more than one step outside the way from current to target, and
+    a target the steps cannot reach that way is replaced by the nearest
+    setting they can.
+
+    Returns:
+        tuple: (list of commands, the setting they lead to)
+    """
+    low, high = limits
+    start = min(max(int(round(current)), low), high)
+    target = min(max(int(round(target)), low), high)
+    key = (start, target, tuple(sorted(steps.items())), limits)
+    if key in _PLANS:
+        return _PLANS[key]
+
+    # Breadth-first over the settings: fewest commands first.
+    reach = max(abs(change) for change in steps.values())
+    lowest, highest = min(start, target) - reach, max(start, target) + reach
+    previous = {start: None}
+    queue = deque([start])
+    while queue:
+        value = queue.popleft()
+        if value == target:
+            break
+        for command, change in steps.items():
+            following = min(max(value + change, low), high)
+            if lowest <= following <= highest and following not in previous:
+                previous[following] = (value, command)
+                queue.append(following)
+    reached = min(previous, key=lambda value: (abs(value - target), _depth(previous, value)))
+
+    commands = []
+    value = reached
+    while previous[value] is not None:
+        value, command = previous[value]
+        commands.append(command)
+    commands.reverse()
+    _PLANS[key] = (commands, float(reached))
+    return _PLANS[key]
+
+
+def _depth(previous, value):
+    depth = 0
+    while previous[value] is not None:
+        value = previous[value][0]
+        depth += 1
+    return depth
+
+
+class _State:
+    def __init__(self):
+        self.target = None  # Requested, not sent yet
+        self.expected = None  # Sent, not confirmed yet
+        self.sent_at = 0.0
+        self.status = 'idle'
+        self.last_commands = ''
+        self.done = threading.Event()
+        self.done.set()
+
+
+class SetpointController:
+    """
+    Absolute fan and blower settings on top of the relative step commands.
+
+    request() only records the target; a background thread reads the
+    current setting from the telemetry, sends the shortest step sequence
+    as one write, and watches the following frames until they show the new
+    setting. A request made while the previous one is still in flight is
+    planned from the setting that one will leave, and requests superseded
+    before they were sent are dropped: only the latest target per actuator
+    is ever sent, so quick clicks cannot race.
+
+    `controller` provides send_command() and `telemetry` (a
+    TelemetryRingBuffer or the daemon's shared one).
+    """
+
+    def __init__(self, controller, confirm_timeout=CONFIRM_TIMEOUT):
+        self.controller = controller
+        self.confirm_timeout = confirm_timeout
+        self._states = {name: _State() for name in ACTUATORS}
+        self._wake = threading.Condition()
+        self._thread = None
+        self._running = False
+        self.writes = 0
+        self.commands = 0
+        self.coalesced = 0
+        self.confirmed = 0
+        self.timeouts = 0
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._running = False
+            with self._wake:
+                self._wake.notify()
+            self._thread.join()
+            self._thread = None
+
+    def request(self, name, percent, wait=False):
+        """
+        Asks for `percent` on actuator `name` ('fan' or 'blower').
+
+        Args:
+            wait (bool or float): Block until the telemetry shows the
+                setting, or the request fails (True: up to twice the
+                confirmation timeout; a number: that many seconds).
+
+        Returns:
+            str: The status: 'pending', 'confirmed', 'timeout', ...
+        """
+        state = self._states[name]
+        with self._wake:
+            if state.target is not None:
+                self.coalesced += 1
+            state.target = percent
+            state.status = 'pending'
+            state.done.clear()
+            self._wake.notify()
+        if wait:
+            state.done.wait(2 * self.confirm_timeout if wait is True else wait)
+        return state.status
+
+    def cancel(self, name):
+        """Forgets the pending and in-flight setting of `name` (e.g. back to auto)."""
+        state = self._states[name]
+        with self._wake:
+            state.target = state.expected = None
+            state.status = 'idle'
+            state.done.set()
+
+    def status(self):
+        """{actuator: {"status", "target", "expected", "commands"}}."""
+        return {name: {"status": state.status, "target": state.target, "expected": state.expected,
+                       "commands": state.last_commands}
+                for name, state in self._states.items()}
+
+    def stats(self):
+        return {"writes": self.writes, "commands": self.commands, "coalesced": self.coalesced,
+                "confirmed": self.confirmed, "timeouts": self.timeouts}
+
+    def _run(self):
+        while self._running:
+            with self._wake:
+                if not any(state.target is not None or state.expected is not None
+                           for state in self._states.values()):
+                    self._wake.wait()
+                else:
+                    self._wake.wait(POLL_SECONDS)
+                if not self._running:
+                    return
+                latest = self.controller.telemetry.latest()
+                for name, actuator in ACTUATORS.items():
+                    self._step(self._states[name], actuator, latest)
+
+    def _step(self, state, actuator, latest):
+        now = time.time()
+        if state.expected is not None:
+            reported = latest.get(actuator.field) if latest.get('timestamp', 0) > state.sent_at else None
+            if reported is not None and abs(reported - state.expected) <= TOLERANCE:
+                state.expected = None
+                self.confirmed += 1
+                if state.target is None:
+                    state.status = 'confirmed'
+                    state.done.set()
+            elif now - state.sent_at > self.confirm_timeout:
+                # Lost or refused (not running, say): start over from the telemetry.
+                state.expected = None
+                self.timeouts += 1
+                if state.target is None:
+                    state.status = 'timeout'
+                    state.done.set()
+
+        if state.target is None:
+            return
+        current = state.expected if state.expected is not None else latest.get(actuator.field)
+        if current is None:
+            state.status = 'waiting for telemetry'
+            return
+        commands, reached = plan(current, state.target, actuator.steps)
+        state.target = None
+        state.last_commands = ''.join(commands)
+        if not commands:
+            if state.expected is None:
+                state.status = 'confirmed'
+                state.done.set()
+            return
+        # One write for the whole sequence.
+        self.controller.send_command(''.join(command + '\r' for command in commands))
+        self.writes += 1
+        self.commands += len(commands)
+        state.expected = reached
+        state.sent_at = now
+        state.status = 'in flight'
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+CURRENT_COLUMN = 'FC_A (A)'
+VOLTAGE_COLUMN = 'FC_V (V)'
+TIME_COLUMN = 'Date-Time'
+
+
+def rolling_std(x, window):
+    """
+    Trailing rolling standard deviation, vectorized with cumulative sums.
+
+    The first window - 1 samples, whose window is incomplete, are NaN.
+    """
+    x = np.asarray(x, dtype=float)
+    out = np.full(len(x), np.nan)
+    if len(x) < window:
+        return out
+    # Centre on the mean to keep the sum of squares well conditioned.
+    centred = x - np.mean(x)
+    s1 = np.concatenate(([0.0], np.cumsum(centred)))
+    s2 = np.concatenate(([0.0], np.cumsum(centred * centred)))
+    total = s1[window:] - s1[:-window]
+    total_sq = s2[window:] - s2[:-window]
+    variance = np.maximum(total_sq / window - (total / window) ** 2, 0.0)
+    out[window - 1:] = np.sqrt(variance)
+    return out
+
+
+def find_plateaus(current, voltage, window=10, current_tol=0.05, voltage_tol=0.3,
+                  step_tol=0.1, min_points=10, times=None, max_gap=30.0):
+    """
+    Labels the constant-current plateaus of a run.
+
+    The run is first cut into segments wherever the current jumps by more
+    than `step_tol` or, if `times` (seconds) are given, where the log has a
+    gap longer than `max_gap`. Within a segment, only steady samples are
+    kept: those whose trailing `window` samples of both current and voltage
+    have a standard deviation below the tolerances, which excludes the
+    transient right after a load step.
+
+    Returns:
+        np.ndarray: Plateau label per sample (0, 1, ... in time order), -1
+        for samples outside any plateau of at least `min_points` samples.
+    """
+    current = np.asarray(current, dtype=float)
+    voltage = np.asarray(voltage, dtype=float)
+    steady = (rolling_std(current, window) < current_tol) & (rolling_std(voltage, window) < voltage_tol)
+
+    boundary = np.ones(len(current), dtype=bool)
+    if len(current) > 1:
+        boundary[1:] = np.abs(np.diff(current)) > step_tol
+        if times is not None:
+            boundary[1:] |= np.diff(np.asarray(times, dtype=float)) > max_gap
+    segment = np.cumsum(boundary) - 1
+
+    counts = np.bincount(segment, weights=steady)
+    levels = np.bincount(segment, weights=np.where(steady, current, 0.0)) / np.maximum(counts, 1)
+
+    # A short excursion of the load splits a plateau in two; join
+    # consecutive segments that settle back to the same current.
+    kept = np.flatnonzero(counts >= min_points)
+    labels = np.full(len(counts), -1)
+    if len(kept):
+        new_level = np.ones(len(kept), dtype=bool)
+        new_level[1:] = np.abs(np.diff(levels[kept])) > step_tol
+        if times is not None and len(kept) > 1:
+            times = np.asarray(times, dtype=float)
+            first = np.searchsorted(segment, kept)
+            last = np.searchsorted(segment, kept, side='right') - 1
+            new_level[1:] |= times[first[1:]] - times[last[:-1]] > max_gap
+        labels[kept] = np.cumsum(new_level) - 1
+    return np.where(steady, labels[segment], -1)
+
+
+def polarization_points(df, active_area=None, min_voltage=None, **kwargs):
+    """
+    Reduces a run to one polarization point per steady-state plateau.
+
+    Args:
+        df (pandas.DataFrame): Run log with 'FC_A (A)' and 'FC_V (V)'
+            columns (and optionally 'Date-Time'); rows with NaNs are ignored.
+        active_area (float, optional): Active area in cm²; adds current and
+            power density columns.
+        min_voltage (float, optional): Drop plateaus whose mean voltage is
+            below this value.
+        **kwargs: Passed to find_plateaus.
+
+    Returns:
+        pandas.DataFrame: One row per plateau with the mean and standard
+        deviation of current and voltage, the number of samples and, when
+        timestamps are available, the plateau start and end.
+    """
+    columns = [CURRENT_COLUMN, VOLTAGE_COLUMN]
+    has_time = TIME_COLUMN in df.columns
+    if has_time:
+        columns.append(TIME_COLUMN)
+    df = df[columns].dropna()
+
+    times = None
+    if has_time:
+        times = df[TIME_COLUMN].to_numpy().astype('datetime64[ns]').astype(np.int64) / 1e9
+    current = df[CURRENT_COLUMN].to_numpy(dtype=float)
+    voltage = df[VOLTAGE_COLUMN].to_numpy(dtype=float)
+    labels = find_plateaus(current, voltage, times=times, **kwargs)
+
+    mask = labels >= 0
+    plateau = labels[mask]
+    n = np.bincount(plateau).astype(float)
+
+    def mean_std(values):
+        values = values[mask]
+        mean = np.bincount(plateau, weights=values) / n
+        variance = np.bincount(plateau, weights=(values - mean[plateau]) ** 2) / n
+        return mean, np.sqrt(variance)
+
+    current_mean, current_std = mean_std(current)
+    voltage_mean, voltage_std = mean_std(voltage)
+    points = pd.DataFrame({
+        'current_mean': current_mean,
+        'current_std': current_std,
+        'voltage_mean': voltage_mean,
+        'voltage_std': voltage_std,
+        'points': n.astype(int),
+    })
+    if has_time:
+        stamps = df[TIME_COLUMN].to_numpy()[mask]
+        first = np.full(len(n), len(stamps))
+        np.minimum.at(first, plateau, np.arange(len(stamps)))
+        last = np.zeros(len(n), dtype=int)
+        np.maximum.at(last, plateau, np.arange(len(stamps)))
+        points['start'] = stamps[first]
+        points['end'] = stamps[last]
+    points['power_mean'] = points['current_mean'] * points['voltage_mean']
+    if active_area:
+        points['current_density'] = points['current_mean'] / active_area
+        points['current_density_std'] = points['current_std'] / active_area
+        points['power_density'] = points['power_mean'] / active_area
+    if min_voltage is not None:
+        points = points[points['voltage_mean'] >= min_voltage]
+    return points.reset_index(drop=True)
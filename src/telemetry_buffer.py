@@ -0,0 +1,160 @@
+import threading
+import time
+
+import numpy as np
+
+from protium_parser import FIELD_NAMES, TelemetryRecord
+
+POLICIES = ('overwrite', 'drop')
+
+
+class TelemetryRingBuffer:
+    """
+    Fixed-capacity, columnar store for the most recent telemetry frames.
+
+    One float64 column per field plus a leading timestamp column (seconds
+    since the epoch). Fields missing from a frame are NaN. Appending is O(1)
+    and never allocates; when the buffer is full the oldest row is
+    overwritten ('overwrite') or the new one is discarded ('drop').
+
+    Every row is stored twice, at i and i + capacity, so the latest n rows
+    are always one contiguous slice: window() and column() return views
+    without copying. A view stays valid until (capacity - n) further
+    appends; copy it to keep it longer.
+    """
+
+    def __init__(self, capacity=86400, fields=FIELD_NAMES, policy='overwrite', buffer=None):
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}, got {policy!r}")
+        self.capacity = capacity
+        self.policy = policy
+        self.columns = ('timestamp',) + tuple(fields)
+        self._index = {name: i for i, name in enumerate(self.columns)}
+        if buffer is None:
+            self._data = np.full((2 * capacity, len(self.columns)), np.nan)
+        else:
+            # Rows held in caller-provided memory (shared memory, say), used as is.
+            self._data = np.ndarray((2 * capacity, len(self.columns)), dtype=np.float64, buffer=buffer)
+        self._row = [np.nan] * len(self.columns)
+        # Records carry their values in schema order; with the default
+        # fields they are copied into the row in one go.
+        self._records_aligned = self.columns[1:] == FIELD_NAMES
+        self._head = 0
+        self._lock = threading.Lock()
+        self.size = 0
+        self.appended = 0
+        self.overwritten = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, frame, timestamp=None):
+        """
+        Stores one frame.
+
+        Args:
+            frame (TelemetryRecord or dict): A record from the parser, or
+                field key to value, either nested ({"FC_V": {"value": 71.2,
+                "unit": "V"}}) or plain ({"FC_V": 71.2}). Unknown keys are
+                ignored.
+            timestamp (float, optional): Seconds since the epoch; defaults to
+                the record's own timestamp, then to now.
+
+        Returns:
+            bool: False if the frame was dropped.
+        """
+        record = type(frame) is TelemetryRecord
+        if timestamp is None:
+            timestamp = frame.timestamp if record and frame.timestamp is not None else time.time()
+        index = self._index
+
+        with self._lock:
+            row = self._row
+            if record and self._records_aligned:
+                row[1:] = frame.values
+            else:
+                for i in range(1, len(row)):
+                    row[i] = np.nan
+                for key, value in frame.items():
+                    i = index.get(key)
+                    if i is not None:
+                        row[i] = value["value"] if isinstance(value, dict) else value
+            row[0] = timestamp
+
+            if self.size == self.capacity:
+                if self.policy == 'drop':
+                    self.dropped += 1
+                    return False
+                self.overwritten += 1
+            else:
+                self.size += 1
+            head = self._head
+            self._data[head] = row
+            self._data[head + self.capacity] = row
+            self._head = (head + 1) % self.capacity
+            self.appended += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._head = 0
+            self.size = 0
+
+    def window(self, n=None):
+        """
+        Returns the latest n rows (all buffered rows by default), oldest
+        first, as a read-only (n, len(columns)) view.
+        """
+        with self._lock:
+            n = self.size if n is None else min(n, self.size)
+            end = self._head + self.capacity
+            view = self._data[end - n:end]
+        view.flags.writeable = False
+        return view
+
+    def since_count(self, count):
+        """
+        Returns the rows appended after the first `count` appends, read
+        together with the current append count, so a caller that passes
+        the count back next time sees every row exactly once (rows already
+        overwritten excepted).
+
+        Returns:
+            tuple: (appended, read-only view of the new rows, oldest first)
+        """
+        with self._lock:
+            appended = self.appended
+            n = min(max(appended - count, 0), self.size)
+            end = self._head + self.capacity
+            view = self._data[end - n:end]
+        view.flags.writeable = False
+        return appended, view
+
+    def column(self, name, n=None):
+        """Returns a read-only view of one column over the latest n rows."""
+        return self.window(n)[:, self._index[name]]
+
+    def since(self, timestamp):
+        """Returns the rows recorded at or after `timestamp` (seconds since the epoch)."""
+        view = self.window()
+        start = np.searchsorted(view[:, 0], timestamp, side='left')
+        return view[start:]
+
+    def latest(self):
+        """Returns the most recent row as {column: value}, or {} if empty."""
+        view = self.window(1)
+        if not len(view):
+            return {}
+        return {name: float(value) for name, value in zip(self.columns, view[0]) if value == value}
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "capacity": self.capacity,
+            "appended": self.appended,
+            "overwritten": self.overwritten,
+            "dropped": self.dropped,
+        }
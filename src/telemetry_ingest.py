@@ -0,0 +1,321 @@
+import argparse
+import json
+import os
+import threading
+import time
+from queue import Queue, Empty, Full
+
+from questdb.ingress import Sender, IngressError, TimestampNanos
+
+from metrics import REGISTRY, serve
+from protium_parser import FIELDS, TelemetryRecord
+
+TABLE_NAME = 'protium_telemetry'
+SPOOL_PATH = 'data/spool/protium_telemetry.jsonl'
+
+# QuestDB column names may not contain '-' or '%'.
+COLUMN_NAMES = {field.key: field.key.lower().replace('-', '_') for field in FIELDS}
+_RECORD_COLUMNS = tuple(COLUMN_NAMES[field.key] for field in FIELDS)
+
+_STOP = object()
+
+
+class TelemetryIngestor:
+    """
+    Streams parsed Protium telemetry frames into QuestDB.
+
+    Frames are queued by submit() (or on_item, usable as a
+    FuelCellController listener) and written by a background thread in
+    batches, flushed when `batch_size` rows are pending or the oldest one
+    has waited `flush_interval` seconds. The queue is bounded: when QuestDB
+    cannot keep up, submit() blocks, then rejects.
+
+    When QuestDB is unreachable, batches are appended to a local JSON-lines
+    spool file instead. Once a flush succeeds again, the spool is replayed
+    in order, before newer rows, and truncated.
+    """
+
+    def __init__(self, conf='http::addr=localhost:9000;', table_name=TABLE_NAME, spool_path=SPOOL_PATH,
+                 batch_size=500, flush_interval=1.0, queue_size=10000, retry_interval=5.0, symbols=None,
+                 registry=REGISTRY):
+        self.conf = conf
+        self.table_name = table_name
+        self.spool_path = spool_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self.symbols = symbols or {}
+        self._queue = Queue(maxsize=queue_size)
+        self._sender = None
+        self._next_attempt = 0.0
+        self._thread = None
+        self.online = False
+        self.rows_sent = 0
+        self.rows_spooled = 0
+        self.rows_replayed = 0
+        self.rows_rejected = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.last_flush_seconds = None
+        self._register_metrics(registry)
+
+    def _register_metrics(self, registry):
+        labels = {'table': self.table_name}
+        self.flush_timer = registry.timer('exocet_questdb_flush_seconds', "QuestDB flush latency", labels)
+        for name, help_text, key in (
+                ('exocet_questdb_rows_sent_total', "Rows written to QuestDB", 'rows_sent'),
+                ('exocet_questdb_rows_spooled_total', "Rows spooled while QuestDB was unreachable", 'rows_spooled'),
+                ('exocet_questdb_rows_rejected_total', "Rows rejected by the full ingest queue", 'rows_rejected'),
+                ('exocet_questdb_flush_errors_total', "Failed QuestDB flushes", 'flush_errors')):
+            registry.counter(name, help_text, labels, fn=lambda key=key: getattr(self, key))
+        registry.gauge('exocet_questdb_pending', "Rows waiting for the next flush", labels, fn=lambda: self.pending)
+        registry.gauge('exocet_questdb_online', "1 while connected to QuestDB", labels, fn=lambda: int(self.online))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=10.0):
+        """Flushes pending rows (to QuestDB or the spool) and stops the thread."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+        self._close_sender()
+
+    def submit(self, frame, timestamp=None, timeout=1.0):
+        """
+        Queues one frame.
+
+        Args:
+            frame (TelemetryRecord or dict): Parsed frame, or {"FC_V": {"value":
+                71.2, "unit": "V"}, ...} or {"FC_V": 71.2, ...}.
+            timestamp (float, optional): Seconds since the epoch; defaults to
+                the record's own timestamp, then to now.
+            timeout (float): How long to wait for room in the queue.
+
+        Returns:
+            bool: False if the queue stayed full and the frame was rejected.
+        """
+        if type(frame) is TelemetryRecord:
+            # Queued as is; the column dict is only built when the row is sent.
+            if timestamp is None:
+                timestamp = frame.timestamp
+            columns = frame
+        else:
+            columns = {}
+            for key, value in frame.items():
+                name = COLUMN_NAMES.get(key)
+                if name is not None:
+                    columns[name] = float(value["value"] if isinstance(value, dict) else value)
+        if not columns:
+            return True
+        ts_ns = time.time_ns() if timestamp is None else int(timestamp * 1e9)
+        try:
+            self._queue.put((ts_ns, columns), timeout=timeout)
+            return True
+        except Full:
+            self.rows_rejected += 1
+            return False
+
+    def on_item(self, item):
+        """FuelCellController listener: forwards telemetry frames, ignores text."""
+        if "raw" not in item and "error" not in item:
+            self.submit(item, timeout=0)
+
+    @property
+    def pending(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        return {
+            "online": self.online,
+            "pending": self.pending,
+            "rows_sent": self.rows_sent,
+            "rows_spooled": self.rows_spooled,
+            "rows_replayed": self.rows_replayed,
+            "rows_rejected": self.rows_rejected,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "last_flush_seconds": self.last_flush_seconds,
+        }
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            if deadline is not None:
+                timeout = max(0.0, deadline - time.monotonic())
+            else:
+                # Idle: wake up now and then to replay a leftover spool.
+                timeout = self.retry_interval
+            try:
+                item = self._queue.get(timeout=timeout)
+            except Empty:
+                item = None
+
+            if item is _STOP:
+                if batch:
+                    self._flush(batch)
+                return
+            if item is not None:
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+            if batch and (len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._flush(batch)
+                batch = []
+                deadline = None
+            elif not batch and self._spool_size() and time.monotonic() >= self._next_attempt:
+                # Idle, but spooled rows are waiting for the server to come back.
+                self._flush([])
+
+    def _flush(self, batch):
+        if not self._connect():
+            self._spool(batch)
+            return
+        try:
+            started = time.perf_counter()
+            if self._spool_size():
+                self._replay()
+            if batch:
+                self._send(batch)
+                self.rows_sent += len(batch)
+            self.flushes += 1
+            self.last_flush_seconds = time.perf_counter() - started
+            self.flush_timer.observe(self.last_flush_seconds)
+        except IngressError as e:
+            print(f"QuestDB Ingress Error: {e}")
+            self.flush_errors += 1
+            self._close_sender()
+            self._next_attempt = time.monotonic() + self.retry_interval
+            self._spool(batch)
+
+    def _connect(self):
+        if self._sender is not None:
+            return True
+        if time.monotonic() < self._next_attempt:
+            return False
+        try:
+            sender = Sender.from_conf(self.conf, auto_flush=False)
+            sender.establish()
+        except IngressError as e:
+            print(f"QuestDB unreachable, spooling to {self.spool_path}: {e}")
+            self._next_attempt = time.monotonic() + self.retry_interval
+            self.online = False
+            return False
+        self._sender = sender
+        self.online = True
+        return True
+
+    def _close_sender(self):
+        if self._sender is not None:
+            try:
+                self._sender.close(flush=False)
+            except IngressError:
+                pass
+            self._sender = None
+        self.online = False
+
+    def _send(self, rows):
+        sender = self._sender
+        for ts_ns, columns in rows:
+            sender.row(self.table_name, symbols=self.symbols or None, columns=_columns(columns),
+                       at=TimestampNanos(ts_ns))
+        sender.flush()
+
+    # --- Spool ---
+
+    def _spool_size(self):
+        try:
+            return os.path.getsize(self.spool_path)
+        except OSError:
+            return 0
+
+    def _spool(self, rows):
+        if not rows:
+            return
+        spool_dir = os.path.dirname(self.spool_path)
+        if spool_dir:
+            os.makedirs(spool_dir, exist_ok=True)
+        with open(self.spool_path, 'a') as f:
+            for ts_ns, columns in rows:
+                f.write(json.dumps({"t": ts_ns, "c": _columns(columns)}, separators=(',', ':')) + '\n')
+        self.rows_spooled += len(rows)
+
+    def _replay(self):
+        # Rows already replayed are recorded in an offset file, so an
+        # interrupted replay resumes instead of sending them twice.
+        offset_path = self.spool_path + '.offset'
+        try:
+            with open(offset_path) as f:
+                offset = int(f.read() or 0)
+        except (OSError, ValueError):
+            offset = 0
+
+        with open(self.spool_path) as f:
+            f.seek(offset)
+            while True:
+                rows = []
+                while len(rows) < self.batch_size:
+                    line = f.readline()
+                    if not line:
+                        break
+                    record = json.loads(line)
+                    rows.append((record["t"], record["c"]))
+                if not rows:
+                    break
+                self._send(rows)
+                self.rows_replayed += len(rows)
+                with open(offset_path, 'w') as offset_file:
+                    offset_file.write(str(f.tell()))
+
+        os.remove(self.spool_path)
+        os.remove(offset_path)
+        print(f"Replayed spooled telemetry from {self.spool_path}.")
+
+
+def _columns(row):
+    if type(row) is TelemetryRecord:
+        return {name: value for name, value in zip(_RECORD_COLUMNS, row.values) if value == value}
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream Protium-2500 telemetry into QuestDB.")
+    parser.add_argument('port', help="Serial port of the fuel cell, e.g. COM7.")
+    parser.add_argument('--conf', default='http::addr=localhost:9000;', help="QuestDB client configuration string.")
+    parser.add_argument('--table', default=TABLE_NAME)
+    parser.add_argument('--spool', default=SPOOL_PATH, help="Spool file used while QuestDB is unreachable.")
+    parser.add_argument('--batch', type=int, default=500, help="Rows per flush.")
+    parser.add_argument('--interval', type=float, default=1.0, help="Maximum seconds a row waits before a flush.")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Serve Prometheus metrics on this port (e.g. 9464).")
+    args = parser.parse_args()
+
+
+    from fuel_cell_controller import FuelCellController
+
+    server = serve(args.metrics_port) if args.metrics_port is not None else None
+    ingestor = TelemetryIngestor(args.conf, args.table, args.spool, args.batch, args.interval,
+                                 symbols={'port': args.port}).start()
+    controller = FuelCellController(args.port)
+    controller.add_listener(ingestor.on_item)
+    controller.connect()
+    try:
+        while True:
+            time.sleep(10)
+            print(ingestor.stats())
+    except KeyboardInterrupt:
+        print("\nStopping.")
+    finally:
+        controller.disconnect()
+        ingestor.stop()
+        if server:
+            server.stop()
+
+
+if __name__ == "__main__":
+    main()
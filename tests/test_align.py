@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from align import DIRECTIONS, Source, align, asof_indices, daq_wide, file_chunks, frame_chunks, to_ns
+
+START = np.datetime64('2025-11-28T10:00:00', 'ns')
+
+
+def stream(rng, n, period_s):
+    offsets = np.cumsum(rng.exponential(period_s, n) * 1e9).astype(np.int64)
+    return pd.DataFrame({'timestamp': START + offsets.astype('timedelta64[ns]'), 'value': rng.normal(size=n)})
+
+
+@pytest.fixture
+def streams():
+    rng = np.random.default_rng(0)
+    return stream(rng, 20000, 0.1), stream(rng, 2000, 1.0)
+
+
+def test_asof_indices_backward():
+    other = np.array([10, 20, 30])
+    base = np.array([5, 10, 15, 29, 30, 100])
+    assert asof_indices(base, other).tolist() == [-1, 0, 0, 1, 2, 2]
+
+
+def test_asof_indices_nearest():
+    other = np.array([10, 20, 30])
+    base = np.array([5, 14, 16, 26, 100])
+    assert asof_indices(base, other, direction='nearest').tolist() == [0, 0, 1, 2, 2]
+
+
+def test_asof_indices_tolerance():
+    other = np.array([10, 20, 30])
+    base = np.array([10, 13, 16, 45])
+    assert asof_indices(base, other, tolerance_ns=5).tolist() == [0, 0, -1, -1]
+    assert asof_indices(base, other, tolerance_ns=5, direction='nearest').tolist() == [0, 0, 1, -1]
+
+
+def test_asof_indices_empty_other():
+    assert asof_indices(np.array([1, 2]), np.array([], dtype=np.int64)).tolist() == [-1, -1]
+
+
+def test_asof_indices_rejects_unknown_direction():
+    with pytest.raises(ValueError):
+        asof_indices(np.array([1]), np.array([1]), direction='forward')
+
+
+@pytest.mark.parametrize('direction', DIRECTIONS)
+def test_chunked_alignment_matches_merge_asof(streams, direction):
+    base, other = streams
+    expected = pd.merge_asof(base, other, on='timestamp', direction=direction,
+                             tolerance=pd.Timedelta(seconds=2), suffixes=('', '_other'))['value_other'].to_numpy()
+    aligned = pd.concat(align(Source('base', frame_chunks(base, 997), prefix=''),
+                              [Source('other', frame_chunks(other, 332))],
+                              tolerance=2.0, direction=direction))
+    actual = aligned['other.value'].to_numpy()
+    assert len(actual) == len(expected)
+    assert np.allclose(actual, expected, equal_nan=True)
+
+
+def test_interpolation_matches_numpy(streams):
+    base, other = streams
+    interpolated = pd.concat(align(Source('base', frame_chunks(base, 997), prefix=''),
+                                   [Source('other', frame_chunks(other, 332))], interpolate=True))
+    origin = to_ns(base['timestamp'])[0]
+    expected = np.interp(to_ns(base['timestamp']) - origin, to_ns(other['timestamp']) - origin, other['value'])
+    inside = (base['timestamp'] >= other['timestamp'].iloc[0]) & (base['timestamp'] <= other['timestamp'].iloc[-1])
+    assert np.allclose(interpolated['other.value'].to_numpy()[inside], expected[inside])
+
+
+@pytest.fixture
+def questdb_export(tmp_path):
+    # A QuestDB CSV export: ISO timestamps, a symbol column and "XX.X"
+    # placeholders; the DAQ in long format.
+    times = pd.Series(pd.date_range('2025-11-28T10:00', periods=60, freq='100ms'))
+    iso = times.dt.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    values = pd.Series(np.arange(60.0)).astype(str).where(np.arange(60) % 7 > 0, 'XX.X')
+    pd.DataFrame({'timestamp': iso, 'port': 'COM7', 'FC_V': values}).to_csv(tmp_path / 'base.csv', index=False)
+    channels = ['ai0', 'ai1', 'ai2']
+    daq = pd.DataFrame({'timestamp': np.repeat(iso.to_numpy(), len(channels)),
+                        'channel_id': channels * len(iso),
+                        'voltage': np.random.default_rng(0).normal(size=len(iso) * len(channels))})
+    daq.to_csv(tmp_path / 'daq.csv', index=False)
+    daq.assign(timestamp=np.repeat(times.to_numpy(), len(channels)),
+               channel_id=daq['channel_id'].astype('category')).to_parquet(tmp_path / 'daq.parquet')
+    return tmp_path, times, channels
+
+
+def test_csv_columns(questdb_export):
+    directory, times, _ = questdb_export
+    read = pd.concat(file_chunks(str(directory / 'base.csv'), 16))
+    assert pd.api.types.is_datetime64_dtype(read['timestamp'])
+    assert (read['timestamp'].to_numpy() == times.to_numpy()).all()
+    assert (read['port'] == 'COM7').all()
+    assert read['FC_V'].dtype.kind == 'f'
+    assert read['FC_V'].isna().sum() == (np.arange(60) % 7 == 0).sum()
+
+
+@pytest.mark.parametrize('name', ['daq.csv', 'daq.parquet'])
+def test_daq_chunks_pivot_one_row_per_timestamp(questdb_export, name):
+    directory, times, channels = questdb_export
+    # 16 rows per chunk: timestamps straddle the chunk boundaries.
+    wide = pd.concat(daq_wide(file_chunks(str(directory / name), 16)))
+    assert list(wide.columns) == ['timestamp', *channels]
+    assert len(wide) == len(times)
+    assert wide['timestamp'].is_unique
+    assert not wide[channels].isna().any().any()
@@ -0,0 +1,101 @@
+import asyncio
+import os
+
+import pytest
+
+from async_fuel_cell_controller import AsyncFuelCellController, merge
+from protium_parser import format_frame
+from pty_link import PtyLink
+
+pytestmark = pytest.mark.skipif(os.name == 'nt', reason="needs pseudo-terminals and loop.add_reader")
+
+# Commands sent to every unit and the bytes the device side must receive.
+COMMANDS = (
+    ('start_fuel_cell', b'start\r'),
+    ('manual_purge', b'p\r'),
+    ('increase_fan_speed_5', b'=\r'),
+    ('decrease_fan_speed_1', b'9\r'),
+    ('increase_blower_intensity_3', b']\r'),
+    ('set_fans_auto', b'f\r'),
+)
+
+
+class FakeUnit:
+    """Device side of one pty: writes frames and records the commands it receives."""
+
+    def __init__(self, index):
+        self.index = index
+        self.link = PtyLink()
+        os.set_blocking(self.link.master_fd, False)
+        self.received = bytearray()
+
+    def attach(self, loop):
+        loop.add_reader(self.link.master_fd, self._on_readable)
+
+    def detach(self, loop):
+        loop.remove_reader(self.link.master_fd)
+        self.link.close()
+
+    def _on_readable(self):
+        try:
+            self.received += os.read(self.link.master_fd, 4096)
+        except BlockingIOError:
+            pass
+
+    def frame(self, sequence):
+        # FC_V carries the unit index and FC_A the sequence number so the
+        # test can check routing and ordering.
+        values = {'FC_V': float(self.index), 'FC_A': float(sequence), 'FAN': 30.0, 'BLW': 20.0}
+        return (format_frame(values) + '\r\nRunning\r\n').encode('ascii')
+
+    async def stream(self, frames, rate, chunk_size):
+        for sequence in range(frames):
+            data = self.frame(sequence)
+            # Split each frame so the controller sees partial reads.
+            for i in range(0, len(data), chunk_size):
+                self.link.write(data[i:i + chunk_size])
+                await asyncio.sleep(0)
+            await asyncio.sleep(1 / rate)
+
+
+async def run_units(ports, frames, rate, chunk_size=64):
+    """Drives AsyncFuelCellController instances through pseudo-terminals; returns (units, controllers, received)."""
+    loop = asyncio.get_running_loop()
+    units = [FakeUnit(index) for index in range(ports)]
+    controllers = [AsyncFuelCellController(unit.link.port) for unit in units]
+    by_port = {controller.port: unit for controller, unit in zip(controllers, units)}
+
+    for unit in units:
+        unit.attach(loop)
+    for controller in controllers:
+        await controller.connect()
+
+    for controller in controllers:
+        for method, _ in COMMANDS:
+            getattr(controller, method)()
+
+    received = {unit.index: [] for unit in units}
+
+    async def consume():
+        async for controller, frame in merge(controllers):
+            received[by_port[controller.port].index].append((frame['FC_V'], int(frame['FC_A'])))
+
+    consumer = asyncio.create_task(consume())
+    await asyncio.gather(*(unit.stream(frames, rate, chunk_size) for unit in units))
+    await asyncio.sleep(0.2)
+    for controller in controllers:
+        await controller.disconnect()
+    await consumer
+    for unit in units:
+        unit.detach(loop)
+    return units, controllers, received
+
+
+def test_many_ports_in_one_loop(ports=16, frames=50, rate=20.0):
+    units, controllers, received = asyncio.run(run_units(ports, frames, rate))
+    expected_commands = b''.join(expected for _, expected in COMMANDS)
+    for unit, controller in zip(units, controllers):
+        # Every frame reaches the controller of its own port, in order.
+        assert received[unit.index] == [(float(unit.index), sequence) for sequence in range(frames)]
+        assert bytes(unit.received) == expected_commands
+        assert controller.dropped == 0
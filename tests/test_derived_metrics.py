@@ -0,0 +1,61 @@
+import glob
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from derived_metrics import DerivedMetrics, run_frame
+from protium_parser import FIELD_NAMES
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'data')
+
+
+def synthetic_frame(rows=5000, seed=0):
+    # 1 Hz with jitter, NaN gaps and a dropped link.
+    rng = np.random.default_rng(seed)
+    t = 1.7e9 + np.cumsum(rng.uniform(0.8, 1.2, rows))
+    t[rows // 2:] += 60
+    frame = pd.DataFrame({'timestamp': t})
+    for key in FIELD_NAMES:
+        frame[key] = rng.normal(50, 5, rows)
+    frame.loc[rng.choice(rows, rows // 20, replace=False), 'FC_W'] = np.nan
+    frame.loc[rng.choice(rows, rows // 20, replace=False), 'FC_V'] = np.nan
+    return frame
+
+
+def smallest_run(tmp_path):
+    """The smallest run log in data/ with timestamps, copied so its cache goes under tmp_path."""
+    for csv_file in sorted(glob.glob(os.path.join(DATA_DIR, '*.csv')), key=os.path.getsize):
+        try:
+            return run_frame(shutil.copy(csv_file, tmp_path))
+        except ValueError:
+            continue
+    pytest.skip("no run log with timestamps in data/")
+
+
+def live_rows(engine, frame):
+    return pd.DataFrame([dict(engine.update(dict(zip(frame.columns[1:], row[1:])), row[0]))
+                         for row in frame.itertuples(index=False)], columns=engine.columns)
+
+
+@pytest.mark.parametrize('source', ['synthetic', 'run log'])
+def test_batch_matches_live(source, tmp_path):
+    """The first half as one batch and the rest live gives the sample-by-sample values."""
+    frame = synthetic_frame() if source == 'synthetic' else smallest_run(tmp_path)
+    live = DerivedMetrics(cells=80, active_area=100.0)
+    expected = live_rows(live, frame)
+
+    split = DerivedMetrics(cells=80, active_area=100.0)
+    half = len(frame) // 2
+    batched = pd.concat([split.update_batch(frame.iloc[:half]), live_rows(split, frame.iloc[half:])],
+                        ignore_index=True)
+
+    for name in live.columns:
+        # A standard deviation near zero is the square root of rounding
+        # noise: the two paths agree to about sqrt(eps) times the values.
+        atol = 1e-6 if name.endswith('std') else 1e-9
+        assert np.allclose(expected[name].to_numpy(dtype=float), batched[name].to_numpy(dtype=float),
+                           rtol=1e-9, atol=atol, equal_nan=True), name
+    assert live.values['energy_wh'] == pytest.approx(split.values['energy_wh'], abs=1e-9, nan_ok=True)
@@ -0,0 +1,39 @@
+import numpy as np
+
+from downsample import minmax_indices
+
+
+def test_short_series_is_kept():
+    assert minmax_indices(np.arange(10.0), 5).tolist() == list(range(10))
+
+
+def test_picks_per_bucket():
+    y = np.random.default_rng(0).normal(size=100_000)
+    picks = minmax_indices(y, 600)
+    assert len(picks) <= 4 * 600
+    assert (np.diff(picks) > 0).all()
+    assert picks[0] == 0 and picks[-1] == len(y) - 1
+    # Every bucket keeps its extremes.
+    per = -(-len(y) // 600)
+    for start in range(0, len(y), per):
+        bucket = y[start:start + per]
+        kept = y[picks[(picks >= start) & (picks < start + per)]]
+        assert kept.min() == bucket.min() and kept.max() == bucket.max()
+
+
+def test_several_series():
+    rng = np.random.default_rng(1)
+    y = [rng.normal(size=50_000), rng.normal(size=50_000)]
+    picks = minmax_indices(y, 500)
+    assert len(picks) <= 6 * 500
+    for values in y:
+        assert values[picks].max() == values.max()
+
+
+def test_nan_never_wins():
+    y = np.arange(1000.0)
+    y[550] = np.nan
+    y[:100] = np.nan
+    picks = minmax_indices(y, 10)
+    assert 550 not in picks
+    assert 0 in picks  # An all-NaN bucket keeps its first point.
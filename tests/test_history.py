@@ -0,0 +1,57 @@
+import time
+
+import numpy as np
+import pytest
+from questdb.ingress import Sender, TimestampNanos
+
+from history import CHART_POINTS, TELEMETRY_TABLE, HistoryClient, sample_interval
+from questdb_stub import QuestDBStub
+
+HOURS = 6
+RATE = 1.0  # Rows per second
+
+
+@pytest.fixture(scope='module')
+def history():
+    """HOURS of synthetic telemetry in QuestDBStub: (client, origin, values)."""
+    with QuestDBStub() as stub:
+        # A day-aligned origin in the past, so every page is over and cacheable.
+        origin = (int(time.time()) // 86400 - 2) * 86400
+        values = np.sin(np.arange(int(HOURS * 3600 * RATE)) / 500.0) * 10 + 60
+        with Sender.from_conf(stub.conf) as sender:
+            for i, value in enumerate(values):
+                sender.row(TELEMETRY_TABLE, symbols={'port': 'COM7'},
+                           columns={'fc_v': float(value), 'fc_a': float(i)},
+                           at=TimestampNanos(int((origin + i / RATE) * 1e9)))
+                if i % 5000 == 4999:
+                    sender.flush()
+        yield HistoryClient(f"http://{stub.host}:{stub.port}"), origin, values
+
+
+def test_bucket_averages_match_the_rows(history):
+    client, origin, values = history
+    end = origin + HOURS * 3600
+    whole = client.telemetry(origin, end, port='COM7')
+    assert 0 < len(whole) <= CHART_POINTS
+    per_bucket = int(sample_interval(origin, end) / 1000 * RATE)
+    expected = values[:len(whole) * per_bucket].reshape(len(whole), per_bucket).mean(axis=1)
+    assert np.allclose(whole['FC_V'].to_numpy(), expected)
+
+
+def test_panning_is_answered_from_the_cache(history):
+    client, origin, values = history
+    # Zoom in to one hour, then pan forward, back, and forward again.
+    span = 3600
+    windows = [(origin + i * span / 2, origin + i * span / 2 + span) for i in (0, 1, 2, 1, 0, 1, 2)]
+    first_pass = {}
+    for window in windows:
+        frame = client.telemetry(*window)
+        if window in first_pass:
+            assert frame.equals(first_pass[window]), f"cached result for {window} differs"
+        first_pass.setdefault(window, frame)
+    assert client.hits > 0
+    queries = client.queries
+    for window in windows:
+        client.telemetry(*window)
+    assert client.queries == queries, "ranges already seen were queried again"
+    assert client.rows_fetched < len(values), "raw rows were pulled"
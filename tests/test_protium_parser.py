@@ -0,0 +1,72 @@
+import math
+
+from protium_parser import FIELD_NAMES, ProtiumFrameParser, TelemetryRecord, format_frame
+
+VALUES = {'FC_V': 71.25, 'FCT1': 45.5, 'H2P1': 0.55, 'FC_A': 12.34, 'FC_W': 879.2, 'FAN': 35.0,
+          'Energy': 120.0, 'BLW': 42.0, 'Tank-T': 21.5, 'BattV': 26.8}
+
+
+def frames(items):
+    return [item for item in items if type(item) is TelemetryRecord]
+
+
+def test_frame_round_trip():
+    items = ProtiumFrameParser().feed(format_frame(VALUES).encode('ascii'))
+    assert len(items) == 1
+    record = items[0]
+    assert dict(record.items()) == VALUES
+    # DC/DC readings and the others left out are printed as "XX.X".
+    assert 'DCDCV' not in record
+    assert math.isnan(record.values[FIELD_NAMES.index('DCDCV')])
+
+
+def test_frames_split_across_reads():
+    data = (format_frame(VALUES) + '\r\nRunning\r\n').encode('ascii') * 3
+    whole = ProtiumFrameParser().feed(data)
+    parser = ProtiumFrameParser()
+    pieces = []
+    for i in range(len(data)):
+        pieces += parser.feed(data[i:i + 1])
+    assert [dict(item.items()) if type(item) is TelemetryRecord else item for item in pieces] == \
+           [dict(item.items()) if type(item) is TelemetryRecord else item for item in whole]
+    assert len(frames(pieces)) == 3
+    assert pieces.count({"raw": "Running"}) == 3
+
+
+def test_text_outside_frames():
+    items = ProtiumFrameParser().feed(b'Fan PWM auto\r\nCommand not found.\r\npartial')
+    assert items == [{"raw": "Fan PWM auto"}, {"error": "Command not found"}]
+
+
+def test_flush_returns_the_rest():
+    parser = ProtiumFrameParser()
+    parser.feed(b'Fan PWM auto\r\npartial')
+    assert parser.flush() == [{"raw": "partial"}]
+    assert parser.feed(format_frame(VALUES).encode('ascii'))[0]['FC_V'] == VALUES['FC_V']
+
+
+def test_unterminated_frame_resyncs():
+    parser = ProtiumFrameParser(max_frame_size=256)
+    items = parser.feed(b'|FC_V : 71.2 V |' + b'x' * 300 + b'\r\n')
+    assert parser.failed_frames == 1
+    assert not frames(items)
+    assert frames(parser.feed(format_frame(VALUES).encode('ascii')))[0]['FC_A'] == VALUES['FC_A']
+
+
+def test_frame_outside_the_schema_layout():
+    # Fields out of order, with an unknown key: decoded pair by pair.
+    items = ProtiumFrameParser().feed(b'| FC_A : 3.50 A | Bogus : 1.0 X | FC_V : 70.10 V |!')
+    assert dict(items[0].items()) == {'FC_V': 70.1, 'FC_A': 3.5}
+
+
+def test_frame_without_fields():
+    parser = ProtiumFrameParser()
+    assert parser.feed(b'| nothing here |!') == [{"raw": "| nothing here |!"}]
+    assert parser.failed_frames == 1
+
+
+def test_record_mapping():
+    record = TelemetryRecord.from_values({'FC_V': 70.0, 'Unknown': 1.0, 'FAN': None})
+    assert record.keys() == ['FC_V']
+    assert record.get('FAN', -1) == -1
+    assert record.as_dict() == {'FC_V': {"value": 70.0, "unit": 'V'}}
@@ -0,0 +1,41 @@
+import os
+import shutil
+
+from run_catalog import RunCatalog, parse_condition
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'data')
+RUNS = ('V2.5.6-3-2302-17-A-7.csv', 'V2.5.6-3-2302-17-A-8.csv')
+
+
+def copy_runs(directory):
+    directory.mkdir()
+    for name in RUNS:
+        shutil.copy(os.path.join(DATA_DIR, name), directory)
+    return directory
+
+
+def test_catalog_follows_the_data_directory(tmp_path, monkeypatch):
+    data = copy_runs(tmp_path / 'runs')
+    monkeypatch.chdir(tmp_path)
+    catalog = RunCatalog('runs')
+    assert catalog.sync() == (2, 0)
+    assert catalog.path == os.path.join('runs', '.cache', 'catalog.json')
+    assert sorted(catalog.runs) == list(RUNS)
+
+    # The same catalog, opened from another working directory.
+    monkeypatch.chdir(data)
+    catalog = RunCatalog('.')
+    assert catalog.sync() == (0, 0)
+    assert catalog.runs[catalog.key(RUNS[0])]["firmware"] == 'V2.5.6-3'
+
+    os.remove(data / RUNS[1])
+    assert catalog.sync() == (0, 1)
+    assert list(RunCatalog(str(data)).runs) == [RUNS[0]]
+
+
+def test_query(tmp_path):
+    catalog = RunCatalog(str(copy_runs(tmp_path / 'runs')))
+    catalog.sync()
+    assert [entry["file"] for entry in catalog.query(["FC_A (A).max > 10"])] == [RUNS[1]]
+    assert len(catalog.query(["firmware == V2.5.6-3", "rows >= 1000"])) == 2
+    assert parse_condition("FC_V (V).mean <= 50") == ('FC_V (V)', 'mean', '<=', 50.0)
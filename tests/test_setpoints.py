@@ -0,0 +1,99 @@
+import threading
+
+import pytest
+
+from protium_parser import TelemetryRecord
+from setpoints import ACTUATORS, LIMITS, SetpointController, plan
+from telemetry_buffer import TelemetryRingBuffer
+
+FAN = ACTUATORS['fan'].steps
+BLOWER = ACTUATORS['blower'].steps
+
+
+def apply(current, commands, steps):
+    low, high = LIMITS
+    for command in commands:
+        current = min(max(current + steps[command], low), high)
+    return current
+
+
+def test_plan_uses_the_clamping():
+    assert plan(83, 100, FAN) == (['='] * 4, 100.0)
+    assert plan(2, 0, FAN) == (['-'], 0.0)
+
+
+def test_plan_no_change():
+    assert plan(40, 40, FAN) == ([], 40.0)
+
+
+@pytest.mark.parametrize('current', range(0, 101, 7))
+@pytest.mark.parametrize('target', range(0, 101, 9))
+def test_plan_reaches_every_fan_setting(current, target):
+    commands, reached = plan(current, target, FAN)
+    assert reached == target
+    assert apply(current, commands, FAN) == target
+    # No longer than +-5 steps then +-1 steps.
+    distance = abs(target - current)
+    assert len(commands) <= distance // 5 + distance % 5
+
+
+def test_plan_blower_goes_to_the_nearest_reachable_setting():
+    assert plan(15, 16, BLOWER) == ([], 15.0)
+    assert plan(15, 17, BLOWER) == ([']'], 18.0)
+    commands, reached = plan(15, 100, BLOWER)
+    assert reached == 100
+    assert apply(15, commands, BLOWER) == 100
+
+
+class FakeFuelCell:
+    """Applies the step commands and reports the settings in the next frame."""
+
+    def __init__(self, fan=30.0, blower=21.0):
+        self.telemetry = TelemetryRingBuffer(capacity=64)
+        self.settings = {'FAN': fan, 'BLW': blower}
+        self.writes = []
+        self._lock = threading.Lock()
+        self.frame()
+
+    def frame(self):
+        with self._lock:
+            self.telemetry.append(TelemetryRecord.from_values(self.settings))
+
+    def send_command(self, command):
+        self.writes.append(command)
+        with self._lock:
+            for line in command.split('\r')[:-1]:
+                for actuator in ACTUATORS.values():
+                    if line in actuator.steps:
+                        value = self.settings[actuator.field] + actuator.steps[line]
+                        self.settings[actuator.field] = min(max(value, LIMITS[0]), LIMITS[1])
+        self.frame()
+
+
+@pytest.fixture
+def fuel_cell():
+    fuel_cell = FakeFuelCell()
+    fuel_cell.setpoints = SetpointController(fuel_cell, confirm_timeout=1.0).start()
+    yield fuel_cell
+    fuel_cell.setpoints.stop()
+
+
+def test_request_is_sent_as_one_write_and_confirmed(fuel_cell):
+    assert fuel_cell.setpoints.request('fan', 83, wait=True) == 'confirmed'
+    assert fuel_cell.settings['FAN'] == 83
+    assert len(fuel_cell.writes) == 1
+    assert fuel_cell.setpoints.request('blower', 45, wait=True) == 'confirmed'
+    assert fuel_cell.settings['BLW'] == 45
+
+
+def test_latest_request_wins(fuel_cell):
+    for percent in (40, 50, 60, 70):
+        fuel_cell.setpoints.request('fan', percent)
+    assert fuel_cell.setpoints.request('fan', 75, wait=True) == 'confirmed'
+    assert fuel_cell.settings['FAN'] == 75
+
+
+def test_unconfirmed_request_times_out(fuel_cell):
+    fuel_cell.frame = lambda: None  # The fuel cell stops reporting.
+    assert fuel_cell.setpoints.request('fan', 50, wait=True) == 'timeout'
+    assert fuel_cell.setpoints.stats()["timeouts"] == 1
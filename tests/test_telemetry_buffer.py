@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from protium_parser import TelemetryRecord
+from telemetry_buffer import TelemetryRingBuffer
+
+
+def fill(buffer, first, last):
+    for i in range(first, last):
+        buffer.append(TelemetryRecord.from_values({'FC_V': float(i)}), timestamp=float(i))
+
+
+def test_window_is_oldest_first():
+    buffer = TelemetryRingBuffer(capacity=8)
+    fill(buffer, 0, 5)
+    assert len(buffer) == 5
+    assert buffer.column('timestamp').tolist() == [0, 1, 2, 3, 4]
+    assert buffer.column('FC_V', 2).tolist() == [3, 4]
+    assert np.isnan(buffer.column('FC_A')).all()
+
+
+def test_overwrite_keeps_the_latest_rows():
+    buffer = TelemetryRingBuffer(capacity=8)
+    fill(buffer, 0, 21)
+    assert buffer.column('FC_V').tolist() == list(range(13, 21))
+    assert buffer.stats() == {"size": 8, "capacity": 8, "appended": 21, "overwritten": 13, "dropped": 0}
+
+
+def test_drop_keeps_the_first_rows():
+    buffer = TelemetryRingBuffer(capacity=4, policy='drop')
+    fill(buffer, 0, 6)
+    assert buffer.column('FC_V').tolist() == [0, 1, 2, 3]
+    assert buffer.dropped == 2
+    assert not buffer.append({'FC_V': 9.0})
+
+
+def test_views_are_read_only():
+    buffer = TelemetryRingBuffer(capacity=4)
+    fill(buffer, 0, 2)
+    with pytest.raises(ValueError):
+        buffer.window()[0, 0] = 1.0
+
+
+def test_dict_frames():
+    buffer = TelemetryRingBuffer(capacity=4)
+    buffer.append({'FC_V': {"value": 71.2, "unit": 'V'}, 'Unknown': 1.0}, timestamp=1.0)
+    buffer.append({'FC_A': 3.0}, timestamp=2.0)
+    assert buffer.latest() == {'timestamp': 2.0, 'FC_A': 3.0}
+    assert buffer.window()[0, 1] == 71.2
+
+
+def test_since():
+    buffer = TelemetryRingBuffer(capacity=8)
+    fill(buffer, 0, 6)
+    assert buffer.since(3.5)[:, 0].tolist() == [4, 5]
+
+
+def test_since_count_sees_every_row_once():
+    buffer = TelemetryRingBuffer(capacity=8)
+    seen = []
+    count = 0
+    for batch in (3, 5, 7, 0, 6):
+        fill(buffer, len(seen), len(seen) + batch)
+        count, rows = buffer.since_count(count)
+        seen += rows[:, 0].tolist()
+    assert seen == list(range(21))
+
+
+def test_since_count_after_overwrites():
+    buffer = TelemetryRingBuffer(capacity=4)
+    fill(buffer, 0, 10)
+    count, rows = buffer.since_count(0)
+    assert count == 10
+    assert rows[:, 0].tolist() == [6, 7, 8, 9]
+
+
+def test_empty_and_invalid():
+    assert TelemetryRingBuffer(capacity=4).latest() == {}
+    with pytest.raises(ValueError):
+        TelemetryRingBuffer(capacity=0)
+    with pytest.raises(ValueError):
+        TelemetryRingBuffer(policy='block')
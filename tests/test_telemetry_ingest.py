@@ -0,0 +1,33 @@
+import time
+
+from protium_parser import TelemetryRecord
+from questdb_stub import QuestDBStub
+from telemetry_ingest import TABLE_NAME, TelemetryIngestor
+
+
+def test_outage_is_spooled_and_replayed_in_order(tmp_path, frames=200):
+    stub = QuestDBStub().start()
+    ingestor = TelemetryIngestor(stub.conf, spool_path=str(tmp_path / 'spool.jsonl'),
+                                 batch_size=50, flush_interval=0.1, retry_interval=0.2).start()
+    start = time.time()
+
+    def submit(first, last):
+        for i in range(first, last):
+            ingestor.submit(TelemetryRecord.from_values({'FC_V': float(i), 'FC_A': 1.0}), timestamp=start + i)
+
+    submit(0, frames // 2)
+    time.sleep(0.5)
+    port = stub.port
+    stub.stop()
+    submit(frames // 2, frames)
+    time.sleep(0.5)
+    assert ingestor.rows_spooled, "nothing was spooled while the endpoint was down"
+
+    restarted = QuestDBStub(port=port).start()
+    time.sleep(1.0)
+    ingestor.stop()
+    restarted.stop()
+
+    values = [row['fc_v'] for _, row, _ in stub.rows(TABLE_NAME) + restarted.rows(TABLE_NAME)]
+    assert values == [float(i) for i in range(frames)]
+    assert not (tmp_path / 'spool.jsonl').exists(), "spool file left behind after replay"